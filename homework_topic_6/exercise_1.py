@@ -1,69 +1,364 @@
-import json
+import argparse
 import csv
+import heapq
+import io
+import json
+import multiprocessing
 import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# логи режутся на куски примерно такого размера, каждый кусок разбирает свой процесс;
+# разобранный кусок занимает в памяти процесса в несколько раз больше, чем на диске
+CHUNK_SIZE = 16 * 1024 * 1024
+# во столько раз словарь user_id -> категория в памяти больше лога покупок, из которого он собран
+TABLE_BYTES_FACTOR = 3
+# каждый кусок держит открытыми файлы всех разделов, больше - упрёмся в лимит дескрипторов
+MAX_PARTITIONS = 256
+
+# строка лога в обычном виде, без экранирования: для неё регулярка даёт то же, что json.loads,
+# но в несколько раз быстрее; всё остальное разбирает json.loads
+PURCHASE_LINE = re.compile(r'\{"user_id": "([^"\\]*)", "category": "([^"\\]*)"\}')
+
+# таблица для соединения в процессах пула: задаётся один раз при запуске процесса
+_table = None
+_categories = None
+_category_fields = None
+
+
 def get_path(filename):
     return os.path.join(BASE_DIR, filename)
 
 
-def main():
-    purchase_log_path = get_path('purchase_log.txt')
-    visit_log_path = get_path('visit_log.csv')
-    funnel_path = get_path('funnel.csv')
-
-    purchases = {}
-    
-    if os.path.exists(purchase_log_path):
-        with open(purchase_log_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    data = json.loads(line)
-                    user_id = data.get('user_id')
-                    category = data.get('category')
-                    
-                    if user_id and category:
-                        purchases[user_id] = category
-                except json.JSONDecodeError:
-                    continue
+def split_ranges(path, chunk_size, skip_header=False):
+    # границы кусков сдвигаются к концу строки, так что каждая строка целиком в одном куске;
+    # строки с переводом строки внутри кавычек CSV так не разрезать, в логах их нет
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        start = len(f.readline()) if skip_header else 0
+        while start < size:
+            f.seek(min(start + chunk_size, size) - 1)
+            f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).decode('utf-8')
+
+
+def read_purchases(path, start, end):
+    lines = 0
+    records = []
+    for line in read_range(path, start, end).split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        lines += 1
+        match = PURCHASE_LINE.fullmatch(line)
+        if match is not None:
+            user_id, category = match.groups()
+            if user_id and category:
+                records.append((user_id, category))
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        user_id = data.get('user_id')
+        category = data.get('category')
+        # id визита всегда строка, покупку с другим id соединять не с чем
+        if user_id and category and isinstance(user_id, str):
+            records.append((user_id, str(category)))
+    return lines, records
+
+
+def read_visits(path, start, end):
+    return visit_rows(read_range(path, start, end))
+
+
+def visit_rows(text):
+    if '"' in text:
+        rows = csv.reader(io.StringIO(text))
     else:
-        print(f"Файл {purchase_log_path} не найден.")
-        return
+        # без кавычек строка CSV - это поля через запятую, split быстрее csv.reader
+        rows = (line.split(',') for line in map(str.rstrip, text.split('\n'), repeat('\r')) if line)
+    for row in rows:
+        if row:
+            yield row[0], row[1] if len(row) > 1 else ''
+
+
+def parse_purchases(path, start, end):
+    # категорий мало, поэтому вместо строк передаются их номера в списке этого куска
+    lines, records = read_purchases(path, start, end)
+    categories = {}
+    user_ids = []
+    codes = array('I')
+    for user_id, category in records:
+        user_ids.append(user_id)
+        codes.append(categories.setdefault(category, len(categories)))
+    return lines, user_ids, codes, list(categories)
+
+
+def build_table(pool, path, ranges):
+    # куски сливаются по порядку: из повторных покупок пользователя остаётся последняя, как в логе
+    table = {}
+    codes_by_name = {}
+    lines = 0
+    for chunk_lines, user_ids, codes, names in pool.map(parse_purchases, [path] * len(ranges), *zip(*ranges)):
+        lines += chunk_lines
+        remap = [codes_by_name.setdefault(name, len(codes_by_name)) for name in names]
+        table.update(zip(user_ids, map(remap.__getitem__, codes)))
+    return table, list(codes_by_name), lines
+
+
+def csv_field(value):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='').writerow([value])
+    return buffer.getvalue()
+
+
+def init_join(table, categories):
+    global _table, _categories, _category_fields
+    _table = table
+    _categories = categories
+    # категория в кавычках, если нужно, экранируется один раз, а не в каждой строке воронки
+    _category_fields = [csv_field(category) for category in categories]
+
+
+def join_visits(path, start, end, out_path):
+    text = read_range(path, start, end)
+    rows = matched = 0
+    with open(out_path, 'w', encoding='utf-8', newline='') as f:
+        if '"' in text or '\r' in text:
+            writer = csv.writer(f)
+            for user_id, source in visit_rows(text):
+                rows += 1
+                code = _table.get(user_id)
+                if code is not None:
+                    writer.writerow([user_id, source, _categories[code]])
+                    matched += 1
+            return rows, matched
+
+        # в поле без кавычек и переводов строки нет ничего, что csv.writer стал бы экранировать,
+        # поэтому строка воронки собирается напрямую, с его же окончанием \r\n
+        get = _table.get
+        lines = []
+        for line in text.split('\n'):
+            if not line:
+                continue
+            rows += 1
+            user_id, _, rest = line.partition(',')
+            code = get(user_id)
+            if code is not None:
+                lines.append(f"{user_id},{rest.partition(',')[0]},{_category_fields[code]}\r\n")
+        f.writelines(lines)
+    return rows, len(lines)
+
+
+def partition_of(user_id, partitions):
+    # hash() у строк свой в каждом процессе, crc32 одинаков везде
+    return zlib.crc32(user_id.encode('utf-8')) % partitions
+
 
-    if os.path.exists(visit_log_path):
-        with open(visit_log_path, 'r', encoding='utf-8') as f_visit, \
-             open(funnel_path, 'w', encoding='utf-8', newline='') as f_funnel:
-            
-            reader = csv.reader(f_visit)
+def open_partitions(tmp_dir, kind, chunk, partitions):
+    files = [open(os.path.join(tmp_dir, f'p{part}-{kind}-{chunk:05d}.csv'), 'w', encoding='utf-8', newline='')
+             for part in range(partitions)]
+    return files, [csv.writer(f) for f in files]
+
+
+def partition_purchases(path, start, end, chunk, partitions, tmp_dir):
+    lines, records = read_purchases(path, start, end)
+    files, writers = open_partitions(tmp_dir, 'purchases', chunk, partitions)
+    for user_id, category in records:
+        writers[partition_of(user_id, partitions)].writerow([user_id, category])
+    for f in files:
+        f.close()
+    return lines
+
+
+def partition_visits(path, start, end, chunk, partitions, tmp_dir):
+    # номер строки нужен, чтобы после соединения по разделам вернуть визитам исходный порядок
+    rows = 0
+    files, writers = open_partitions(tmp_dir, 'visits', chunk, partitions)
+    for user_id, source in read_visits(path, start, end):
+        writers[partition_of(user_id, partitions)].writerow([rows, user_id, source])
+        rows += 1
+    for f in files:
+        f.close()
+    return rows
+
+
+def join_partition(part, purchase_chunks, visit_chunks, tmp_dir):
+    # в памяти только таблица одного раздела
+    table = {}
+    categories = {}
+    for chunk in range(purchase_chunks):
+        with open(os.path.join(tmp_dir, f'p{part}-purchases-{chunk:05d}.csv'), encoding='utf-8', newline='') as f:
+            for user_id, category in csv.reader(f):
+                table[user_id] = categories.setdefault(category, category)
+
+    matched = 0
+    for chunk in range(visit_chunks):
+        visits_path = os.path.join(tmp_dir, f'p{part}-visits-{chunk:05d}.csv')
+        with open(visits_path, encoding='utf-8', newline='') as f_visit, \
+             open(os.path.join(tmp_dir, f'p{part}-funnel-{chunk:05d}.csv'), 'w', encoding='utf-8',
+                  newline='') as f_funnel:
             writer = csv.writer(f_funnel)
-            
-            try:
-                header = next(reader)
-            except StopIteration:
-                print(f"Файл {visit_log_path} пуст.")
-                return
-
-            writer.writerow(['user_id', 'source', 'category'])
-            
-            for row in reader:
-                if not row:
-                    continue
-                
-                if len(row) >= 1:
-                    user_id = row[0]
-                    
-                    if user_id in purchases:
-                        category = purchases[user_id]
-                        source = row[1] if len(row) > 1 else ''
-                        writer.writerow([user_id, source, category])
-        
-        print(f"Готово. Результат записан в {funnel_path}")
-    else:
+            for row_no, user_id, source in csv.reader(f_visit):
+                category = table.get(user_id)
+                if category is not None:
+                    writer.writerow([row_no, user_id, source, category])
+                    matched += 1
+        os.remove(visits_path)
+    return matched
+
+
+def merge_partitions(writer, tmp_dir, chunk, partitions):
+    # в файле каждого раздела строки идут по возрастанию номера, слияние восстанавливает порядок куска
+    files = [open(os.path.join(tmp_dir, f'p{part}-funnel-{chunk:05d}.csv'), encoding='utf-8', newline='')
+             for part in range(partitions)]
+    try:
+        for row in heapq.merge(*map(csv.reader, files), key=lambda row: int(row[0])):
+            writer.writerow(row[1:])
+    finally:
+        for f in files:
+            f.close()
+
+
+def run_in_memory(context, workers, purchase_ranges, visit_log_path, visit_ranges, tmp_dir):
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        table, categories, lines = build_table(pool, *purchase_ranges)
+
+    parts = [os.path.join(tmp_dir, f'funnel-{chunk:05d}.csv') for chunk in range(len(visit_ranges))]
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_join,
+                             initargs=(table, categories)) as pool:
+        results = list(pool.map(join_visits, [visit_log_path] * len(visit_ranges),
+                                *zip(*visit_ranges), parts))
+    return lines, sum(rows for rows, _ in results), sum(matched for _, matched in results), parts
+
+
+def run_partitioned(context, workers, partitions, purchase_ranges, visit_log_path, visit_ranges,
+                    tmp_dir, funnel_path):
+    purchase_log_path, ranges = purchase_ranges
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        lines = pool.map(partition_purchases, [purchase_log_path] * len(ranges), *zip(*ranges),
+                         range(len(ranges)), [partitions] * len(ranges), [tmp_dir] * len(ranges))
+        rows = pool.map(partition_visits, [visit_log_path] * len(visit_ranges), *zip(*visit_ranges),
+                        range(len(visit_ranges)), [partitions] * len(visit_ranges),
+                        [tmp_dir] * len(visit_ranges))
+        lines, rows = sum(lines), sum(rows)
+        matched = sum(pool.map(join_partition, range(partitions), [len(ranges)] * partitions,
+                               [len(visit_ranges)] * partitions, [tmp_dir] * partitions))
+
+    with open(funnel_path, 'w', encoding='utf-8', newline='') as f_funnel:
+        writer = csv.writer(f_funnel)
+        writer.writerow(['user_id', 'source', 'category'])
+        for chunk in range(len(visit_ranges)):
+            merge_partitions(writer, tmp_dir, chunk, partitions)
+    return lines, rows, matched
+
+
+def peak_memory_mb():
+    # ru_maxrss в КБ, на macOS в байтах; процессы пула учитываются после их завершения
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Воронка: визиты, завершившиеся покупкой")
+    parser.add_argument('--purchases', default=get_path('purchase_log.txt'))
+    parser.add_argument('--visits', default=get_path('visit_log.csv'))
+    parser.add_argument('--output', default=get_path('funnel.csv'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_SIZE / 1024 / 1024)
+    parser.add_argument('--memory-limit-mb', type=float, default=0,
+                        help="если таблица покупок не помещается, соединение идёт по разделам на диске")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    purchase_log_path = args.purchases
+    visit_log_path = args.visits
+    funnel_path = args.output
+
+    if not os.path.exists(purchase_log_path):
+        print(f"Файл {purchase_log_path} не найден.")
+        return
+    if not os.path.exists(visit_log_path):
         print(f"Файл {visit_log_path} не найден.")
+        return
+    if os.path.getsize(visit_log_path) == 0:
+        open(funnel_path, 'w').close()
+        print(f"Файл {visit_log_path} пуст.")
+        return
+
+    started = time.perf_counter()
+    chunk_size = max(int(args.chunk_mb * 1024 * 1024), 1)
+    purchase_ranges = split_ranges(purchase_log_path, chunk_size)
+    visit_ranges = split_ranges(visit_log_path, chunk_size, skip_header=True)
+    workers = max(1, min(args.workers, max(len(purchase_ranges), len(visit_ranges), 1)))
+    # fork отдаёт таблицу процессам пула без копирования через pickle
+    context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+
+    partitions = 1
+    if args.memory_limit_mb > 0:
+        table_mb = os.path.getsize(purchase_log_path) * TABLE_BYTES_FACTOR / 1024 / 1024
+        partitions = min(max(1, -int(-table_mb // args.memory_limit_mb)), MAX_PARTITIONS)
+
+    tmp_dir = tempfile.mkdtemp(prefix='funnel-', dir=os.path.dirname(os.path.abspath(funnel_path)))
+    try:
+        if partitions > 1:
+            lines, rows, matched = run_partitioned(context, workers, partitions,
+                                                   (purchase_log_path, purchase_ranges),
+                                                   visit_log_path, visit_ranges, tmp_dir, funnel_path)
+        else:
+            lines, rows, matched, parts = run_in_memory(context, workers,
+                                                        (purchase_log_path, purchase_ranges),
+                                                        visit_log_path, visit_ranges, tmp_dir)
+            with open(funnel_path, 'w', encoding='utf-8', newline='') as f_funnel:
+                csv.writer(f_funnel).writerow(['user_id', 'source', 'category'])
+                for part in parts:
+                    with open(part, encoding='utf-8', newline='') as f_part:
+                        shutil.copyfileobj(f_part, f_funnel)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+
+    print(f"Готово. Результат записан в {funnel_path}")
+    mode = f"{partitions} разделов на диске" if partitions > 1 else "таблица в памяти"
+    print(f"Процессов: {workers}, кусков: {len(purchase_ranges)} + {len(visit_ranges)}, {mode}")
+    print(f"Покупки: {lines} строк, визиты: {rows} строк, в воронке: {matched}")
+    print(f"Время: {elapsed:.2f} с, {(lines + rows) / max(elapsed, 1e-9):,.0f} строк/с")
+    memory = peak_memory_mb()
+    if memory is not None:
+        print(f"Пик памяти: {memory[0]:.1f} МБ основной процесс, {memory[1]:.1f} МБ процесс пула")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,251 @@
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import codec
+from src.config import CacheConfig, Config, ServerConfig, StorageConfig
+from src.server import TaskServer
+
+
+OPERATIONS = ("get", "create", "complete")
+
+
+def make_store(path: Path, count: int) -> None:
+    priorities = ["low", "normal", "high"]
+    records = [
+        {"id": i + 1, "title": f"Задача {i + 1}", "priority": priorities[i % 3], "isDone": i % 4 == 0}
+        for i in range(count)
+    ]
+    with open(path, 'wb') as f:
+        f.write(codec.dumps(records))
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    # "get=80,create=15,complete=5"
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS or not weight.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"неверный элемент смеси: {part!r}")
+        mix[name] = int(weight)
+    if not sum(mix.values()):
+        raise argparse.ArgumentTypeError("сумма весов должна быть больше нуля")
+    return mix
+
+
+def run_connection(host: str, port: int, mix: dict[str, int], get_path: str,
+                   get_headers: dict[str, str], task_count: int, deadline: float, seed: int) -> tuple[dict[str, array], int]:
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = {name: array('d') for name in names}
+    errors = 0
+    body = json.dumps({"title": "Нагрузочная задача", "priority": "normal"}).encode('utf-8')
+    headers = {"Content-Type": "application/json"}
+    # одно соединение на поток: при Connection: close http.client переоткрывает его сам
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            if name == "get":
+                conn.request("GET", get_path, headers=get_headers)
+            elif name == "create":
+                conn.request("POST", "/tasks", body, headers)
+            else:
+                conn.request("POST", f"/tasks/{rng.randint(1, max(task_count, 1))}/complete")
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400 or (name == "complete" and response.status == 404)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            ok = False
+        elapsed = time.perf_counter() - started
+        if ok:
+            latencies[name].append(elapsed)
+        else:
+            errors += 1
+    
+    conn.close()
+    return latencies, errors
+
+
+def run_client(host: str, port: int, connections: int, mix: dict[str, int], get_path: str,
+               get_headers: dict[str, str], task_count: int, start_at: float, duration: float,
+               seed: int) -> tuple[dict[str, array], int]:
+    # клиентский процесс: несколько потоков-соединений, общий старт по часам
+    results = [None] * connections
+    
+    def worker(slot: int) -> None:
+        results[slot] = run_connection(host, port, mix, get_path, get_headers, task_count,
+                                       start_at + duration, seed * 1000 + slot)
+    
+    time.sleep(max(0.0, start_at - time.time()))
+    start_at = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    latencies = {name: array('d') for name in mix}
+    errors = 0
+    for connection_latencies, connection_errors in results:
+        for name, values in connection_latencies.items():
+            latencies[name].extend(values)
+        errors += connection_errors
+    return latencies, errors
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    
+    def at(fraction: float) -> float:
+        return values[min(len(values) - 1, int(fraction * len(values)))] * 1000
+    
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": values[-1] * 1000
+    }
+
+
+def bench_size(args, task_count: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="task-bench-") as tmp:
+        store = Path(tmp) / "tasks.txt"
+        make_store(store, task_count)
+        config = Config(
+            server=ServerConfig(host="127.0.0.1", port=0, workers=args.workers,
+                                engine=args.engine, access_log=False),
+            storage=StorageConfig(backend=args.backend, file=str(store),
+                                  database=str(Path(tmp) / "tasks.db"),
+                                  mode=args.mode, layout=args.layout, sync=args.sync,
+                                  snapshot_format=args.snapshot_format, shards=args.shards),
+            cache=CacheConfig()
+        )
+        
+        load_started = time.perf_counter()
+        server = TaskServer(config)
+        load_seconds = time.perf_counter() - load_started
+        host, port = server.start()
+        
+        try:
+            per_process = [args.connections // args.processes] * args.processes
+            for i in range(args.connections % args.processes):
+                per_process[i] += 1
+            # все клиенты стартуют в один момент, чтобы их разгон не попадал в замер
+            start_at = time.time() + 0.5 + 0.1 * args.processes
+            get_headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(args.processes) as pool:
+                jobs = [
+                    pool.apply_async(run_client, (host, port, connections, args.mix, args.get_path,
+                                                  get_headers, task_count, start_at, args.duration,
+                                                  seed))
+                    for seed, connections in enumerate(per_process) if connections
+                ]
+                client_results = [job.get() for job in jobs]
+        finally:
+            server.shutdown()
+    
+    latencies = {name: [] for name in args.mix}
+    errors = 0
+    for process_latencies, process_errors in client_results:
+        for name, values in process_latencies.items():
+            latencies[name].extend(values)
+        errors += process_errors
+    
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "tasks": task_count,
+        "load_seconds": load_seconds,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": total / args.duration,
+        "latency": {
+            "all": percentiles([value for values in latencies.values() for value in values]),
+            **{name: percentiles(values) for name, values in latencies.items()}
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест Task API на встроенном сервере")
+    parser.add_argument("--sizes", default="1000,100000,1000000",
+                        help="размеры хранилища через запятую")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("get=80,create=15,complete=5"),
+                        help="доли операций, например get=80,create=15,complete=5")
+    parser.add_argument("--get-path", default="/tasks?limit=100",
+                        help="путь для GET-запросов")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд на каждый размер")
+    parser.add_argument("--connections", type=int, default=32, help="одновременных соединений")
+    parser.add_argument("--processes", type=int, default=4, help="клиентских процессов")
+    parser.add_argument("--engine", default="threaded", choices=["classic", "threaded", "asyncio"])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--backend", default="file", choices=["file", "sqlite"])
+    parser.add_argument("--mode", default="json", choices=["json", "log"])
+    parser.add_argument("--layout", default="objects", choices=["objects", "columnar"])
+    parser.add_argument("--sync", default="always", choices=["always", "batch", "interval"])
+    parser.add_argument("--snapshot-format", default="json", choices=["json", "binary"])
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--accept-encoding", default="",
+                        help="Accept-Encoding для GET, например gzip; пусто - без сжатия")
+    parser.add_argument("--json", dest="json_path", help="записать результаты в JSON-файл")
+    args = parser.parse_args()
+    args.processes = max(1, min(args.processes, args.connections))
+    sizes = [int(size) for size in args.sizes.split(',')]
+    
+    results = []
+    for task_count in sizes:
+        print(f"→ {task_count} задач, {args.duration:g} с, {args.connections} соединений...")
+        results.append(bench_size(args, task_count))
+    
+    print()
+    print(f"{'Задач':>9} {'RPS':>9} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+    print("-" * 60)
+    for result in results:
+        overall = result["latency"]["all"]
+        print(f"{result['tasks']:>9} {result['throughput_rps']:>9.0f} "
+              f"{overall.get('p50_ms', 0):>9.2f} {overall.get('p95_ms', 0):>9.2f} "
+              f"{overall.get('p99_ms', 0):>9.2f} {result['errors']:>7}")
+    
+    if args.json_path:
+        report = {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "orjson": codec.USE_ORJSON,
+            "config": {
+                "mix": args.mix, "get_path": args.get_path, "duration": args.duration,
+                "connections": args.connections, "processes": args.processes,
+                "engine": args.engine, "workers": args.workers, "backend": args.backend,
+                "mode": args.mode, "layout": args.layout, "sync": args.sync,
+                "snapshot_format": args.snapshot_format, "shards": args.shards,
+                "accept_encoding": args.accept_encoding
+            },
+            "results": results
+        }
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
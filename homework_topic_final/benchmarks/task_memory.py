@@ -0,0 +1,100 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.indexes import TaskIndex
+from src.models import Task
+from src.table import TaskTable
+
+
+@dataclass
+class LegacyTask:
+    title: str
+    priority: str
+    isDone: bool = False
+    id: int = 0
+
+
+def make_dump(count: int, repeated_titles: bool) -> str:
+    priorities = ["low", "normal", "high"]
+    records = [
+        {
+            "id": i + 1,
+            "title": f"Задача {i % 100 if repeated_titles else i}",
+            "priority": priorities[i % 3],
+            "isDone": i % 4 == 0
+        }
+        for i in range(count)
+    ]
+    return json.dumps(records, ensure_ascii=False)
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def build_legacy(records: list[dict]) -> dict:
+    return {
+        r["id"]: LegacyTask(id=r["id"], title=r["title"], priority=r["priority"], isDone=r["isDone"])
+        for r in records
+    }
+
+
+def build_slotted(records: list[dict]) -> dict:
+    return {r["id"]: Task.from_dict(r) for r in records}
+
+
+def build_table(records: list[dict]) -> TaskTable:
+    table = TaskTable()
+    for r in records:
+        table[r["id"]] = Task.from_dict(r)
+    return table
+
+
+def build_index(records: list[dict]) -> TaskIndex:
+    index = TaskIndex()
+    index.rebuild(Task.from_dict(r) for r in records)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на одну задачу в разных представлениях")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--json", dest="json_path", help="записать результаты в JSON-файл")
+    args = parser.parse_args()
+    
+    results = {}
+    for repeated in (False, True):
+        dump = make_dump(args.count, repeated)
+        # задачи строятся из json.loads, как в _load(); считается только то, что осталось после сборки
+        for name, build in (("dataclass (до)", build_legacy),
+                            ("slotted Task", build_slotted),
+                            ("TaskTable", build_table),
+                            ("TaskIndex", build_index)):
+            key = f"{name}, {'повторяющиеся' if repeated else 'уникальные'} заголовки"
+            results[key] = measure(lambda: build(json.loads(dump))) / args.count
+    
+    print(f"Задач: {args.count}")
+    print("-" * 60)
+    for key, per_task in results.items():
+        print(f"{key:<48} {per_task:8.1f} байт/задачу")
+    
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({"count": args.count, "bytes_per_task": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 
+import argparse
+
 from src.config import Config
 from src.server import TaskServer
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Task Manager API Server")
+    parser.add_argument("--profile", action="store_true",
+                        help="профилировать обработку запросов через cProfile (см. секцию profiling)")
+    args = parser.parse_args()
+    
     config = Config.load()
+    if args.profile:
+        config.profiling.enabled = True
     server = TaskServer(config)
     server.run()
 
@@ -0,0 +1,65 @@
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Optional, TextIO
+
+from . import codec
+from .metrics import ACCESS_LOG_DROPPED
+
+
+class AccessLog:
+    
+    def __init__(self, file_path: Optional[str] = None, sample_rate: float = 1.0,
+                 flush_interval: float = 0.5, max_buffered: int = 100_000):
+        self._own_stream = bool(file_path)
+        self._stream: TextIO = open(file_path, 'a', encoding='utf-8') if file_path else sys.stdout
+        self._sample_rate = sample_rate
+        self._flush_interval = flush_interval
+        self._max_buffered = max_buffered
+        # deque.append и popleft атомарны, так что запросу не нужна блокировка
+        self._records: deque = deque()
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="task-access-log", daemon=True)
+        self._writer.start()
+    
+    def record(self, method: str, path: str, status: int, duration: float, size: int) -> None:
+        # ошибки сервера пишутся всегда, остальное с заданной долей
+        if status < 500 and self._sample_rate < 1.0 and random.random() >= self._sample_rate:
+            return
+        if len(self._records) >= self._max_buffered:
+            ACCESS_LOG_DROPPED.inc()
+            return
+        self._records.append((time.time(), method, path, status, duration, size))
+    
+    def _run(self) -> None:
+        while not self._closed.wait(self._flush_interval):
+            self._flush()
+        self._flush()
+    
+    def _flush(self) -> None:
+        lines = []
+        while self._records:
+            timestamp, method, path, status, duration, size = self._records.popleft()
+            lines.append(codec.dumps({
+                "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(timestamp))
+                      + f".{int(timestamp * 1000) % 1000:03d}",
+                "method": method,
+                "path": path,
+                "status": status,
+                "duration_ms": round(duration * 1000, 3),
+                "bytes": size
+            }).decode('utf-8'))
+        if lines:
+            try:
+                self._stream.write("\n".join(lines) + "\n")
+                self._stream.flush()
+            except (OSError, ValueError) as e:
+                print(f"✗ Ошибка записи журнала доступа: {e}", file=sys.stderr)
+    
+    def close(self) -> None:
+        self._closed.set()
+        self._writer.join()
+        if self._own_stream:
+            self._stream.close()
@@ -0,0 +1,189 @@
+import gzip
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from . import codec
+from .indexes import TaskIndex
+from .metrics import STORAGE_BYTES_WRITTEN
+from .models import Priority, Task
+
+
+# Сегмент - пара файлов, оба пишутся один раз и больше не меняются:
+#   segment-NNNNNN.ndjson.gz - задачи по возрастанию id, по одной JSON-строке
+#   segment-NNNNNN.idx - заголовок (число задач, максимальный id), ids q[n], коды приоритетов B[n]
+# .idx пишется последним: сегмент без него недописан и при чтении пропускается
+SEGMENT_TASKS = 10000
+# разобранных сегментов в памяти: соседние страницы обычно попадают в один и тот же
+SEGMENT_CACHE = 4
+COMPRESS_LEVEL = 6
+INDEX_HEADER = struct.Struct('<QQ')
+PRIORITY_NAMES = [priority.value for priority in Priority]
+PRIORITY_CODES = {name: code for code, name in enumerate(PRIORITY_NAMES)}
+
+
+def _write_file(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _has(ids: array, task_id: int) -> bool:
+    position = bisect_left(ids, task_id)
+    return position < len(ids) and ids[position] == task_id
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class TaskArchive:
+    
+    def __init__(self, directory: Path):
+        self._directory = directory
+        self._lock = threading.Lock()
+        # индекс и id сегментов читаются при первом запросе к архиву, а не при запуске
+        self._index: Optional[TaskIndex] = None
+        self._segments: dict[int, array] = {}
+        self._cache: OrderedDict[int, dict[int, dict]] = OrderedDict()
+        numbers = self._segment_numbers()
+        self._next_segment = max(numbers, default=0) + 1
+        # в рабочем наборе архивных задач уже нет: без этого id выдавались бы повторно
+        self.max_id = max((self._read_header(number)[1] for number in numbers), default=0)
+    
+    def _path(self, number: int, suffix: str) -> Path:
+        return self._directory / f"segment-{number:06d}{suffix}"
+    
+    def _segment_numbers(self) -> list[int]:
+        if not self._directory.exists():
+            return []
+        return sorted(int(path.name[len("segment-"):-len(".idx")])
+                      for path in self._directory.glob("segment-*.idx"))
+    
+    def _read_header(self, number: int) -> tuple[int, int]:
+        with open(self._path(number, '.idx'), 'rb') as f:
+            return INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+    
+    def _read_index(self, number: int) -> tuple[array, array]:
+        data = self._path(number, '.idx').read_bytes()
+        count, _ = INDEX_HEADER.unpack_from(data)
+        ids = array('q')
+        ids.frombytes(data[INDEX_HEADER.size:INDEX_HEADER.size + count * ids.itemsize])
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        priorities = array('B', data[INDEX_HEADER.size + count * ids.itemsize:])
+        return ids, priorities
+    
+    def append(self, records: list[dict]) -> None:
+        # records отсортированы по id; сегмент на диске до того, как задачи станут видны в индексе
+        self._directory.mkdir(parents=True, exist_ok=True)
+        for start in range(0, len(records), SEGMENT_TASKS):
+            chunk = records[start:start + SEGMENT_TASKS]
+            ids = array('q', (record['id'] for record in chunk))
+            priorities = array('B', (PRIORITY_CODES.get(record['priority'], 1) for record in chunk))
+            
+            body = gzip.compress(b''.join(codec.dumps(record) + b'\n' for record in chunk),
+                                 COMPRESS_LEVEL, mtime=0)
+            index = INDEX_HEADER.pack(len(ids), ids[-1]) + _little_endian(ids) + priorities.tobytes()
+            with self._lock:
+                number = self._next_segment
+                self._next_segment += 1
+            _write_file(self._path(number, '.ndjson.gz'), body)
+            _write_file(self._path(number, '.idx'), index)
+            STORAGE_BYTES_WRITTEN.inc('archive', amount=len(body) + len(index))
+            
+            with self._lock:
+                self.max_id = max(self.max_id, ids[-1])
+                if self._index is not None:
+                    self._segments[number] = ids
+                    for task_id, code in zip(ids, priorities):
+                        if not _has(self._index.ids, task_id):
+                            self._index.add(Task(id=task_id, title='', priority=PRIORITY_NAMES[code],
+                                                 isDone=True))
+    
+    def _loaded_index(self) -> TaskIndex:
+        # вызывается под self._lock
+        if self._index is None:
+            # после сбоя между записью сегмента и удалением из рабочего набора задача
+            # архивируется повторно; в индексе остаётся одна копия
+            codes: dict[int, int] = {}
+            for number in self._segment_numbers():
+                ids, priorities = self._read_index(number)
+                self._segments[number] = ids
+                codes.update(zip(ids, priorities))
+            buckets: dict[str, list[int]] = {name: [] for name in PRIORITY_NAMES}
+            for task_id, code in codes.items():
+                buckets[PRIORITY_NAMES[code]].append(task_id)
+            index = TaskIndex()
+            index.load(array('q', sorted(codes)),
+                       {(name, True): array('q', sorted(ids)) for name, ids in buckets.items()})
+            self._index = index
+        return self._index
+    
+    def contains(self, task_id: int) -> bool:
+        with self._lock:
+            return _has(self._loaded_index().ids, task_id)
+    
+    def counts(self) -> dict[tuple[str, bool], int]:
+        with self._lock:
+            return self._loaded_index().counts()
+    
+    def query(self, priority: Optional[str] = None, is_done: Optional[bool] = None,
+              cursor: Optional[int] = None, limit: Optional[int] = None,
+              descending: bool = False) -> tuple[list[Task], Optional[int]]:
+        # в архиве только выполненные задачи
+        if is_done is False:
+            return [], None
+        with self._lock:
+            fetch = None if limit is None else limit + 1
+            ids = self._loaded_index().page(priority, is_done, cursor, fetch, descending)
+            next_cursor = None
+            if limit is not None and len(ids) > limit:
+                ids = ids[:limit]
+                next_cursor = ids[-1]
+            records = self._read_records(ids)
+        return [Task.from_dict(records[task_id]) for task_id in ids], next_cursor
+    
+    def _read_records(self, task_ids: list[int]) -> dict[int, dict]:
+        found: dict[int, dict] = {}
+        if not task_ids:
+            return found
+        low, high = min(task_ids), max(task_ids)
+        # сегменты пишутся по времени архивации, поэтому диапазоны id почти не пересекаются
+        # и страница обычно читает один-два сегмента
+        for number, ids in self._segments.items():
+            if ids[0] > high or ids[-1] < low:
+                continue
+            wanted = [task_id for task_id in task_ids
+                      if task_id not in found and _has(ids, task_id)]
+            if wanted:
+                records = self._segment_records(number)
+                found.update((task_id, records[task_id]) for task_id in wanted)
+                if len(found) == len(task_ids):
+                    break
+        return found
+    
+    def _segment_records(self, number: int) -> dict[int, dict]:
+        records = self._cache.get(number)
+        if records is not None:
+            self._cache.move_to_end(number)
+            return records
+        
+        data = gzip.decompress(self._path(number, '.ndjson.gz').read_bytes())
+        records = {record['id']: record for record in map(codec.loads, data.splitlines())}
+        self._cache[number] = records
+        while len(self._cache) > SEGMENT_CACHE:
+            self._cache.popitem(last=False)
+        return records
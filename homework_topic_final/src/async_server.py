@@ -0,0 +1,297 @@
+import asyncio
+import contextlib
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from http.client import HTTPMessage, parse_headers
+from io import BytesIO
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+from .handlers import TaskRoutes
+
+
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class AsyncTaskRequest(TaskRoutes):
+    
+    def __init__(self, command: str, path: str, version: str,
+                 headers: HTTPMessage, body: bytes, client_address: tuple):
+        self.command = command
+        self.path = path
+        self.request_version = version
+        self.requestline = f"{command} {path} {version}"
+        self.headers = headers
+        self._body = body
+        self.client_address = client_address
+        self.response: Optional[tuple[int, list[tuple[str, str]], bytes]] = None
+        # отложенные ответы /tasks/changes: их дожидается цикл событий, а не поток пула
+        self.pending: Optional[Callable[[], Awaitable[None]]] = None
+        self.stream: Optional[AsyncIterator[bytes]] = None
+        # тело по кускам из хранилища: каждый кусок готовит пул, в сокет пишет цикл событий
+        self.chunks: Optional[Iterator[bytes]] = None
+    
+    def _read_body(self, length: int) -> bytes:
+        return self._body[:length]
+    
+    def _write_response(self, status: int, headers: list[tuple[str, str]], body: bytes) -> None:
+        self.response = (status, headers, body)
+    
+    def _write_stream(self, status: int, headers: list[tuple[str, str]],
+                      chunks: Iterator[bytes]) -> None:
+        self._deferred = True
+        self.response = (status, headers, b'')
+        self.chunks = self._count_chunks(chunks)
+    
+    def _count_chunks(self, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        try:
+            for chunk in chunks:
+                self._sent_bytes += len(chunk)
+                yield chunk
+        finally:
+            self._finish_request()
+    
+    def dispatch(self) -> tuple[int, list[tuple[str, str]], bytes]:
+        method = getattr(self, 'do_' + self.command, None)
+        if method is None:
+            self._send_error_response("Method Not Allowed", 405)
+        else:
+            method()
+        return self.response
+    
+    def _wait_changes(self, since: int, wait: int) -> None:
+        self._deferred = True
+        self.pending = lambda: self._finish_wait(since, wait)
+    
+    async def _finish_wait(self, since: int, wait: int) -> None:
+        try:
+            self._send_changes(*await self.changes.wait_async(since, wait))
+        finally:
+            self._finish_request()
+    
+    def _stream_changes(self, since: Optional[int]) -> None:
+        self._deferred = True
+        self._status = 200
+        self.response = (200, self._sse_headers(), b'')
+        self.stream = self._iter_changes(since)
+    
+    async def _iter_changes(self, since: Optional[int]) -> AsyncIterator[bytes]:
+        chunk, since = self._sse_start(since)
+        try:
+            while True:
+                self._sent_bytes += len(chunk)
+                yield chunk
+                if self.changes.closed:
+                    return
+                version, entries = await self.changes.wait_async(since, self.SSE_HEARTBEAT)
+                chunk, since = self._sse_events(since, version, entries)
+        finally:
+            self._finish_request()
+
+
+class AsyncTaskServer:
+    
+    def __init__(self, server_address: tuple, workers: int, keepalive_timeout: float,
+                 sock: Optional[socket.socket] = None, max_queue: int = 0):
+        self._keepalive_timeout = keepalive_timeout
+        self._socket = sock or socket.create_server(server_address, backlog=1024)
+        self.server_address = self._socket.getsockname()[:2]
+        # в пуле выполняются только запросы к хранилищу: ожидание блокировки и запись на диск
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task-api-io")
+        self._retired: list[ThreadPoolExecutor] = []
+        # запросы, отданные в пул; меняется только в цикле событий, блокировка не нужна
+        self._pending = 0
+        self._max_pending = workers + max_queue if max_queue > 0 else 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._started = threading.Event()
+    
+    def serve_forever(self) -> None:
+        asyncio.run(self._serve())
+    
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, sock=self._socket)
+        self._started.set()
+        try:
+            await self._stopping.wait()
+        finally:
+            # keep-alive соединения не ждём: asyncio.run отменит их задачи при выходе
+            self._server.close()
+    
+    def shutdown(self) -> None:
+        self._started.wait()
+        self._loop.call_soon_threadsafe(self._stopping.set)
+    
+    def resize(self, workers: int, max_queue: int) -> None:
+        self._started.wait()
+        self._loop.call_soon_threadsafe(self._resize, workers, max_queue)
+    
+    def _resize(self, workers: int, max_queue: int) -> None:
+        # пул подменяется в цикле событий, поэтому run_in_executor видит либо старый, либо новый;
+        # старый дорабатывает уже отданные ему запросы
+        previous = self._executor
+        self._retired.append(previous)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task-api-io")
+        self._max_pending = workers + max_queue if max_queue > 0 else 0
+        previous.shutdown(wait=False)
+    
+    def server_close(self) -> None:
+        self._socket.close()
+        for executor in self._retired + [self._executor]:
+            executor.shutdown(wait=True)
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        client_address = writer.get_extra_info('peername') or ('', 0)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, client_address),
+                                                     self._keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if request is None:
+                    break
+                if isinstance(request, int):
+                    writer.write(self._encode_response(request, [], b'', 'HTTP/1.1', False))
+                    await writer.drain()
+                    break
+                
+                keep_alive = self._wants_keep_alive(request)
+                # лента изменений только читает буфер в памяти, ей пул не нужен
+                if request.path == '/health' or request.path.startswith('/tasks/changes'):
+                    request.dispatch()
+                elif self._max_pending and self._pending >= self._max_pending:
+                    # очередь пула полна: 503 отвечает сам цикл, не дожидаясь потока
+                    request.overloaded = True
+                    keep_alive = False
+                    request.dispatch()
+                else:
+                    self._pending += 1
+                    try:
+                        await loop.run_in_executor(self._executor, request.dispatch)
+                    finally:
+                        self._pending -= 1
+                if request.pending is not None:
+                    await request.pending()
+                if request.stream is not None:
+                    await self._write_stream(request, writer)
+                    break
+                if request.chunks is not None:
+                    if not await self._write_chunks(request, writer, keep_alive):
+                        break
+                    continue
+                status, headers, body = request.response
+                writer.write(self._encode_response(status, headers, body,
+                                                   request.request_version, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except asyncio.CancelledError:
+            # остановка сервера посреди SSE или keep-alive: соединение просто закрывается,
+            # иначе asyncio печатал бы отмену задачи как ошибку
+            pass
+        finally:
+            writer.close()
+    
+    async def _write_stream(self, request: AsyncTaskRequest, writer: asyncio.StreamWriter) -> None:
+        status, headers, _ = request.response
+        writer.write(self._encode_response(status, headers, b'', request.request_version, False,
+                                           stream=True))
+        try:
+            async for chunk in request.stream:
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            await request.stream.aclose()
+    
+    async def _write_chunks(self, request: AsyncTaskRequest, writer: asyncio.StreamWriter,
+                            keep_alive: bool) -> bool:
+        loop = asyncio.get_running_loop()
+        # в HTTP/1.0 нет chunked, там конец тела - закрытие соединения
+        chunked = request.request_version == 'HTTP/1.1'
+        status, headers, _ = request.response
+        if chunked:
+            headers = headers + [('Transfer-Encoding', 'chunked')]
+        keep_alive = keep_alive and chunked
+        writer.write(self._encode_response(status, headers, b'', request.request_version, keep_alive,
+                                           stream=True))
+        try:
+            while True:
+                # следующий кусок читает хранилище под блокировкой, циклу событий это нельзя
+                chunk = await loop.run_in_executor(self._executor, next, request.chunks, None)
+                if chunk is None:
+                    break
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+                await writer.drain()
+            if chunked:
+                writer.write(b'0\r\n\r\n')
+                await writer.drain()
+        finally:
+            # при отмене кусок может ещё готовиться в пуле, тогда генератор закроет сборщик мусора
+            with contextlib.suppress(ValueError):
+                request.chunks.close()
+        return keep_alive
+    
+    async def _read_request(self, reader: asyncio.StreamReader, client_address: tuple):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            return HTTPStatus.BAD_REQUEST
+        command, path, version = parts
+        
+        raw_headers = bytearray()
+        while True:
+            line = await reader.readline()
+            if not line:
+                return None
+            raw_headers += line
+            if line in (b'\r\n', b'\n'):
+                break
+            if len(raw_headers) > MAX_HEADER_BYTES:
+                return HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE
+        headers = parse_headers(BytesIO(bytes(raw_headers)))
+        
+        if headers.get('Transfer-Encoding'):
+            return HTTPStatus.NOT_IMPLEMENTED
+        try:
+            content_length = int(headers.get('Content-Length', 0))
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST
+        body = await reader.readexactly(content_length) if content_length > 0 else b''
+        
+        return AsyncTaskRequest(command, path, version, headers, body, client_address)
+    
+    def _wants_keep_alive(self, request: AsyncTaskRequest) -> bool:
+        connection = request.headers.get('Connection', '').lower()
+        if request.request_version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+    
+    def _encode_response(self, status: int, headers: list[tuple[str, str]], body: bytes,
+                         version: str, keep_alive: bool, stream: bool = False) -> bytes:
+        status = HTTPStatus(status)
+        lines = [
+            f"{version} {status.value} {status.phrase}",
+            f"Date: {formatdate(usegmt=True)}",
+        ]
+        # длина потока заранее неизвестна: его конец - нулевой кусок chunked или закрытие соединения
+        if status != HTTPStatus.NOT_MODIFIED and not stream:
+            lines.append(f"Content-Length: {len(body)}")
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if not keep_alive:
+            lines.append("Connection: close")
+        elif version == 'HTTP/1.0':
+            lines.append("Connection: keep-alive")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
@@ -0,0 +1,37 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class ResponseCache:
+    
+    def __init__(self, max_entries: int = 256, epoch: Optional[str] = None):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[int, list[tuple[str, str]], bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        # версия хранилища начинается с нуля при каждом запуске, epoch не даёт ETag совпасть;
+        # pre-fork воркеры получают общий epoch, иначе ETag зависел бы от принявшего процесса
+        self.epoch = epoch or os.urandom(4).hex()
+    
+    def etag(self, version: int, variant: str = '') -> str:
+        # variant различает представления одной версии, например JSON и NDJSON
+        return f'"{self.epoch}-{version}{variant}"'
+    
+    def get(self, key: Hashable, version: int) -> Optional[tuple[list[tuple[str, str]], bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+    
+    def put(self, key: Hashable, version: int, headers: list[tuple[str, str]], body: bytes) -> None:
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current[0] > version:
+                return
+            self._entries[key] = (version, headers, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+# (версия, записи одной мутации); None вместо списка - клиент отстал и должен перечитать /tasks
+ChangeEntries = Optional[list[tuple[int, list[dict]]]]
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeFeed:
+    
+    def __init__(self, capacity: int = 1024):
+        # нумерация продолжается от текущего времени, а не с нуля: после перезапуска
+        # since от старого процесса окажется раньше начала буфера и получит resync
+        self.version = time.time_ns() // 1000
+        self._entries: deque[tuple[int, list[dict]]] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.closed = False
+    
+    def publish(self, records: list[dict]) -> None:
+        if not records:
+            return
+        with self._lock:
+            self.version += 1
+            records = [{"version": self.version, **record} for record in records]
+            self._entries.append((self.version, records))
+            self._changed.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        self._wake_async(waiters)
+    
+    def read(self, since: Optional[int]) -> tuple[int, ChangeEntries]:
+        with self._lock:
+            return self.version, self._read(since)
+    
+    def _read(self, since: Optional[int]) -> ChangeEntries:
+        if since is None:
+            return []
+        oldest = self._entries[0][0] if self._entries else self.version + 1
+        if since > self.version or since < oldest - 1:
+            return None
+        # новые записи в конце буфера, поэтому идём с конца до since
+        entries = []
+        for entry in reversed(self._entries):
+            if entry[0] <= since:
+                break
+            entries.append(entry)
+        entries.reverse()
+        return entries
+    
+    def wait(self, since: Optional[int], timeout: float) -> tuple[int, ChangeEntries]:
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                entries = self._read(since)
+                remaining = deadline - time.monotonic()
+                if entries != [] or self.closed or remaining <= 0:
+                    return self.version, entries
+                self._changed.wait(remaining)
+    
+    async def wait_async(self, since: Optional[int], timeout: float) -> tuple[int, ChangeEntries]:
+        # ожидание в цикле событий: подписчик asyncio-движка не занимает поток пула
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._lock:
+                entries = self._read(since)
+                remaining = deadline - loop.time()
+                if entries != [] or self.closed or remaining <= 0:
+                    return self.version, entries
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+    
+    def _wake_async(self, waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]]) -> None:
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # цикл уже закрыт, будить некого
+                pass
+    
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            self._changed.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        self._wake_async(waiters)
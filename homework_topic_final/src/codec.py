@@ -0,0 +1,71 @@
+import json
+import re
+from typing import Any, Iterator, TextIO
+
+try:
+    import orjson
+    USE_ORJSON = True
+except ImportError:
+    USE_ORJSON = False
+
+
+DecodeError = json.JSONDecodeError
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\r\n]*')
+
+
+def dumps(data: Any, indent: bool = False) -> bytes:
+    if USE_ORJSON:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data: bytes | str) -> Any:
+    if USE_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def iter_array(f: TextIO, chunk_size: int = 1024 * 1024) -> Iterator[Any]:
+    # разбирает JSON-массив поэлементно, не держа в памяти ни весь текст, ни весь список
+    buffer = f.read(chunk_size)
+    eof = not buffer
+    pos = _skip_whitespace(buffer, 0)
+    if buffer[pos:pos + 1] != '[':
+        raise DecodeError("Expecting '['", buffer, pos)
+    pos += 1
+    
+    while True:
+        pos = _skip_whitespace(buffer, pos)
+        if pos < len(buffer) and buffer[pos] == ',':
+            pos = _skip_whitespace(buffer, pos + 1)
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        
+        try:
+            value, end = _decoder.raw_decode(buffer, pos)
+            # число на границе чанка могло разобраться не целиком
+            complete = end < len(buffer) or eof
+        except DecodeError:
+            if eof:
+                raise
+            complete = False
+        
+        if complete:
+            yield value
+            pos = end
+            continue
+        
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        if eof and not buffer.strip():
+            raise DecodeError("Unterminated array", buffer, pos)
+
+
+def _skip_whitespace(buffer: str, pos: int) -> int:
+    return _whitespace.match(buffer, pos).end()
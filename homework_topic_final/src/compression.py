@@ -0,0 +1,76 @@
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+
+try:
+    import brotli
+    USE_BROTLI = True
+except ImportError:
+    USE_BROTLI = False
+
+
+ENCODING_BROTLI = "br"
+ENCODING_GZIP = "gzip"
+ENCODING_DEFLATE = "deflate"
+
+
+class ResponseCompressor:
+    
+    def __init__(self, min_size: int = 1024, level: int = 1):
+        # меньше порога сжатие почти ничего не даёт, а заголовок gzip ещё и добавляет байты
+        self.min_size = min_size
+        self._level = level
+        # порядок задаёт выбор сервера, если клиент принимает несколько кодировок с одним q
+        self.encodings = ([ENCODING_BROTLI] if USE_BROTLI else []) + [ENCODING_GZIP, ENCODING_DEFLATE]
+    
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        if not accept_encoding:
+            return None
+        weights = {}
+        for item in accept_encoding.split(','):
+            name, _, params = item.partition(';')
+            weight = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    weight = float(params[2:])
+                except ValueError:
+                    weight = 0.0
+            weights[name.strip().lower()] = weight
+        
+        best, best_weight = None, 0.0
+        for encoding in self.encodings:
+            weight = weights.get(encoding, weights.get('*', 0.0))
+            if weight > best_weight:
+                best, best_weight = encoding, weight
+        return best
+    
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == ENCODING_BROTLI:
+            return brotli.compress(body, quality=min(self._level, 11))
+        if encoding == ENCODING_GZIP:
+            # mtime=0: одинаковое тело даёт одинаковые байты
+            return gzip.compress(body, self._level, mtime=0)
+        if encoding == ENCODING_DEFLATE:
+            # deflate в HTTP - это поток zlib (RFC 1950), а не "сырой" deflate
+            return zlib.compress(body, self._level)
+        raise ValueError(f"Unknown content encoding: {encoding}")
+    
+    def compress_stream(self, chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+        # один компрессор на весь ответ: словарь общий для всех кусков, а в памяти только окно
+        if encoding == ENCODING_BROTLI:
+            compressor = brotli.Compressor(quality=min(self._level, 11))
+            compress, finish = compressor.process, compressor.finish
+        elif encoding in (ENCODING_GZIP, ENCODING_DEFLATE):
+            wbits = 16 + zlib.MAX_WBITS if encoding == ENCODING_GZIP else zlib.MAX_WBITS
+            compressor = zlib.compressobj(self._level, zlib.DEFLATED, wbits)
+            compress, finish = compressor.compress, compressor.flush
+        else:
+            raise ValueError(f"Unknown content encoding: {encoding}")
+        
+        for chunk in chunks:
+            data = compress(chunk)
+            # компрессор копит мелкие куски; пустой кусок в chunked означал бы конец тела
+            if data:
+                yield data
+        yield finish()
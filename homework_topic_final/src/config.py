@@ -1,15 +1,61 @@
 import os
+import threading
+import time
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    import yaml
+    # CSafeLoader есть, только если PyYAML собран с libyaml
+    YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    USE_YAML = True
+except ImportError:
+    USE_YAML = False
+
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / "config.yml"
+
+# путь -> (mtime, размер, разобранный конфиг)
+_parsed: dict[Path, tuple[int, int, dict]] = {}
+_parsed_lock = threading.Lock()
+
+
+def _file_stamp(file_path: Path) -> Optional[tuple[int, int]]:
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
 
 def parse_yaml(file_path: Path) -> dict:
+    # повторная загрузка неизменённого файла не читает диск; результат общий, его не меняют
+    stamp = _file_stamp(file_path)
+    if stamp is None:
+        return {}
+    with _parsed_lock:
+        cached = _parsed.get(file_path)
+    if cached is not None and cached[:2] == stamp:
+        return cached[2]
+    
+    config = _load_yaml(file_path) if USE_YAML else _parse_simple_yaml(file_path)
+    with _parsed_lock:
+        _parsed[file_path] = (*stamp, config)
+    return config
+
+
+def _load_yaml(file_path: Path) -> dict:
+    with open(file_path, 'rb') as f:
+        data = yaml.load(f, Loader=YamlLoader) or {}
+    # пустая секция в YAML - это None, а не словарь
+    return {section: values or {} for section, values in data.items()}
+
+
+def _parse_simple_yaml(file_path: Path) -> dict:
     config = {}
     current_section = None
     
-    if not file_path.exists():
-        return config
-    
     with open(file_path, 'r', encoding='utf-8') as f:
         for line in f:
             line = line.rstrip()
@@ -39,34 +85,214 @@ def parse_yaml(file_path: Path) -> dict:
 class ServerConfig:
     host: str = "127.0.0.1"
     port: int = 8000
+    workers: int = 1
+    processes: int = 1
+    engine: str = "threaded"
+    keepalive_timeout: int = 75
+    access_log: bool = True
+    access_log_file: str = ""
+    access_log_sample_rate: float = 1.0
+    # как часто проверять config.yml на изменения, 0 - только по SIGHUP
+    reload_interval: float = 0
 
 
 @dataclass  
 class StorageConfig:
+    backend: str = "file"
     file: str = "data/tasks.txt"
+    database: str = "data/tasks.db"
+    mode: str = "json"
+    layout: str = "objects"
+    streaming_load: bool = False
+    snapshot_format: str = "json"
+    shards: int = 1
+    shard_block_size: int = 1024
+    shard_persistence: str = "thread"
+    log_compact_bytes: int = 1024 * 1024
+    sync: str = "always"
+    sync_window_ms: int = 5
+    sync_interval_ms: int = 1000
+
+
+@dataclass
+class CacheConfig:
+    max_entries: int = 256
+    # полные списки от стольких задач отдаются потоком по кускам, мимо кэша
+    stream_threshold: int = 10000
+
+
+@dataclass
+class ProfilingConfig:
+    enabled: bool = False
+    capture: bool = True
+    output_dir: str = "data/profiles"
+    dump_interval: int = 60
+
+
+@dataclass
+class CompressionConfig:
+    enabled: bool = True
+    min_size: int = 1024
+    level: int = 1
+
+
+@dataclass
+class LimitsConfig:
+    # запросов в секунду на клиента, 0 - без ограничения
+    rate: float = 0.0
+    burst: int = 20
+    # заголовок с ключом клиента; учитывается, только если ключ есть в api_keys, иначе лимит по адресу
+    key_header: str = ""
+    api_keys: tuple[str, ...] = ()
+    max_clients: int = 10000
+    # запросов сверх занятых воркеров, 0 - очередь не ограничена
+    max_queue: int = 0
+    retry_after: int = 1
+
+
+@dataclass
+class ArchiveConfig:
+    enabled: bool = False
+    # выполненные задачи старше стольких секунд уходят из рабочего набора в архив
+    max_age: int = 7 * 24 * 3600
+    # как часто искать такие задачи, в секундах
+    interval: int = 300
+
+
+@dataclass
+class IdempotencyConfig:
+    enabled: bool = True
+    max_entries: int = 10000
+    # столько секунд повтор с тем же Idempotency-Key получает сохранённый ответ
+    ttl: int = 24 * 3600
+    # столько повтор ждёт ответа на ещё выполняющийся запрос, потом 409
+    wait_timeout: int = 30
+
+
+@dataclass
+class ChangesConfig:
+    buffer_size: int = 1024
+    max_wait: int = 60
 
 
 @dataclass
 class Config:
     server: ServerConfig
     storage: StorageConfig
+    cache: CacheConfig
+    profiling: ProfilingConfig = field(default_factory=ProfilingConfig)
+    changes: ChangesConfig = field(default_factory=ChangesConfig)
+    compression: CompressionConfig = field(default_factory=CompressionConfig)
+    limits: LimitsConfig = field(default_factory=LimitsConfig)
+    archive: ArchiveConfig = field(default_factory=ArchiveConfig)
+    idempotency: IdempotencyConfig = field(default_factory=IdempotencyConfig)
+    path: Path = DEFAULT_CONFIG_PATH
     
     @classmethod
     def load(cls, config_path: Path = None) -> "Config":
         if config_path is None:
-            config_path = Path(__file__).parent.parent / "config.yml"
+            config_path = DEFAULT_CONFIG_PATH
         
         yaml_config = parse_yaml(config_path)
         
         server_cfg = yaml_config.get('server', {})
         storage_cfg = yaml_config.get('storage', {})
+        cache_cfg = yaml_config.get('cache', {})
+        profiling_cfg = yaml_config.get('profiling', {})
+        changes_cfg = yaml_config.get('changes', {})
+        compression_cfg = yaml_config.get('compression', {})
+        limits_cfg = yaml_config.get('limits', {})
+        archive_cfg = yaml_config.get('archive', {})
+        idempotency_cfg = yaml_config.get('idempotency', {})
         
         return cls(
             server=ServerConfig(
                 host=os.getenv('HOST', server_cfg.get('host', '127.0.0.1')),
-                port=int(os.getenv('PORT', server_cfg.get('port', 8000)))
+                port=int(os.getenv('PORT', server_cfg.get('port', 8000))),
+                workers=int(os.getenv('WORKERS', server_cfg.get('workers', 1))),
+                processes=int(os.getenv('SERVER_PROCESSES', server_cfg.get('processes', 1))),
+                engine=os.getenv('SERVER_ENGINE', server_cfg.get('engine', 'threaded')),
+                keepalive_timeout=int(server_cfg.get('keepalive_timeout', 75)),
+                access_log=bool(server_cfg.get('access_log', True)),
+                access_log_file=os.getenv('ACCESS_LOG_FILE', server_cfg.get('access_log_file', '')),
+                access_log_sample_rate=float(server_cfg.get('access_log_sample_rate', 1.0)),
+                reload_interval=float(server_cfg.get('reload_interval', 0))
             ),
             storage=StorageConfig(
-                file=os.getenv('TASKS_FILE', storage_cfg.get('file', 'data/tasks.txt'))
-            )
+                backend=os.getenv('TASKS_BACKEND', storage_cfg.get('backend', 'file')),
+                file=os.getenv('TASKS_FILE', storage_cfg.get('file', 'data/tasks.txt')),
+                database=os.getenv('TASKS_DATABASE', storage_cfg.get('database', 'data/tasks.db')),
+                mode=os.getenv('TASKS_STORAGE_MODE', storage_cfg.get('mode', 'json')),
+                layout=os.getenv('TASKS_LAYOUT', storage_cfg.get('layout', 'objects')),
+                streaming_load=bool(storage_cfg.get('streaming_load', False)),
+                snapshot_format=os.getenv('TASKS_SNAPSHOT_FORMAT', storage_cfg.get('snapshot_format', 'json')),
+                shards=int(os.getenv('TASKS_SHARDS', storage_cfg.get('shards', 1))),
+                shard_block_size=int(storage_cfg.get('shard_block_size', 1024)),
+                shard_persistence=storage_cfg.get('shard_persistence', 'thread'),
+                log_compact_bytes=int(storage_cfg.get('log_compact_bytes', 1024 * 1024)),
+                sync=os.getenv('TASKS_SYNC', storage_cfg.get('sync', 'always')),
+                sync_window_ms=int(storage_cfg.get('sync_window_ms', 5)),
+                sync_interval_ms=int(storage_cfg.get('sync_interval_ms', 1000))
+            ),
+            cache=CacheConfig(
+                max_entries=int(cache_cfg.get('max_entries', 256)),
+                stream_threshold=int(cache_cfg.get('stream_threshold', 10000))
+            ),
+            profiling=ProfilingConfig(
+                enabled=bool(profiling_cfg.get('enabled', False)),
+                capture=bool(profiling_cfg.get('capture', True)),
+                output_dir=profiling_cfg.get('output_dir', 'data/profiles'),
+                dump_interval=int(profiling_cfg.get('dump_interval', 60))
+            ),
+            changes=ChangesConfig(
+                buffer_size=int(changes_cfg.get('buffer_size', 1024)),
+                max_wait=int(changes_cfg.get('max_wait', 60))
+            ),
+            compression=CompressionConfig(
+                enabled=bool(compression_cfg.get('enabled', True)),
+                min_size=int(compression_cfg.get('min_size', 1024)),
+                level=int(compression_cfg.get('level', 1))
+            ),
+            limits=LimitsConfig(
+                rate=float(limits_cfg.get('rate', 0.0)),
+                burst=int(limits_cfg.get('burst', 20)),
+                key_header=limits_cfg.get('key_header') or '',
+                api_keys=tuple(str(key) for key in limits_cfg.get('api_keys') or ()),
+                max_clients=int(limits_cfg.get('max_clients', 10000)),
+                max_queue=int(limits_cfg.get('max_queue', 0)),
+                retry_after=int(limits_cfg.get('retry_after', 1))
+            ),
+            archive=ArchiveConfig(
+                enabled=bool(archive_cfg.get('enabled', False)),
+                max_age=int(archive_cfg.get('max_age', 7 * 24 * 3600)),
+                interval=int(archive_cfg.get('interval', 300))
+            ),
+            idempotency=IdempotencyConfig(
+                enabled=bool(idempotency_cfg.get('enabled', True)),
+                max_entries=int(idempotency_cfg.get('max_entries', 10000)),
+                ttl=int(idempotency_cfg.get('ttl', 24 * 3600)),
+                wait_timeout=int(idempotency_cfg.get('wait_timeout', 30))
+            ),
+            path=config_path
         )
+
+
+class ConfigWatcher:
+    
+    def __init__(self, path: Path, interval: float):
+        self._path = path
+        self._interval = interval
+        self._stamp = _file_stamp(path)
+        self._next_check = time.monotonic() + interval
+    
+    def changed(self) -> bool:
+        # stat не чаще interval, сколько бы раз ни спрашивали
+        now = time.monotonic()
+        if self._interval <= 0 or now < self._next_check:
+            return False
+        self._next_check = now + self._interval
+        stamp = _file_stamp(self._path)
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        return True
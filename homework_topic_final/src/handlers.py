@@ -1,58 +1,221 @@
-import json
+import hashlib
+import math
 import re
+import time
 from http.server import BaseHTTPRequestHandler
-from typing import Optional
+from typing import Iterator, Optional
+from urllib.parse import parse_qs, urlsplit
 
-from .models import Priority
+from . import codec
+from .access_log import AccessLog
+from .cache import ResponseCache
+from .changes import ChangeEntries, ChangeFeed
+from .compression import ResponseCompressor
+from .idempotency import IdempotencyBusy, IdempotencyCache, IdempotencyConflict
+from .limits import RateLimiter
+from .metrics import (IDEMPOTENCY, IN_FLIGHT, REGISTRY, REJECTED, REQUEST_SECONDS, REQUESTS,
+                      RESPONSE_CACHE)
+from .models import Priority, Task
+from .profiling import RequestProfiler
+from .search import SearchIndexNotReady
 from .storage import TaskStorage
 
 
-class TaskAPIHandler(BaseHTTPRequestHandler):
+class TaskRoutes:
     
     COMPLETE_PATTERN = re.compile(r'^/tasks/(\d+)/complete$')
+    MAX_PAGE_SIZE = 1000
+    MAX_BATCH_SIZE = 10000
+    SEARCH_PAGE_SIZE = 20
+    MAX_SEARCH_QUERY = 256
+    SORT_ORDERS = {'id': False, '-id': True}
+    EVENT_STREAM = 'text/event-stream'
+    NDJSON = 'application/x-ndjson'
+    # задач в одном куске потокового ответа - столько же, сколько в самой большой странице
+    STREAM_CHUNK = 1000
+    # комментарий раз в SSE_HEARTBEAT секунд не даёт прокси закрыть тихий поток
+    SSE_HEARTBEAT = 15
+    SSE_RETRY_MS = 3000
+    IDEMPOTENCY_HEADER = 'Idempotency-Key'
+    MAX_IDEMPOTENCY_KEY = 255
+    # проверки живости и сбор метрик не должны отказывать как раз во время перегрузки
+    UNLIMITED_PATHS = ('/health', '/metrics')
     storage: TaskStorage = None
+    response_cache: ResponseCache = None
+    changes: Optional[ChangeFeed] = None
+    changes_max_wait: int = 60
+    stream_threshold: int = 10000
+    compressor: Optional[ResponseCompressor] = None
+    access_log: Optional[AccessLog] = None
+    profiler: Optional[RequestProfiler] = None
+    rate_limiter: Optional[RateLimiter] = None
+    idempotency: Optional[IdempotencyCache] = None
+    retry_after: int = 1
+    # выставляется у обработчика, которому сервер отдал запрос сверх очереди
+    overloaded = False
     
-    def _send_json_response(self, data: any, status: int = 200) -> None:
-        response = json.dumps(data, ensure_ascii=False).encode('utf-8')
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
-        self.send_header('Content-Length', len(response))
-        self.end_headers()
-        self.wfile.write(response)
+    def _read_body(self, length: int) -> bytes:
+        raise NotImplementedError
+    
+    def _write_response(self, status: int, headers: list[tuple[str, str]], body: bytes) -> None:
+        raise NotImplementedError
+    
+    def _write_stream(self, status: int, headers: list[tuple[str, str]],
+                      chunks: Iterator[bytes]) -> None:
+        raise NotImplementedError
+    
+    def _respond(self, status: int, headers: list[tuple[str, str]], body: bytes) -> None:
+        if self._compressible(status, body) and 'Content-Encoding' not in dict(headers):
+            encoding = self._accepted_encoding()
+            if encoding is None:
+                headers = headers + [('Vary', 'Accept-Encoding')]
+            else:
+                headers, body = self._encode(headers, body, encoding)
+        self._status = status
+        self._sent_bytes = len(body)
+        self._write_response(status, headers, body)
+    
+    def _compressible(self, status: int, body: bytes) -> bool:
+        return self.compressor is not None and status == 200 and len(body) >= self.compressor.min_size
+    
+    def _accepted_encoding(self) -> Optional[str]:
+        return self.compressor.negotiate(self.headers.get('Accept-Encoding'))
+    
+    def _encode(self, headers: list[tuple[str, str]], body: bytes,
+                encoding: str) -> tuple[list[tuple[str, str]], bytes]:
+        return self._encoded_headers(headers, encoding), self.compressor.compress(body, encoding)
+    
+    def _encoded_headers(self, headers: list[tuple[str, str]], encoding: str) -> list[tuple[str, str]]:
+        # сжатое представление отличается побайтно, поэтому его ETag слабый; If-None-Match
+        # сравнивает без W/, и 304 по-прежнему работает для любой кодировки
+        encoded_headers = [(name, f'W/{value}' if name == 'ETag' else value) for name, value in headers]
+        return encoded_headers + [('Content-Encoding', encoding), ('Vary', 'Accept-Encoding')]
+    
+    def _send_json_response(self, data: any, status: int = 200,
+                            headers: Optional[list[tuple[str, str]]] = None) -> None:
+        response = codec.dumps(data)
+        headers = [('Content-Type', 'application/json; charset=utf-8')] + (headers or [])
+        self._respond(status, headers, response)
     
     def _send_empty_response(self, status: int = 200) -> None:
-        self.send_response(status)
-        self.send_header('Content-Length', 0)
-        self.end_headers()
+        self._respond(status, [], b'')
     
     def _send_error_response(self, message: str, status: int = 400) -> None:
         self._send_json_response({"error": message}, status)
     
-    def _read_json_body(self) -> Optional[dict]:
+    def _read_json_body(self) -> Optional[any]:
         content_length = int(self.headers.get('Content-Length', 0))
         if content_length == 0:
             return None
         
         try:
-            body = self.rfile.read(content_length)
-            return json.loads(body.decode('utf-8'))
-        except (json.JSONDecodeError, UnicodeDecodeError):
+            body = self._read_body(content_length)
+            return codec.loads(body)
+        except (codec.DecodeError, UnicodeDecodeError):
             return None
     
     def do_GET(self) -> None:
-        if self.path == '/tasks':
-            self._handle_get_tasks()
-        elif self.path == '/health':
+        self._handle_request(self._route_get)
+    
+    def do_POST(self) -> None:
+        self._handle_request(self._route_post)
+    
+    def _handle_request(self, route) -> None:
+        # метка маршрута, а не сырой путь: иначе каждый id дал бы свой временной ряд
+        self._route = 'unmatched'
+        self._status = 500
+        self._sent_bytes = 0
+        # ответ long-poll и SSE в asyncio-движке дописывается позже, итог запроса считается тогда
+        self._deferred = False
+        self._started = time.perf_counter()
+        IN_FLIGHT.inc()
+        url = urlsplit(self.path)
+        try:
+            # без профилировщика это одна проверка атрибута
+            if not self._admit(url):
+                return
+            if self.profiler is not None and self.profiler.capturing:
+                self.profiler.run(lambda: route(url), lambda: f"{self.command} {self._route}")
+            else:
+                route(url)
+        finally:
+            if not self._deferred:
+                self._finish_request()
+    
+    def _admit(self, url) -> bool:
+        if url.path in self.UNLIMITED_PATHS:
+            return True
+        if self.overloaded:
+            self._reject('overload', "Server is overloaded", 503, self.retry_after)
+            return False
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.acquire(self._client_key())
+            if wait > 0:
+                self._reject('rate_limit', "Rate limit exceeded", 429, math.ceil(wait))
+                return False
+        return True
+    
+    def _client_key(self) -> str:
+        key_header = self.rate_limiter.key_header
+        api_key = self.headers.get(key_header) if key_header else None
+        if api_key in self.rate_limiter.api_keys:
+            return f"key:{api_key}"
+        return f"addr:{self.client_address[0]}"
+    
+    def _reject(self, reason: str, message: str, status: int, retry_after: int) -> None:
+        self._route = 'rejected'
+        REJECTED.inc(reason)
+        self._send_json_response({"error": message}, status, [('Retry-After', str(retry_after))])
+    
+    def _finish_request(self) -> None:
+        IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - self._started
+        REQUESTS.inc(self.command, self._route, str(self._status))
+        REQUEST_SECONDS.observe(elapsed, self._route)
+        if self.access_log is not None:
+            self.access_log.record(self.command, self.path, self._status, elapsed,
+                                   self._sent_bytes)
+    
+    def _route_get(self, url) -> None:
+        if url.path == '/tasks':
+            self._route = '/tasks'
+            self._handle_get_tasks(parse_qs(url.query))
+        elif url.path == '/tasks/changes':
+            self._route = '/tasks/changes'
+            self._handle_changes(parse_qs(url.query))
+        elif url.path == '/tasks/search':
+            self._route = '/tasks/search'
+            self._handle_search(parse_qs(url.query))
+        elif url.path == '/health':
+            self._route = '/health'
             self._handle_health()
+        elif url.path == '/metrics':
+            self._route = '/metrics'
+            self._handle_metrics()
+        elif url.path == '/debug/profile' and self.profiler is not None:
+            self._route = '/debug/profile'
+            self._send_json_response(self.profiler.status())
         else:
             self._send_error_response("Not Found", 404)
     
-    def do_POST(self) -> None:
-        if self.path == '/tasks':
+    def _route_post(self, url) -> None:
+        path = url.path
+        if path == '/tasks':
+            self._route = '/tasks'
             self._handle_create_task()
+        elif path == '/tasks:batch':
+            self._route = '/tasks:batch'
+            self._handle_create_tasks_batch()
+        elif path == '/tasks/complete:batch':
+            self._route = '/tasks/complete:batch'
+            self._handle_complete_tasks_batch()
+        elif path in ('/debug/profile/start', '/debug/profile/stop') and self.profiler is not None:
+            self._route = path
+            self._handle_profile_control(path.rsplit('/', 1)[1])
         else:
-            match = self.COMPLETE_PATTERN.match(self.path)
+            match = self.COMPLETE_PATTERN.match(path)
             if match:
+                self._route = '/tasks/{id}/complete'
                 task_id = int(match.group(1))
                 self._handle_complete_task(task_id)
             else:
@@ -61,32 +224,541 @@ class TaskAPIHandler(BaseHTTPRequestHandler):
     def _handle_health(self) -> None:
         self._send_json_response({"status": "ok"})
     
-    def _handle_get_tasks(self) -> None:
-        tasks = self.storage.get_all()
-        self._send_json_response([task.to_dict() for task in tasks])
+    def _handle_metrics(self) -> None:
+        body = REGISTRY.render().encode('utf-8')
+        self._respond(200, [('Content-Type', REGISTRY.CONTENT_TYPE)], body)
+    
+    def _handle_profile_control(self, action: str) -> None:
+        if action == 'start':
+            self.profiler.start()
+            self._send_json_response(self.profiler.status())
+        else:
+            files = self.profiler.stop()
+            self._send_json_response({**self.profiler.status(), "files": files})
+    
+    def _handle_get_tasks(self, query: dict[str, list[str]]) -> None:
+        try:
+            options = self._parse_list_query(query)
+        except ValueError as e:
+            self._send_error_response(str(e), 400)
+            return
+        
+        ndjson = self._wants_ndjson()
+        self._send_task_page((ndjson,) + tuple(sorted(options.items())),
+                             lambda: self.storage.query(**options), ndjson,
+                             None if 'limit' in options else options)
+    
+    def _handle_search(self, query: dict[str, list[str]]) -> None:
+        params = {key: values[-1] for key, values in query.items()}
+        try:
+            text = params.get('q', '').strip()
+            if not text:
+                raise ValueError("Parameter 'q' is required")
+            if len(text) > self.MAX_SEARCH_QUERY:
+                raise ValueError(f"Parameter 'q' must not exceed {self.MAX_SEARCH_QUERY} characters")
+            limit = self._parse_int_param(params, 'limit') if 'limit' in params else self.SEARCH_PAGE_SIZE
+            if not 1 <= limit <= self.MAX_PAGE_SIZE:
+                raise ValueError(f"Parameter 'limit' must be between 1 and {self.MAX_PAGE_SIZE}")
+            cursor = self._parse_int_param(params, 'cursor') if 'cursor' in params else 0
+            if cursor < 0:
+                raise ValueError("Parameter 'cursor' must not be negative")
+        except ValueError as e:
+            self._send_error_response(str(e), 400)
+            return
+        
+        try:
+            ndjson = self._wants_ndjson()
+            self._send_task_page(('search', ndjson, text, limit, cursor),
+                                 lambda: self.storage.search(text, cursor, limit), ndjson)
+        except SearchIndexNotReady as e:
+            self._send_json_response({"error": str(e)}, 503, [('Retry-After', str(self.retry_after))])
+    
+    def _wants_ndjson(self) -> bool:
+        return self.NDJSON in self.headers.get('Accept', '')
+    
+    def _listing_size(self, options: dict) -> int:
+        # по счётчикам индекса, без выборки; курсор не учитывается, это оценка сверху
+        counts = self.storage.counts(options.get('archived', False))
+        return sum(count for (priority, is_done), count in counts.items()
+                   if options.get('priority') in (None, priority)
+                   and options.get('is_done') in (None, is_done))
+    
+    def _task_headers(self, etag: str, ndjson: bool) -> list[tuple[str, str]]:
+        content_type = self.NDJSON if ndjson else 'application/json'
+        return [('Content-Type', f'{content_type}; charset=utf-8'),
+                ('Cache-Control', 'no-cache'),
+                ('ETag', etag),
+                ('Vary', 'Accept')]
+    
+    def _not_modified(self, etag: str) -> bool:
+        if not self._etag_matches(etag):
+            return False
+        RESPONSE_CACHE.inc('not_modified')
+        self._respond(304, [('ETag', etag)], b'')
+        return True
+    
+    def _encode_tasks(self, tasks: list[Task], ndjson: bool) -> bytes:
+        if ndjson:
+            return b''.join(codec.dumps(task.to_dict()) + b'\n' for task in tasks)
+        return codec.dumps([task.to_dict() for task in tasks])
+    
+    def _send_task_page(self, cache_key, fetch, ndjson: bool = False,
+                        stream_options: Optional[dict] = None) -> None:
+        # версию читаем до выборки: тело может оказаться новее ETag, но не наоборот
+        version = self.storage.version
+        etag = self.response_cache.etag(version, '-nd' if ndjson else '')
+        if self._not_modified(etag):
+            return
+        
+        cached = self.response_cache.get(cache_key, version)
+        # размер полного списка считается только при промахе: в SQLite counts() - скан таблицы,
+        # а повторный опрос должен стоить поиска в словаре
+        if (cached is None and stream_options is not None
+                and self._listing_size(stream_options) >= self.stream_threshold):
+            self._send_task_stream(stream_options, etag, ndjson)
+            return
+        if cached is None:
+            RESPONSE_CACHE.inc('miss')
+            tasks, next_cursor = fetch()
+            headers = self._task_headers(etag, ndjson)
+            if next_cursor is not None:
+                headers.append(('X-Next-Cursor', str(next_cursor)))
+            body = self._encode_tasks(tasks, ndjson)
+            self.response_cache.put(cache_key, version, headers, body)
+        else:
+            RESPONSE_CACHE.inc('hit')
+            headers, body = cached
+        
+        # сжатые тела живут в том же кэше под своим ключом и сжимаются один раз на версию
+        encoding = self._accepted_encoding() if self._compressible(200, body) else None
+        if encoding is not None:
+            encoded = self.response_cache.get((cache_key, encoding), version)
+            if encoded is None:
+                encoded = self._encode(headers, body, encoding)
+                self.response_cache.put((cache_key, encoding), version, *encoded)
+            headers, body = encoded
+        self._respond(200, headers, body)
+    
+    def _send_task_stream(self, options: dict, etag: str, ndjson: bool) -> None:
+        # большой список не собирается целиком ни в задачах, ни в байтах: в памяти один кусок
+        RESPONSE_CACHE.inc('stream')
+        headers = self._task_headers(etag, ndjson)
+        chunks = self._task_chunks(options, ndjson)
+        if self.compressor is not None:
+            encoding = self._accepted_encoding()
+            if encoding is None:
+                headers.append(('Vary', 'Accept-Encoding'))
+            else:
+                headers = self._encoded_headers(headers, encoding)
+                chunks = self.compressor.compress_stream(chunks, encoding)
+        self._status = 200
+        self._write_stream(200, headers, chunks)
+    
+    def _task_chunks(self, options: dict, ndjson: bool) -> Iterator[bytes]:
+        # страницы по курсору: блокировка чтения берётся на кусок, а не на весь ответ, поэтому
+        # поток не согласован по одной версии, но id не повторяются и не пропадают
+        options = dict(options, limit=self.STREAM_CHUNK)
+        separator = b'['
+        while True:
+            tasks, next_cursor = self.storage.query(**options)
+            if tasks:
+                body = self._encode_tasks(tasks, ndjson)
+                if ndjson:
+                    yield body
+                else:
+                    yield separator + body[1:-1]
+                    separator = b','
+            if next_cursor is None:
+                break
+            options['cursor'] = next_cursor
+        if not ndjson:
+            yield b'[]' if separator == b'[' else b']'
+    
+    def _handle_changes(self, query: dict[str, list[str]]) -> None:
+        if self.changes is None:
+            self._send_error_response("Change feed is not available", 501)
+            return
+        
+        params = {key: values[-1] for key, values in query.items()}
+        # EventSource при переподключении сам присылает id последнего события
+        last_event_id = self.headers.get('Last-Event-ID')
+        if 'since' not in params and last_event_id:
+            params['since'] = last_event_id
+        try:
+            since = self._parse_int_param(params, 'since') if 'since' in params else None
+            wait = self._parse_int_param(params, 'wait') if 'wait' in params else 0
+            if not 0 <= wait <= self.changes_max_wait:
+                raise ValueError(f"Parameter 'wait' must be between 0 and {self.changes_max_wait}")
+        except ValueError as e:
+            self._send_error_response(str(e), 400)
+            return
+        
+        if self.EVENT_STREAM in self.headers.get('Accept', ''):
+            self._stream_changes(since)
+            return
+        
+        version, entries = self.changes.read(since)
+        if entries == [] and since is not None and wait > 0:
+            self._wait_changes(since, wait)
+        else:
+            self._send_changes(version, entries)
+    
+    def _wait_changes(self, since: int, wait: int) -> None:
+        self._send_changes(*self.changes.wait(since, wait))
+    
+    def _stream_changes(self, since: Optional[int]) -> None:
+        self._send_error_response("Event stream is not supported by this server engine", 501)
+    
+    def _send_changes(self, version: int, entries: ChangeEntries) -> None:
+        self._send_json_response({
+            "version": version,
+            "resync": entries is None,
+            "changes": [record for _, records in entries or [] for record in records]
+        }, headers=[('Cache-Control', 'no-cache')])
+    
+    def _sse_headers(self) -> list[tuple[str, str]]:
+        return [('Content-Type', f'{self.EVENT_STREAM}; charset=utf-8'),
+                ('Cache-Control', 'no-cache'),
+                ('X-Accel-Buffering', 'no')]
+    
+    def _sse_start(self, since: Optional[int]) -> tuple[bytes, int]:
+        # ready несёт id, с которого идёт поток: с ним EventSource переподключится без пропусков
+        position = self.changes.version if since is None else since
+        retry = b'retry: %d\n' % self.SSE_RETRY_MS
+        return retry + self._sse_event('ready', position, {"version": position}), position
+    
+    def _sse_events(self, since: int, version: int, entries: ChangeEntries) -> tuple[bytes, int]:
+        if entries is None:
+            return self._sse_event('resync', version, {"version": version}), version
+        if not entries:
+            return b': ping\n\n', since
+        return b''.join(self._sse_event('changes', entry_version, records)
+                        for entry_version, records in entries), entries[-1][0]
+    
+    def _sse_event(self, event: str, version: int, data: any) -> bytes:
+        return b'id: %d\nevent: %s\ndata: %s\n\n' % (version, event.encode(), codec.dumps(data))
+    
+    def _etag_matches(self, etag: str) -> bool:
+        if_none_match = self.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        candidates = [value.strip().removeprefix('W/') for value in if_none_match.split(',')]
+        return etag in candidates or '*' in candidates
+    
+    def _parse_list_query(self, query: dict[str, list[str]]) -> dict:
+        params = {key: values[-1] for key, values in query.items()}
+        options = {}
+        
+        if 'limit' in params:
+            limit = self._parse_int_param(params, 'limit')
+            if not 1 <= limit <= self.MAX_PAGE_SIZE:
+                raise ValueError(f"Parameter 'limit' must be between 1 and {self.MAX_PAGE_SIZE}")
+            options['limit'] = limit
+        
+        if 'cursor' in params:
+            options['cursor'] = self._parse_int_param(params, 'cursor')
+        
+        if 'priority' in params:
+            if params['priority'] not in [p.value for p in Priority]:
+                raise ValueError("Parameter 'priority' must be one of: low, normal, high")
+            options['priority'] = params['priority']
+        
+        if 'isDone' in params:
+            if params['isDone'].lower() not in ('true', 'false'):
+                raise ValueError("Parameter 'isDone' must be true or false")
+            options['is_done'] = params['isDone'].lower() == 'true'
+        
+        if 'sort' in params:
+            if params['sort'] not in self.SORT_ORDERS:
+                raise ValueError("Parameter 'sort' must be 'id' or '-id'")
+            options['descending'] = self.SORT_ORDERS[params['sort']]
+        
+        if 'archived' in params:
+            if params['archived'].lower() not in ('true', 'false'):
+                raise ValueError("Parameter 'archived' must be true or false")
+            # false - обычный список, в ключ кэша его не добавляем
+            if params['archived'].lower() == 'true':
+                options['archived'] = True
+        
+        return options
+    
+    def _parse_int_param(self, params: dict[str, str], name: str) -> int:
+        try:
+            return int(params[name])
+        except ValueError:
+            raise ValueError(f"Parameter '{name}' must be an integer") from None
     
     def _handle_create_task(self) -> None:
-        body = self._read_json_body()
+        self._send_idempotent(self._read_json_body(), self._create_task)
+    
+    def _handle_create_tasks_batch(self) -> None:
+        self._send_idempotent(self._read_json_body(), self._create_tasks_batch)
+    
+    def _send_idempotent(self, body: any, handle) -> None:
+        # handle(body) -> (статус, данные); с Idempotency-Key повтор получает тот же ответ,
+        # а хранилище видит запрос один раз
+        key = self.headers.get(self.IDEMPOTENCY_HEADER)
+        if key is None or self.idempotency is None:
+            status, data = handle(body)
+            self._send_json_response(data, status)
+            return
+        if not 0 < len(key) <= self.MAX_IDEMPOTENCY_KEY:
+            self._send_error_response(f"Header '{self.IDEMPOTENCY_HEADER}' must be "
+                                      f"1 to {self.MAX_IDEMPOTENCY_KEY} characters", 400)
+            return
         
-        if body is None:
-            self._send_error_response("Invalid JSON body", 400)
+        # ключ действует в пределах маршрута; отпечаток тела ловит ключ, повторённый с другим телом
+        cache_key = f"{self._route} {key}"
+        fingerprint = hashlib.sha256(codec.dumps(body)).hexdigest()
+        try:
+            stored = self.idempotency.claim(cache_key, fingerprint)
+        except IdempotencyConflict:
+            IDEMPOTENCY.inc('conflict')
+            self._send_error_response(
+                f"{self.IDEMPOTENCY_HEADER} was already used with a different request body", 422)
+            return
+        except IdempotencyBusy:
+            IDEMPOTENCY.inc('busy')
+            message = f"Request with this {self.IDEMPOTENCY_HEADER} is still in progress"
+            self._send_json_response({"error": message}, 409, [('Retry-After', str(self.retry_after))])
+            return
+        if stored is not None:
+            IDEMPOTENCY.inc('replayed')
+            self._respond(stored.status, [('Content-Type', 'application/json; charset=utf-8'),
+                                          ('Idempotent-Replayed', 'true')], stored.body)
             return
         
+        try:
+            status, data = handle(body)
+        except BaseException:
+            self.idempotency.release(cache_key)
+            raise
+        response = codec.dumps(data)
+        self.idempotency.store(cache_key, fingerprint, status, response)
+        IDEMPOTENCY.inc('stored')
+        self._respond(status, [('Content-Type', 'application/json; charset=utf-8')], response)
+    
+    def _create_task(self, body: any) -> tuple[int, any]:
+        if not isinstance(body, dict):
+            return 400, {"error": "Invalid JSON body"}
+        
         title = body.get('title')
         priority = body.get('priority', Priority.NORMAL.value)
         
         if not title:
-            self._send_error_response("Field 'title' is required", 400)
-            return
+            return 400, {"error": "Field 'title' is required"}
+        if not isinstance(title, str):
+            return 400, {"error": "Field 'title' must be a string"}
         
         task = self.storage.create(title, priority)
-        self._send_json_response(task.to_dict(), 201)
+        return 201, task.to_dict()
+    
+    def _create_tasks_batch(self, body: any) -> tuple[int, any]:
+        if not isinstance(body, list):
+            return 400, {"error": "Expected a JSON array of tasks"}
+        if len(body) > self.MAX_BATCH_SIZE:
+            return 413, {"error": f"Batch size must not exceed {self.MAX_BATCH_SIZE}"}
+        
+        results = []
+        valid = []
+        for item in body:
+            if not isinstance(item, dict) or not item.get('title'):
+                results.append({"status": 400, "error": "Field 'title' is required"})
+                continue
+            if not isinstance(item['title'], str):
+                results.append({"status": 400, "error": "Field 'title' must be a string"})
+                continue
+            results.append(None)
+            valid.append((item['title'], item.get('priority', Priority.NORMAL.value)))
+        
+        created = iter(self.storage.create_many(valid))
+        return 200, [result or {"status": 201, "task": next(created).to_dict()} for result in results]
+    
+    def _handle_complete_tasks_batch(self) -> None:
+        body = self._read_json_body()
+        
+        if not isinstance(body, list) or not all(type(item) is int for item in body):
+            self._send_error_response("Expected a JSON array of task ids", 400)
+            return
+        if len(body) > self.MAX_BATCH_SIZE:
+            self._send_error_response(f"Batch size must not exceed {self.MAX_BATCH_SIZE}", 413)
+            return
+        
+        completed = self.storage.complete_many(body)
+        self._send_json_response([
+            {"id": task_id, "status": 200 if done else 404}
+            for task_id, done in zip(body, completed)
+        ])
     
     def _handle_complete_task(self, task_id: int) -> None:
         if self.storage.complete(task_id):
             self._send_empty_response(200)
         else:
             self._send_empty_response(404)
+
+
+class TaskAPIHandler(TaskRoutes, BaseHTTPRequestHandler):
+    
+    # HTTP/1.1: соединение живёт между запросами, поэтому у каждого ответа есть Content-Length
+    protocol_version = 'HTTP/1.1'
+    # заголовки и тело уходят двумя записями: с Nagle вторая ждала бы отложенный ACK (~40 мс)
+    disable_nagle_algorithm = True
+    # тело больше этого не дочитываем впустую, а закрываем соединение
+    MAX_DISCARD_BYTES = 64 * 1024
+    
+    def handle(self) -> None:
+        # один запрос за вызов: между запросами соединение ждёт в селекторе сервера,
+        # а не занимает поток пула; уже пришедший следующий запрос обслуживаем сразу
+        self.keep_alive = False
+        try:
+            self.handle_one_request()
+            while not self.close_connection:
+                if not self._has_buffered_request():
+                    self.keep_alive = True
+                    return
+                self.handle_one_request()
+        except ConnectionError:
+            # клиент сбросил простаивавшее соединение, ошибкой сервера это не считаем
+            self.close_connection = True
+    
+    def _has_buffered_request(self) -> bool:
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
+    def parse_request(self) -> bool:
+        self._body_read = False
+        if not super().parse_request():
+            return False
+        # без селектора у сервера (классический движок) соединение закрывается после ответа
+        if getattr(self.server, 'park', None) is None or self.overloaded:
+            self.close_connection = True
+        return True
+    
+    def _read_body(self, length: int) -> bytes:
+        self._body_read = True
+        return self.rfile.read(length)
+    
+    def _discard_body(self) -> None:
+        # непрочитанное тело иначе было бы разобрано как начало следующего запроса
+        if self._body_read:
+            return
+        self._body_read = True
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if self.headers.get('Transfer-Encoding') or not 0 <= length <= self.MAX_DISCARD_BYTES:
+            self.close_connection = True
+        elif length:
+            self.rfile.read(length)
+    
+    def _send_connection_header(self) -> None:
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        elif self.request_version == 'HTTP/1.0':
+            self.send_header('Connection', 'keep-alive')
+    
+    def _write_response(self, status: int, headers: list[tuple[str, str]], body: bytes) -> None:
+        self._discard_body()
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', len(body))
+        self._send_connection_header()
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+    
+    def _write_stream(self, status: int, headers: list[tuple[str, str]],
+                      chunks: Iterator[bytes]) -> None:
+        self._discard_body()
+        # в HTTP/1.0 нет chunked, там конец тела - закрытие соединения
+        chunked = self.request_version == 'HTTP/1.1'
+        if not chunked:
+            self.close_connection = True
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self._send_connection_header()
+        self.end_headers()
+        
+        completed = False
+        try:
+            for chunk in chunks:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+                self._sent_bytes += len(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+            completed = True
+        except ConnectionError:
+            pass
+        finally:
+            # оборванное посреди тело не даёт продолжить соединение следующим запросом
+            if not completed:
+                self.close_connection = True
+    
+    def _can_wait(self) -> bool:
+        # классический движок обслуживает один запрос за раз, ожидание остановило бы весь сервер
+        return getattr(self.server, 'allows_waiting', False)
+    
+    def _acquire_waiting(self) -> bool:
+        if self.server.acquire_waiting():
+            return True
+        self._reject('waiting', "Too many waiting change feed requests", 503, self.retry_after)
+        return False
+    
+    def _wait_changes(self, since: int, wait: int) -> None:
+        if not self._can_wait():
+            self._send_changes(*self.changes.read(since))
+        elif self._acquire_waiting():
+            try:
+                super()._wait_changes(since, wait)
+            finally:
+                self.server.release_waiting()
+    
+    def _stream_changes(self, since: Optional[int]) -> None:
+        if not self._can_wait():
+            super()._stream_changes(since)
+        elif self._acquire_waiting():
+            try:
+                self._write_event_stream(since)
+            finally:
+                self.server.release_waiting()
+    
+    def _write_event_stream(self, since: Optional[int]) -> None:
+        self._discard_body()
+        self._status = 200
+        # длина потока неизвестна, его конец - закрытие соединения
+        self.close_connection = True
+        self.send_response(200)
+        for name, value in self._sse_headers():
+            self.send_header(name, value)
+        self._send_connection_header()
+        self.end_headers()
+        
+        chunk, since = self._sse_start(since)
+        try:
+            while True:
+                self.wfile.write(chunk)
+                self._sent_bytes += len(chunk)
+                if self.changes.closed:
+                    break
+                version, entries = self.changes.wait(since, self.SSE_HEARTBEAT)
+                chunk, since = self._sse_events(since, version, entries)
+        except ConnectionError:
+            pass
+    
+    def log_request(self, code: int | str = '-', size: int | str = '-') -> None:
+        # доступ пишет TaskRoutes через AccessLog, здесь остаются только ошибки
+        pass
     
     def log_message(self, format: str, *args) -> None:
         print(f"[{self.log_date_time_string()}] {args[0]}")
@@ -0,0 +1,258 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from . import codec
+
+
+class IdempotencyConflict(Exception):
+    pass
+
+
+class IdempotencyBusy(Exception):
+    pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status INTEGER,
+    body BLOB,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires);
+"""
+
+SELECT_KEY = "SELECT fingerprint, status, body, expires FROM idempotency WHERE key = ?"
+# строка без status - запрос ещё выполняется; её expires - срок, после которого ключ
+# считается брошенным упавшим воркером и достаётся следующему повтору
+CLAIM_KEY = """
+INSERT OR REPLACE INTO idempotency (key, fingerprint, status, body, expires) VALUES (?, ?, NULL, NULL, ?)
+"""
+STORE_KEY = "UPDATE idempotency SET status = ?, body = ?, expires = ? WHERE key = ?"
+RELEASE_KEY = "DELETE FROM idempotency WHERE key = ? AND status IS NULL"
+DELETE_EXPIRED = "DELETE FROM idempotency WHERE expires <= ?"
+DELETE_OLDEST = """
+DELETE FROM idempotency WHERE key IN (
+    SELECT key FROM idempotency WHERE status IS NOT NULL ORDER BY expires DESC LIMIT -1 OFFSET ?
+)
+"""
+
+
+@dataclass
+class StoredResponse:
+    expires: float
+    fingerprint: str
+    status: int
+    body: bytes
+
+
+class IdempotencyCache:
+    
+    def __init__(self, max_entries: int = 10000, ttl: float = 24 * 3600,
+                 wait_timeout: float = 30.0, file_path: Optional[Path] = None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._wait_timeout = wait_timeout
+        # ключ -> ответ; порядок - давность обращения, срок жизни считается от первого ответа
+        self._entries: OrderedDict[str, StoredResponse] = OrderedDict()
+        # ключи, запрос по которым ещё выполняется -> отпечаток его тела
+        self._pending: dict[str, str] = {}
+        self._cond = threading.Condition()
+        self._file_path = file_path
+        self._file = None
+        self._journal_records = 0
+        if file_path is not None:
+            self._load()
+            self._compact()
+    
+    def _load(self) -> None:
+        if not self._file_path.exists():
+            return
+        now = time.time()
+        with open(self._file_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = codec.loads(line)
+                    key = record['key']
+                    entry = StoredResponse(float(record['expires']), record['fingerprint'],
+                                           int(record['status']), record['body'].encode('utf-8'))
+                except (codec.DecodeError, UnicodeDecodeError, KeyError, TypeError, ValueError,
+                        AttributeError):
+                    # недописанная или испорченная запись после аварийной остановки
+                    continue
+                if entry.expires <= now:
+                    continue
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+    
+    def _compact(self) -> None:
+        # журнал только дописывается; когда записей в нём вдвое больше, чем помещается в кэш,
+        # он переписывается живыми записями, а истёкшие ключи заодно выбрасываются
+        if self._file is not None:
+            self._file.close()
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if entry.expires <= now]:
+            del self._entries[key]
+        tmp_path = self._file_path.with_name(self._file_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(self._record(key, entry) for key, entry in self._entries.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file_path)
+        self._file = open(self._file_path, 'ab')
+        self._journal_records = len(self._entries)
+    
+    def _record(self, key: str, entry: StoredResponse) -> bytes:
+        return codec.dumps({
+            "key": key, "expires": entry.expires, "fingerprint": entry.fingerprint,
+            "status": entry.status, "body": entry.body.decode('utf-8')
+        }) + b'\n'
+    
+    def _lookup(self, key: str) -> Optional[StoredResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+    
+    def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        # None - ключ наш, запрос надо выполнить и отдать ответ в store или release;
+        # иначе сохранённый ответ. Повтор, пришедший во время первого запроса, ждёт его ответа
+        deadline = time.monotonic() + self._wait_timeout
+        with self._cond:
+            while True:
+                entry = self._lookup(key)
+                if entry is not None:
+                    if entry.fingerprint != fingerprint:
+                        raise IdempotencyConflict(key)
+                    return entry
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = fingerprint
+                    return None
+                if pending != fingerprint:
+                    raise IdempotencyConflict(key)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise IdempotencyBusy(key)
+                self._cond.wait(remaining)
+    
+    def store(self, key: str, fingerprint: str, status: int, body: bytes) -> None:
+        entry = StoredResponse(time.time() + self._ttl, fingerprint, status, body)
+        with self._cond:
+            self._pending.pop(key, None)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            if self._file is not None:
+                self._file.write(self._record(key, entry))
+                self._file.flush()
+                # ответ уже отдан клиенту как выполненный: без fsync повтор после сбоя создал бы дубль
+                os.fsync(self._file.fileno())
+                self._journal_records += 1
+                if self._journal_records > 2 * self._max_entries:
+                    self._compact()
+            self._cond.notify_all()
+    
+    def release(self, key: str) -> None:
+        # запрос не дошёл до ответа: ключ забирает один из ждущих повторов
+        with self._cond:
+            self._pending.pop(key, None)
+            self._cond.notify_all()
+    
+    def close(self) -> None:
+        with self._cond:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SQLiteIdempotencyCache:
+    
+    # для pre-fork: у каждого воркера свой процесс, поэтому ключи лежат в общей базе SQLite,
+    # и повтор, попавший в другой воркер, видит и готовый ответ, и ещё выполняющийся запрос
+    POLL_INTERVAL = 0.05
+    # истёкшие и лишние ключи удаляются раз в столько сохранённых ответов
+    PURGE_EVERY = 100
+    
+    def __init__(self, db_path: Path, max_entries: int = 10000, ttl: float = 24 * 3600,
+                 wait_timeout: float = 30.0):
+        self._db_path = db_path
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._wait_timeout = wait_timeout
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._stored = 0
+        self._connection().executescript(SCHEMA)
+    
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self._db_path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA busy_timeout = 5000")
+            db.execute("PRAGMA synchronous = FULL")
+            self._local.db = db
+            with self._connections_lock:
+                self._connections.append(db)
+        return db
+    
+    def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        # то же, что IdempotencyCache.claim; чужой ответ ждём опросом базы, а не на условии
+        deadline = time.monotonic() + self._wait_timeout
+        db = self._connection()
+        while True:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(SELECT_KEY, (key,)).fetchone()
+                now = time.time()
+                if row is None or row[3] <= now:
+                    db.execute(CLAIM_KEY, (key, fingerprint, now + self._wait_timeout))
+                    row = None
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            if row is None:
+                return None
+            stored_fingerprint, status, body, expires = row
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyConflict(key)
+            if status is not None:
+                return StoredResponse(expires, stored_fingerprint, status, bytes(body))
+            if time.monotonic() >= deadline:
+                raise IdempotencyBusy(key)
+            time.sleep(self.POLL_INTERVAL)
+    
+    def store(self, key: str, fingerprint: str, status: int, body: bytes) -> None:
+        db = self._connection()
+        db.execute(STORE_KEY, (status, body, time.time() + self._ttl, key))
+        with self._connections_lock:
+            self._stored += 1
+            purge = self._stored % self.PURGE_EVERY == 0
+        if purge:
+            db.execute(DELETE_EXPIRED, (time.time(),))
+            db.execute(DELETE_OLDEST, (self._max_entries,))
+    
+    def release(self, key: str) -> None:
+        self._connection().execute(RELEASE_KEY, (key,))
+    
+    def close(self) -> None:
+        with self._connections_lock:
+            for db in self._connections:
+                db.close()
+            self._connections.clear()
@@ -0,0 +1,109 @@
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Iterator, Optional
+
+from .models import Task, Priority
+
+
+class TaskIndex:
+    
+    def __init__(self):
+        # массивы int64 вместо списков: 8 байт на id вместо ссылки и отдельного объекта int
+        self._ids = array('q')
+        # (priority, isDone) -> отсортированные id; любой фильтр это объединение этих списков
+        self._buckets: dict[tuple[str, bool], array] = {
+            (priority.value, done): array('q') for priority in Priority for done in (False, True)
+        }
+    
+    def rebuild(self, tasks: Iterable[Task]) -> None:
+        ids = []
+        buckets: dict[tuple[str, bool], list[int]] = {key: [] for key in self._buckets}
+        for task in tasks:
+            ids.append(task.id)
+            buckets.setdefault((task.priority, task.isDone), []).append(task.id)
+        self._ids = array('q', sorted(ids))
+        self._buckets = {key: array('q', sorted(bucket)) for key, bucket in buckets.items()}
+    
+    def load(self, ids: array, buckets: dict[tuple[str, bool], array]) -> None:
+        # восстановление из бинарного снимка без прохода по задачам
+        self._ids = array('q', ids)
+        self._buckets = {
+            (priority.value, done): array('q') for priority in Priority for done in (False, True)
+        }
+        self._buckets.update(buckets)
+    
+    def export(self) -> dict[tuple[str, bool], array]:
+        return {key: array('q', ids) for key, ids in self._buckets.items()}
+    
+    @property
+    def ids(self) -> array:
+        return self._ids
+    
+    def add(self, task: Task) -> None:
+        self._insert(self._ids, task.id)
+        self._insert(self._bucket(task.priority, task.isDone), task.id)
+    
+    def mark_done(self, task: Task) -> None:
+        pending = self._bucket(task.priority, False)
+        position = bisect_left(pending, task.id)
+        if position < len(pending) and pending[position] == task.id:
+            del pending[position]
+        self._insert(self._bucket(task.priority, True), task.id)
+    
+    def discard_many(self, task_ids: Iterable[int]) -> None:
+        # массивы пересобираются за один проход: удаление по одному сдвигало бы хвост на каждый id
+        removed = set(task_ids)
+        self._ids = array('q', (task_id for task_id in self._ids if task_id not in removed))
+        for key, ids in self._buckets.items():
+            self._buckets[key] = array('q', (task_id for task_id in ids if task_id not in removed))
+    
+    def counts(self) -> dict[tuple[str, bool], int]:
+        return {key: len(ids) for key, ids in self._buckets.items()}
+    
+    def _bucket(self, priority: str, is_done: bool) -> array:
+        return self._buckets.setdefault((priority, is_done), array('q'))
+    
+    def _insert(self, ids: array, task_id: int) -> None:
+        # id выдаются по возрастанию, так что обычно это просто append
+        if not ids or ids[-1] < task_id:
+            ids.append(task_id)
+        else:
+            insort(ids, task_id)
+    
+    def page(self, priority: Optional[str] = None, is_done: Optional[bool] = None,
+             cursor: Optional[int] = None, limit: Optional[int] = None,
+             descending: bool = False) -> list[int]:
+        if priority is None and is_done is None:
+            lists = [self._ids]
+        else:
+            lists = [
+                ids for (bucket_priority, bucket_done), ids in self._buckets.items()
+                if priority in (None, bucket_priority) and is_done in (None, bucket_done)
+            ]
+        
+        if len(lists) == 1:
+            return list(self._slice(lists[0], cursor, limit, descending))
+        
+        merged = heapq.merge(*(self._iterate(ids, cursor, descending) for ids in lists),
+                             reverse=descending)
+        if limit is None:
+            return list(merged)
+        return [task_id for task_id, _ in zip(merged, range(limit))]
+    
+    def _slice(self, ids: array, cursor: Optional[int], limit: Optional[int],
+               descending: bool) -> array:
+        if descending:
+            end = len(ids) if cursor is None else bisect_left(ids, cursor)
+            start = 0 if limit is None else max(end - limit, 0)
+            return ids[start:end][::-1]
+        start = 0 if cursor is None else bisect_right(ids, cursor)
+        end = None if limit is None else start + limit
+        return ids[start:end]
+    
+    def _iterate(self, ids: array, cursor: Optional[int], descending: bool) -> Iterator[int]:
+        if descending:
+            end = len(ids) if cursor is None else bisect_left(ids, cursor)
+            return (ids[i] for i in range(end - 1, -1, -1))
+        start = 0 if cursor is None else bisect_right(ids, cursor)
+        return (ids[i] for i in range(start, len(ids)))
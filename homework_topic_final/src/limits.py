@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+
+class RateLimiter:
+    
+    def __init__(self, rate: float, burst: int, key_header: Optional[str] = None,
+                 max_clients: int = 10000, api_keys: Iterable[str] = ()):
+        self._rate = rate
+        self._burst = burst
+        self.key_header = key_header
+        # заголовок присылает сам клиент: неизвестный ключ дал бы ему новое полное ведро
+        # на каждый запрос, поэтому своё ведро получают только выданные ключи
+        self.api_keys = frozenset(api_keys)
+        self._max_clients = max_clients
+        # клиент -> (токены, время обновления); порядок - давность обращения
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def acquire(self, key: str) -> float:
+        # 0 - запрос пропущен, иначе через сколько секунд появится токен
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self._burst, now))
+            tokens = min(self._burst, tokens + (now - updated) * self._rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self._rate
+            self._buckets[key] = (tokens, now)
+            # давно молчавший клиент вытесняется; вернувшись, он получит полное ведро,
+            # которое и так накопилось бы за время простоя
+            if len(self._buckets) > self._max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimit:
+    
+    # как BoundedSemaphore, но предел можно поменять на ходу: уже занятые места
+    # остаются занятыми, новые выдаются по новому пределу
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._used = 0
+        self._cond = threading.Condition()
+    
+    def acquire(self, blocking: bool = True) -> bool:
+        with self._cond:
+            while self._used >= self._limit:
+                if not blocking:
+                    return False
+                self._cond.wait()
+            self._used += 1
+            return True
+    
+    def release(self) -> None:
+        with self._cond:
+            self._used -= 1
+            self._cond.notify()
+    
+    def resize(self, limit: int) -> None:
+        with self._cond:
+            self._limit = limit
+            self._cond.notify_all()
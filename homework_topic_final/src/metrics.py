@@ -0,0 +1,190 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Optional
+
+
+# границы в секундах: от полумиллисекунды (запрос из кэша) до секунд (снимок на миллион задач)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+    
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+    
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+    
+    def _labels(self, values: tuple, extra: tuple[tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+class Counter(Metric):
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+    
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+    
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in values]
+
+
+class Gauge(Metric):
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._function: Optional[Callable[[], dict[tuple, float]]] = None
+    
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+    
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+    
+    def set_function(self, function: Optional[Callable[[], dict[tuple, float]]]) -> None:
+        # значение считается только при чтении /metrics, а не на каждом запросе
+        self._function = function
+    
+    def _samples(self) -> list[str]:
+        if self._function is not None:
+            values = sorted(self._function().items())
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(labels)} {_format_value(value)}" for labels, value in values]
+
+
+class Histogram(Metric):
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self._buckets = buckets
+        # labels -> [счётчики по корзинам без накопления + корзина +Inf, сумма]
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+    
+    def observe(self, value: float, *labels: str) -> None:
+        position = bisect_left(self._buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self._buckets) + 1), [0.0])
+            entry[0][position] += 1
+            entry[1][0] += value
+    
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted((labels, (list(counts), total[0]))
+                            for labels, (counts, total) in self._values.items())
+        lines = []
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{self._labels(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    
+    def __init__(self):
+        self._metrics: list[Metric] = []
+    
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def _register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.counter(
+    "task_api_requests_total", "HTTP requests by method, route and status",
+    ("method", "route", "status"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "task_api_request_duration_seconds", "Request handling time by route", ("route",))
+IN_FLIGHT = REGISTRY.gauge(
+    "task_api_requests_in_flight", "Requests currently being handled")
+RESPONSE_CACHE = REGISTRY.counter(
+    "task_api_response_cache_total", "GET /tasks response cache lookups by result", ("result",))
+IDEMPOTENCY = REGISTRY.counter(
+    "task_api_idempotency_total", "Requests with an Idempotency-Key by result", ("result",))
+REJECTED = REGISTRY.counter(
+    "task_api_rejected_total", "Requests refused by rate limiting or admission control by reason",
+    ("reason",))
+ACCESS_LOG_DROPPED = REGISTRY.counter(
+    "task_api_access_log_dropped_total", "Access log records dropped because the buffer was full")
+STORAGE_SAVE_SECONDS = REGISTRY.histogram(
+    "task_storage_save_duration_seconds", "Time spent persisting mutations to disk")
+STORAGE_BYTES_WRITTEN = REGISTRY.counter(
+    "task_storage_bytes_written_total", "Bytes written by the storage by target", ("target",))
+STORAGE_ARCHIVED = REGISTRY.counter(
+    "task_storage_archived_total", "Completed tasks moved from the working set to the archive")
+STORAGE_VERSION = REGISTRY.gauge(
+    "task_storage_version", "Storage version, bumped on every mutation")
+TASKS = REGISTRY.gauge(
+    "task_api_tasks", "Stored tasks by priority and completion", ("priority", "isDone"))
@@ -9,13 +9,36 @@ class Priority(str, Enum):
     HIGH = "high"
 
 
-@dataclass
+# одна строка на приоритет вместо копии в каждой задаче, загруженной из JSON
+PRIORITY_VALUES = {priority.value: priority.value for priority in Priority}
+
+TITLE_CACHE_SIZE = 4096
+_recent_titles: dict[str, str] = {}
+
+
+def intern_title(title: str) -> str:
+    # sys.intern держал бы и уникальные заголовки, здесь дедуплицируются только повторы среди недавних
+    cached = _recent_titles.get(title)
+    if cached is not None:
+        return cached
+    if len(_recent_titles) >= TITLE_CACHE_SIZE:
+        _recent_titles.clear()
+    _recent_titles[title] = title
+    return title
+
+
+@dataclass(slots=True)
 class Task:
     title: str
     priority: str
     isDone: bool = False
     id: int = 0
     
+    def __post_init__(self) -> None:
+        self.priority = PRIORITY_VALUES.get(self.priority, self.priority)
+        if type(self.title) is str:
+            self.title = intern_title(self.title)
+    
     def to_dict(self) -> dict:
         return {
             "id": self.id,
@@ -0,0 +1,141 @@
+import os
+import signal
+import sys
+import time
+import traceback
+from typing import Callable, Optional
+
+
+class PreforkSupervisor:
+    
+    POLL_INTERVAL = 0.2
+    GRACEFUL_TIMEOUT = 30.0
+    # воркер, упавший быстрее этого, перезапускается с паузой, чтобы не крутить fork в цикле
+    MIN_UPTIME = 1.0
+    RESTART_DELAY = 1.0
+    
+    def __init__(self, processes: int, worker_main: Callable[[int], None],
+                 on_reload: Optional[Callable[[], None]] = None,
+                 reload_check: Optional[Callable[[], bool]] = None):
+        if not hasattr(os, 'fork'):
+            raise ValueError("server.processes > 1 requires os.fork")
+        self._processes = processes
+        self._worker_main = worker_main
+        self._reload_callback = on_reload
+        # опрашивается в главном цикле: True - конфигурация изменилась, нужен перезапуск
+        self._reload_check = reload_check
+        # pid -> (слот, время запуска)
+        self._workers: dict[int, tuple[int, float]] = {}
+        self._retiring: set[int] = set()
+        self._stopping = False
+        self._reload_requested = False
+    
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        
+        for slot in range(self._processes):
+            self._spawn(slot)
+        
+        while not self._stopping:
+            self._reap()
+            if self._reload_check is not None and self._reload_check():
+                self._reload_requested = True
+            if self._reload_requested:
+                self._reload_requested = False
+                if self._reload_callback is not None:
+                    self._reload_callback()
+                self._rolling_restart()
+            time.sleep(self.POLL_INTERVAL)
+        
+        self._shutdown_workers()
+    
+    def _on_stop(self, signum, frame) -> None:
+        self._stopping = True
+    
+    def _on_reload(self, signum, frame) -> None:
+        self._reload_requested = True
+    
+    def _spawn(self, slot: int) -> None:
+        # иначе буфер stdout, накопленный до fork, напечатается ещё раз из воркера
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                self._worker_main(slot)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self._workers[pid] = (slot, time.monotonic())
+    
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                continue
+            
+            slot, started = self._workers.pop(pid, (None, 0.0))
+            if slot is None or self._stopping:
+                continue
+            print(f"✗ Воркер {pid} завершился (код {os.waitstatus_to_exitcode(status)}), перезапуск")
+            if time.monotonic() - started < self.MIN_UPTIME:
+                time.sleep(self.RESTART_DELAY)
+            self._spawn(slot)
+    
+    def _rolling_restart(self) -> None:
+        # новые воркеры начинают принимать соединения раньше, чем старые перестают
+        old = list(self._workers)
+        self._retiring.update(old)
+        self._workers.clear()
+        for slot in range(self._processes):
+            self._spawn(slot)
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+        print(f"✓ Воркеры перезапущены: {len(old)} → {self._processes}")
+    
+    def _shutdown_workers(self) -> None:
+        pids = set(self._workers) | self._retiring
+        for pid in pids:
+            self._signal(pid, signal.SIGTERM)
+        
+        deadline = time.monotonic() + self.GRACEFUL_TIMEOUT
+        while pids and time.monotonic() < deadline:
+            for pid in list(pids):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    pids.discard(pid)
+            time.sleep(self.POLL_INTERVAL / 2)
+        
+        for pid in pids:
+            self._signal(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._workers.clear()
+        self._retiring.clear()
+    
+    def _signal(self, pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,119 @@
+import cProfile
+import io
+import pstats
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+
+class RequestProfiler:
+    
+    TOP_FUNCTIONS = 40
+    
+    def __init__(self, output_dir: Path, dump_interval: float, capture: bool = True):
+        self._output_dir = output_dir
+        self._dump_interval = dump_interval
+        self._lock = threading.Lock()
+        # с 3.12 cProfile один на процесс (sys.monitoring) и пишет все потоки сразу,
+        # поэтому профилируется один запрос за раз, остальные в это время идут без профиля
+        self._capture_lock = threading.Lock()
+        # "POST /tasks" -> накопленная статистика и число запросов
+        self._stats: dict[str, pstats.Stats] = {}
+        self._requests: dict[str, int] = {}
+        self._seconds: dict[str, float] = {}
+        self._dirty = False
+        self.capturing = capture
+        self._closed = threading.Event()
+        self._dumper = threading.Thread(target=self._run_dumper, name="task-profile-dump", daemon=True)
+        self._dumper.start()
+    
+    def run(self, call: Callable[[], None], route_key: Callable[[], str]) -> None:
+        if not self._capture_lock.acquire(blocking=False):
+            call()
+            return
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # профилировщик уже включён кем-то ещё в процессе
+                call()
+                return
+            started = time.perf_counter()
+            try:
+                call()
+            finally:
+                profile.disable()
+                self._record(route_key(), profile, time.perf_counter() - started)
+        finally:
+            self._capture_lock.release()
+    
+    def _record(self, key: str, profile: cProfile.Profile, elapsed: float) -> None:
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                self._stats[key] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._seconds[key] = self._seconds.get(key, 0.0) + elapsed
+            self._dirty = True
+    
+    def start(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._requests.clear()
+            self._seconds.clear()
+            self._dirty = False
+        self.capturing = True
+    
+    def stop(self) -> list[str]:
+        self.capturing = False
+        return self.dump()
+    
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "capturing": self.capturing,
+                "output_dir": str(self._output_dir),
+                "routes": {
+                    key: {"requests": self._requests[key], "total_seconds": round(self._seconds[key], 6)}
+                    for key in sorted(self._requests)
+                }
+            }
+    
+    def dump(self) -> list[str]:
+        with self._lock:
+            if not self._stats:
+                return []
+            self._dirty = False
+            self._output_dir.mkdir(parents=True, exist_ok=True)
+            written = []
+            for key, stats in self._stats.items():
+                name = re.sub(r'[^A-Za-z0-9]+', '_', key).strip('_')
+                # .prof открывается pstats/snakeviz, .txt читается глазами
+                prof_path = self._output_dir / f"{name}.prof"
+                stats.dump_stats(prof_path)
+                report = io.StringIO()
+                report.write(f"{key}: {self._requests[key]} запросов, {self._seconds[key]:.3f} с\n\n")
+                stats.stream = report
+                stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.TOP_FUNCTIONS)
+                (self._output_dir / f"{name}.txt").write_text(report.getvalue(), encoding='utf-8')
+                written.append(str(prof_path))
+            return written
+    
+    def _run_dumper(self) -> None:
+        while not self._closed.wait(self._dump_interval):
+            if self._dirty:
+                try:
+                    self.dump()
+                except OSError as e:
+                    print(f"✗ Ошибка записи профиля: {e}")
+    
+    def close(self) -> None:
+        self._closed.set()
+        self._dumper.join()
+        if self._dirty:
+            self.dump()
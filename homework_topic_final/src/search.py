@@ -0,0 +1,164 @@
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+# слова запроса сверх этого отбрасываются: каждое добавляет пересечение списков
+MAX_QUERY_TERMS = 8
+# короткий префикс развернулся бы в тысячи терминов; такие слова ищутся только целиком
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_TERMS = 256
+# совпадение только по префиксу весит меньше совпадения целым словом
+PREFIX_WEIGHT = 0.5
+# новые термины копятся в маленьком списке и вливаются в основной пачкой, а не по одному
+MERGE_THRESHOLD = 1024
+# верхняя граница для всех строк с данным префиксом
+PREFIX_END = '\U0010ffff'
+
+
+class SearchIndexNotReady(Exception):
+    pass
+
+
+def normalize(text: str) -> str:
+    # NFKC сводит совместимые формы символов, casefold - регистр любого алфавита;
+    # ё и е в русских названиях пишут вперемешку, ищутся они одинаково;
+    # str(): в файлах, записанных до проверки в API, встречаются заголовки-числа
+    return unicodedata.normalize('NFKC', str(text)).casefold().replace('ё', 'е')
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def query_terms(query: str) -> list[str]:
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def allows_prefix(term: str) -> bool:
+    return len(term) >= MIN_PREFIX_LENGTH
+
+
+class TitleIndex:
+    
+    def __init__(self):
+        # термин -> отсортированные id задач, в названии которых он встречается
+        self._postings: dict[str, array] = {}
+        self._terms: list[str] = []
+        self._recent: list[str] = []
+        self._size = 0
+    
+    def extend(self, tasks: Iterable[tuple[int, str]]) -> None:
+        # (id, заголовок); id обычно растут, тогда списки только дописываются
+        fresh = []
+        for task_id, title in tasks:
+            self._size += 1
+            for term in set(tokenize(title)):
+                ids = self._postings.get(term)
+                if ids is None:
+                    self._postings[term] = array('q', (task_id,))
+                    fresh.append(term)
+                elif ids[-1] < task_id:
+                    ids.append(task_id)
+                else:
+                    insort(ids, task_id)
+        
+        if fresh:
+            # оба списка уже отсортированы, timsort сливает их за один проход
+            self._recent = sorted(self._recent + fresh)
+            if len(self._recent) >= MERGE_THRESHOLD:
+                self._terms = sorted(self._terms + self._recent)
+                self._recent = []
+    
+    def discard(self, tasks: Iterable[tuple[int, str]]) -> None:
+        removed: dict[str, set[int]] = {}
+        for task_id, title in tasks:
+            self._size -= 1
+            for term in set(tokenize(title)):
+                removed.setdefault(term, set()).add(task_id)
+        
+        emptied = set()
+        for term, ids in removed.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            kept = array('q', (task_id for task_id in postings if task_id not in ids))
+            if kept:
+                self._postings[term] = kept
+            else:
+                del self._postings[term]
+                emptied.add(term)
+        # иначе префиксный поиск находил бы термины без списков
+        if emptied:
+            self._terms = [term for term in self._terms if term not in emptied]
+            self._recent = [term for term in self._recent if term not in emptied]
+    
+    def search(self, query: str, count: int) -> list[tuple[float, int]]:
+        # (score, id) по убыванию релевантности, при равной - по возрастанию id
+        terms = query_terms(query)
+        if not terms or count <= 0:
+            return []
+        
+        matches = []
+        for term in terms:
+            expanded = self._expand(term)
+            if not expanded:
+                return []
+            exact = self._postings.get(term, array('q'))
+            union = self._union([self._postings[match] for match in expanded])
+            idf = math.log(1 + self._size / len(union))
+            matches.append((exact, union, idf))
+        
+        # пересечение начинаем с самого короткого списка
+        matches.sort(key=lambda match: len(match[1]))
+        candidates = matches[0][1]
+        for _, union, _ in matches[1:]:
+            candidates = self._intersect(candidates, union)
+            if not candidates:
+                return []
+        
+        # у всех кандидатов одинаковый вес: порядок по id, и страница - это срез без обхода
+        if all(len(exact) in (0, len(union)) for exact, union, _ in matches):
+            score = sum(idf if exact else idf * PREFIX_WEIGHT for exact, _, idf in matches)
+            return [(score, task_id) for task_id in candidates[:count]]
+        
+        scored = []
+        for task_id in candidates:
+            score = 0.0
+            for exact, _, idf in matches:
+                score += idf if self._contains(exact, task_id) else idf * PREFIX_WEIGHT
+            scored.append((score, task_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored[:count]
+    
+    def _expand(self, term: str) -> list[str]:
+        exact = [term] if term in self._postings else []
+        if not allows_prefix(term):
+            return exact
+        expanded = []
+        for terms in (self._terms, self._recent):
+            start = bisect_left(terms, term)
+            end = bisect_left(terms, term + PREFIX_END, start)
+            expanded.extend(terms[start:end])
+        if len(expanded) > MAX_PREFIX_TERMS:
+            return exact
+        return expanded
+    
+    def _union(self, postings: list[array]) -> array:
+        if len(postings) == 1:
+            return postings[0]
+        return array('q', sorted(set().union(*postings)))
+    
+    def _intersect(self, small: array, large: array) -> array:
+        # короткий список проверяем двоичным поиском по длинному, соизмеримые - через множество
+        if len(small) * max(len(large).bit_length(), 1) < len(large):
+            return array('q', (task_id for task_id in small if self._contains(large, task_id)))
+        return array('q', sorted(set(small).intersection(large)))
+    
+    def _contains(self, ids: array, task_id: int) -> bool:
+        position = bisect_left(ids, task_id)
+        return position < len(ids) and ids[position] == task_id
@@ -1,33 +1,558 @@
+import os
+import selectors
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields, replace
 from http.server import HTTPServer
 from pathlib import Path
+from typing import Optional
 
-from .config import Config
-from .storage import TaskStorage
-from .handlers import TaskAPIHandler
+from .access_log import AccessLog
+from .async_server import AsyncTaskServer
+from .cache import ResponseCache
+from .changes import ChangeFeed
+from .compression import ResponseCompressor
+from .config import Config, ConfigWatcher
+from .storage import TaskStorage, open_storage
+from .handlers import TaskAPIHandler, TaskRoutes
+from .idempotency import IdempotencyCache, SQLiteIdempotencyCache
+from .limits import ConcurrencyLimit, RateLimiter
+from .metrics import REJECTED, STORAGE_ARCHIVED, STORAGE_VERSION, TASKS
+from .prefork import PreforkSupervisor
+from .profiling import RequestProfiler
+
+
+ENGINE_CLASSIC = "classic"
+ENGINE_THREADED = "threaded"
+ENGINE_ASYNCIO = "asyncio"
+
+# настройки, которые перезагрузка конфигурации применяет без перезапуска
+RELOADABLE = {
+    'server': ('workers',),
+    'storage': ('sync', 'sync_window_ms', 'sync_interval_ms'),
+    'cache': ('max_entries', 'stream_threshold'),
+    'changes': ('max_wait',),
+    'compression': ('enabled', 'min_size', 'level'),
+    'limits': ('rate', 'burst', 'key_header', 'api_keys', 'max_clients', 'max_queue', 'retry_after'),
+    'archive': ('enabled', 'max_age', 'interval'),
+}
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    
+    request_queue_size = 128
+    # long-poll и SSE держат поток пула, а не весь сервер
+    allows_waiting = True
+    # ждущим запросам отдаётся не больше четверти воркеров, иначе подписчики на ленту
+    # заняли бы весь пул и остальные запросы, включая /health, встали бы в очередь
+    WAITING_SHARE = 4
+    # отказ 503 тоже занимает поток, но короткий: таймаут чтения запроса у него маленький
+    REJECT_WORKERS = 2
+    REJECT_PENDING = 64
+    
+    def __init__(self, server_address: tuple, handler_class: type, workers: int,
+                 keepalive_timeout: float = 75, bind_and_activate: bool = True,
+                 max_queue: int = 0):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task-api")
+        # пулы, заменённые resize: они дорабатывают принятые запросы, server_close их дожидается
+        self._retired: list[ThreadPoolExecutor] = []
+        self._pool_lock = threading.Lock()
+        # слоты сверх workers - запросы, ждущие свободного потока в очереди пула
+        self._slots = ConcurrencyLimit(workers + max_queue)
+        self._max_queue = max_queue
+        self._waiting = ConcurrencyLimit(workers // self.WAITING_SHARE)
+        self._rejector: Optional[ThreadPoolExecutor] = None
+        self._reject_slots = threading.BoundedSemaphore(self.REJECT_PENDING)
+        self._reject_handler = type(handler_class.__name__, (handler_class,),
+                                    {"overloaded": True, "timeout": 1})
+        if max_queue > 0:
+            self._start_rejector()
+        self._keepalive_timeout = keepalive_timeout
+        # keep-alive соединения между запросами ждут здесь, а не в потоках пула:
+        # иначе несколько простаивающих клиентов заняли бы все воркеры
+        self._idle = selectors.DefaultSelector()
+        self._idle_lock = threading.Lock()
+        self._idle_closed = False
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self._idle_watcher = threading.Thread(target=self._watch_idle, name="task-api-keepalive",
+                                              daemon=True)
+        self._idle_watcher.start()
+    
+    def process_request(self, request, client_address) -> None:
+        # без max_queue при занятых воркерах новые соединения ждут в backlog ядра
+        if not self._acquire_slot():
+            self._reject(request, client_address)
+            return
+        self._submit(request, client_address)
+    
+    def _submit(self, request, client_address) -> None:
+        # под блокировкой: resize не может остановить пул между чтением атрибута и submit
+        with self._pool_lock:
+            self._executor.submit(self._process_request_worker, request, client_address)
+    
+    def _start_rejector(self) -> None:
+        if self._rejector is None:
+            self._rejector = ThreadPoolExecutor(max_workers=self.REJECT_WORKERS,
+                                                thread_name_prefix="task-api-reject")
+    
+    def resize(self, workers: int, max_queue: int) -> None:
+        # новый пул берёт следующие запросы; соединения не закрываются, а занятые
+        # слоты освобождаются по мере завершения запросов старого пула
+        with self._pool_lock:
+            previous = self._executor
+            self._retired.append(previous)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task-api")
+            if max_queue > 0:
+                self._start_rejector()
+            self._max_queue = max_queue
+        previous.shutdown(wait=False)
+        self._slots.resize(workers + max_queue)
+        self._waiting.resize(workers // self.WAITING_SHARE)
+    
+    def acquire_waiting(self) -> bool:
+        return self._waiting.acquire(blocking=False)
+    
+    def release_waiting(self) -> None:
+        self._waiting.release()
+    
+    def _acquire_slot(self) -> bool:
+        if self._max_queue > 0:
+            return self._slots.acquire(blocking=False)
+        return self._slots.acquire()
+    
+    def _reject(self, request, client_address) -> None:
+        # очередь полна: клиент сразу получает 503 вместо ожидания без предела
+        if not self._reject_slots.acquire(blocking=False):
+            REJECTED.inc('dropped')
+            self.shutdown_request(request)
+            return
+        try:
+            self._rejector.submit(self._reject_worker, request, client_address)
+        except RuntimeError:
+            self._reject_slots.release()
+            self.shutdown_request(request)
+    
+    def _reject_worker(self, request, client_address) -> None:
+        try:
+            self._reject_handler(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._reject_slots.release()
+    
+    def finish_request(self, request, client_address) -> bool:
+        handler = self.RequestHandlerClass(request, client_address, self)
+        return getattr(handler, 'keep_alive', False)
+    
+    def _process_request_worker(self, request, client_address) -> None:
+        keep_alive = False
+        try:
+            keep_alive = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if keep_alive:
+                self.park(request, client_address)
+            else:
+                self.shutdown_request(request)
+            self._slots.release()
+    
+    def park(self, request, client_address) -> None:
+        with self._idle_lock:
+            if not self._idle_closed:
+                self._idle.register(request, selectors.EVENT_READ,
+                                    (client_address, time.monotonic() + self._keepalive_timeout))
+                return
+        self.shutdown_request(request)
+    
+    def _watch_idle(self) -> None:
+        while not self._idle_closed:
+            # сокет, зарегистрированный из потока пула, epoll видит сразу; таймаут нужен
+            # только чтобы вовремя закрывать простоявшие соединения
+            ready = self._idle.select(timeout=1.0)
+            now = time.monotonic()
+            with self._idle_lock:
+                resumed = []
+                for key, _ in ready:
+                    self._idle.unregister(key.fileobj)
+                    resumed.append((key.fileobj, key.data[0]))
+                expired = [key.fileobj for key in self._idle.get_map().values() if key.data[1] <= now]
+                for request in expired:
+                    self._idle.unregister(request)
+            
+            for request in expired:
+                self.shutdown_request(request)
+            for request, client_address in resumed:
+                if not self._acquire_slot():
+                    self._reject(request, client_address)
+                    continue
+                try:
+                    self._submit(request, client_address)
+                except RuntimeError:
+                    # пул уже остановлен
+                    self._slots.release()
+                    self.shutdown_request(request)
+    
+    def server_close(self) -> None:
+        super().server_close()
+        with self._idle_lock:
+            self._idle_closed = True
+        self._idle_watcher.join()
+        with self._idle_lock:
+            idle = [key.fileobj for key in self._idle.get_map().values()]
+            self._idle.close()
+        for request in idle:
+            self.shutdown_request(request)
+        for executor in self._retired + [self._executor]:
+            executor.shutdown(wait=True)
+        if self._rejector is not None:
+            self._rejector.shutdown(wait=True)
+
+
+def _adopt_socket(server: HTTPServer, sock: socket.socket) -> HTTPServer:
+    # сокет уже слушает в супервизоре; свой сокет сервера не привязан и не нужен
+    server.socket.close()
+    server.socket = sock
+    server.server_address = sock.getsockname()[:2]
+    server.server_name, server.server_port = server.server_address
+    return server
 
 
 class TaskServer:
     
     def __init__(self, config: Config):
+        if config.server.processes > 1 and config.storage.backend != TaskStorage.BACKEND_SQLITE:
+            # файловое хранилище держит состояние в памяти процесса, воркеры разошлись бы
+            raise ValueError("server.processes > 1 requires storage.backend: sqlite")
         self._config = config
-        self._storage_path = Path(__file__).parent.parent / config.storage.file
-        self._storage = TaskStorage(self._storage_path)
+        base_dir = Path(__file__).parent.parent
+        self._base_dir = base_dir
+        if config.storage.backend == TaskStorage.BACKEND_SQLITE:
+            self._storage_path = base_dir / config.storage.database
+        else:
+            self._storage_path = base_dir / config.storage.file
+        self._storage = open_storage(config.storage, base_dir)
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._access_log: Optional[AccessLog] = None
+        self._profiler: Optional[RequestProfiler] = None
+        # общий для всех воркеров, чтобы ETag не зависел от процесса, принявшего запрос
+        self._cache_epoch = os.urandom(4).hex()
+        self._worker: Optional[int] = None
+        self._changes: Optional[ChangeFeed] = None
+        self._compressor = self._create_compressor()
+        self._reload_requested = threading.Event()
+        self._reloader: Optional[threading.Thread] = None
+        self._reloader_stopping = False
+        self._archiver: Optional[threading.Thread] = None
+        self._archiver_stopping = threading.Event()
+        self._idempotency: Optional[IdempotencyCache] = None
+    
+    def _create_compressor(self) -> Optional[ResponseCompressor]:
+        compression = self._config.compression
+        if not compression.enabled:
+            return None
+        return ResponseCompressor(compression.min_size, compression.level)
+    
+    def _create_rate_limiter(self) -> Optional[RateLimiter]:
+        # вёдра в памяти процесса: в pre-fork лимит действует на каждый воркер отдельно
+        limits = self._config.limits
+        if limits.rate <= 0:
+            return None
+        return RateLimiter(limits.rate, limits.burst, limits.key_header, limits.max_clients,
+                           limits.api_keys)
+    
+    def _create_idempotency(self) -> Optional[IdempotencyCache]:
+        idempotency = self._config.idempotency
+        if not idempotency.enabled:
+            return None
+        if self._worker is not None:
+            # pre-fork работает только с SQLite: ключи в той же базе видят все воркеры
+            return SQLiteIdempotencyCache(self._storage_path, idempotency.max_entries, idempotency.ttl,
+                                          idempotency.wait_timeout)
+        # журнал рядом с хранилищем
+        file_path = self._storage_path.with_suffix('.idempotency')
+        return IdempotencyCache(idempotency.max_entries, idempotency.ttl, idempotency.wait_timeout,
+                                file_path)
     
     def run(self) -> None:
-        TaskAPIHandler.storage = self._storage
-        
         host = self._config.server.host
         port = self._config.server.port
         
-        server = HTTPServer((host, port), TaskAPIHandler)
+        if self._config.server.processes > 1:
+            self._run_prefork(host, port)
+            return
+        
+        server = self._bind(host, port)
+        self._server = server
         
         self._print_banner(host, port)
+        self._start_reloader()
+        self._start_archiver()
         
         try:
             server.serve_forever()
         except KeyboardInterrupt:
             print("\n✓ Сервер остановлен")
-            server.shutdown()
+        finally:
+            self._stop_reloader()
+            self._stop_archiver()
+            self._close_changes()
+            server.server_close()
+            self._close()
+    
+    def _run_prefork(self, host: str, port: int) -> None:
+        listener = socket.create_server((host, port), backlog=1024)
+        # флаг O_NONBLOCK общий для всех копий сокета: воркер, проигравший гонку за
+        # соединение, получает EAGAIN вместо блокировки в accept и видит shutdown
+        listener.setblocking(False)
+        # соединения SQLite через fork не наследуются, каждый воркер откроет своё
+        self._storage.close()
+        
+        self._print_banner(host, port)
+        
+        # новые настройки воркеры получают при перезапуске, который супервизор делает по SIGHUP
+        watcher = ConfigWatcher(self._config.path, self._config.server.reload_interval)
+        supervisor = PreforkSupervisor(self._config.server.processes,
+                                       lambda slot: self._run_worker(listener, slot),
+                                       on_reload=self._reload_config, reload_check=watcher.changed)
+        try:
+            supervisor.run()
+        finally:
+            listener.close()
+        print("\n✓ Сервер остановлен")
+    
+    def _run_worker(self, listener: socket.socket, slot: int) -> None:
+        self._worker = slot
+        self._storage = open_storage(self._config.storage, self._base_dir)
+        host, port = listener.getsockname()[:2]
+        server = self._bind(host, port, listener)
+        # shutdown ждёт выхода из serve_forever, поэтому вызывается не из обработчика сигнала
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+            target=server.shutdown, name="task-api-shutdown", daemon=True).start())
+        # база общая, архивирует один воркер; у остальных транзакции не нашли бы ничего нового
+        if slot == 0:
+            self._start_archiver()
+        try:
+            server.serve_forever()
+        finally:
+            self._stop_archiver()
+            server.server_close()
+            self._close()
+    
+    def start(self) -> tuple[str, int]:
+        # запуск в фоновом потоке для бенчмарков; при port: 0 порт выбирает система
+        self._server = self._bind(self._config.server.host, self._config.server.port)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="task-api-server", daemon=True)
+        self._thread.start()
+        return self._server.server_address[:2]
+    
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._thread.join()
+        self._close_changes()
+        self._server.server_close()
+        self._close()
+    
+    def _bind(self, host: str, port: int, sock: Optional[socket.socket] = None):
+        server_config = self._config.server
+        if server_config.access_log:
+            self._access_log = AccessLog(server_config.access_log_file or None,
+                                         server_config.access_log_sample_rate)
+        
+        TaskRoutes.storage = self._storage
+        TaskRoutes.response_cache = ResponseCache(self._config.cache.max_entries, self._cache_epoch)
+        TaskRoutes.stream_threshold = self._config.cache.stream_threshold
+        TaskRoutes.access_log = self._access_log
+        # таймаут чтения внутри запроса; простой между запросами ограничивает селектор сервера
+        TaskAPIHandler.timeout = server_config.keepalive_timeout
+        TaskRoutes.compressor = self._compressor
+        TaskRoutes.rate_limiter = self._create_rate_limiter()
+        TaskRoutes.retry_after = self._config.limits.retry_after
+        self._idempotency = self._create_idempotency()
+        TaskRoutes.idempotency = self._idempotency
+        
+        # лента в памяти процесса: pre-fork воркер видел бы только свои изменения
+        if self._worker is None:
+            self._changes = ChangeFeed(self._config.changes.buffer_size)
+        self._storage.changes = self._changes
+        TaskRoutes.changes = self._changes
+        TaskRoutes.changes_max_wait = self._config.changes.max_wait
+        
+        profiling = self._config.profiling
+        if profiling.enabled:
+            output_dir = self._base_dir / profiling.output_dir
+            if self._worker is not None:
+                output_dir = output_dir / f"worker-{self._worker}"
+            self._profiler = RequestProfiler(output_dir, profiling.dump_interval, profiling.capture)
+        TaskRoutes.profiler = self._profiler
+        
+        storage = self._storage
+        TASKS.set_function(lambda: {
+            (priority, str(is_done).lower()): count
+            for (priority, is_done), count in storage.counts().items()
+        })
+        STORAGE_VERSION.set_function(lambda: {(): storage.version})
+        return self._create_server(host, port, sock)
+    
+    def _start_reloader(self) -> None:
+        # обработчик сигнала только будит поток: перезагрузка берёт блокировки сервера,
+        # которые прерванный сигналом главный поток может держать
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self._reload_requested.set())
+        self._reloader = threading.Thread(target=self._watch_config, name="task-api-reload",
+                                          daemon=True)
+        self._reloader.start()
+    
+    def _stop_reloader(self) -> None:
+        self._reloader_stopping = True
+        self._reload_requested.set()
+    
+    def _watch_config(self) -> None:
+        interval = self._config.server.reload_interval
+        watcher = ConfigWatcher(self._config.path, interval)
+        while True:
+            requested = self._reload_requested.wait(interval if interval > 0 else None)
+            self._reload_requested.clear()
+            if self._reloader_stopping:
+                return
+            if watcher.changed() or requested:
+                self.reload()
+    
+    def _start_archiver(self) -> None:
+        self._archiver = threading.Thread(target=self._run_archiver, name="task-archive", daemon=True)
+        self._archiver.start()
+    
+    def _stop_archiver(self) -> None:
+        # проход архивации дожидаемся: хранилище закрывается следом
+        self._archiver_stopping.set()
+        if self._archiver is not None:
+            self._archiver.join()
+    
+    def _run_archiver(self) -> None:
+        # настройки читаются на каждом проходе, так что перезагрузка конфигурации применяется сразу
+        while not self._archiver_stopping.wait(max(self._config.archive.interval, 1)):
+            archive = self._config.archive
+            if not archive.enabled:
+                continue
+            started = time.perf_counter()
+            try:
+                archived = self._storage.archive_completed(archive.max_age)
+            except Exception as e:
+                print(f"✗ Ошибка архивации: {e}")
+                continue
+            if archived:
+                STORAGE_ARCHIVED.inc(amount=archived)
+                print(f"✓ В архив перенесено {archived} задач за {time.perf_counter() - started:.2f} с")
+    
+    def reload(self) -> None:
+        previous = self._config
+        if not self._reload_config():
+            return
+        try:
+            self._apply_config(previous)
+        except ValueError as e:
+            self._config = previous
+            print(f"✗ Конфигурация не применена: {e}")
+    
+    def _reload_config(self) -> bool:
+        try:
+            loaded = Config.load(self._config.path)
+        except Exception as e:
+            # ошибка в файле не должна останавливать сервер, работаем на прежних настройках
+            print(f"✗ Конфигурация не перезагружена: {e}")
+            return False
+        
+        sections = {}
+        applied, ignored = [], []
+        for section in fields(loaded):
+            current = getattr(self._config, section.name)
+            # profiling включается флагом --profile и /debug/profile, а не перезагрузкой
+            if section.name == 'path' or section.name == 'profiling':
+                continue
+            reloadable = RELOADABLE.get(section.name, ())
+            updates = {}
+            for option in fields(current):
+                value = getattr(getattr(loaded, section.name), option.name)
+                if value == getattr(current, option.name):
+                    continue
+                if option.name in reloadable:
+                    updates[option.name] = value
+                    applied.append(f"{section.name}.{option.name}")
+                else:
+                    ignored.append(f"{section.name}.{option.name}")
+            sections[section.name] = replace(current, **updates)
+        
+        self._config = replace(self._config, **sections)
+        self._compressor = self._create_compressor()
+        if ignored:
+            print(f"⚠ Требуют перезапуска, не применены: {', '.join(ignored)}")
+        print(f"✓ Конфигурация перезагружена: {', '.join(applied) or 'без изменений'}")
+        return True
+    
+    def _apply_config(self, previous: Config) -> None:
+        config = self._config
+        if config.server.workers < 1:
+            raise ValueError("server.workers must be at least 1")
+        
+        storage = config.storage
+        if (storage.sync, storage.sync_window_ms, storage.sync_interval_ms) != (
+                previous.storage.sync, previous.storage.sync_window_ms,
+                previous.storage.sync_interval_ms):
+            self._storage.set_sync(storage.sync, storage.sync_window_ms, storage.sync_interval_ms)
+        
+        # классический движок обслуживает запросы в одном потоке, менять ему нечего
+        resize = getattr(self._server, 'resize', None)
+        if resize is not None and (config.server.workers, config.limits.max_queue) != (
+                previous.server.workers, previous.limits.max_queue):
+            resize(config.server.workers, config.limits.max_queue)
+        
+        if config.cache.max_entries != previous.cache.max_entries:
+            TaskRoutes.response_cache = ResponseCache(config.cache.max_entries, self._cache_epoch)
+        TaskRoutes.stream_threshold = config.cache.stream_threshold
+        TaskRoutes.compressor = self._compressor
+        # пересоздание обнулило бы вёдра, поэтому только при изменении лимитов
+        if config.limits != previous.limits:
+            TaskRoutes.rate_limiter = self._create_rate_limiter()
+        TaskRoutes.retry_after = config.limits.retry_after
+        TaskRoutes.changes_max_wait = config.changes.max_wait
+    
+    def _close_changes(self) -> None:
+        # будим long-poll и SSE, иначе server_close ждал бы их потоки
+        if self._changes is not None:
+            self._changes.close()
+    
+    def _close(self) -> None:
+        self._storage.close()
+        if self._idempotency is not None:
+            self._idempotency.close()
+        if self._access_log is not None:
+            self._access_log.close()
+        if self._profiler is not None:
+            self._profiler.close()
+    
+    def _create_server(self, host: str, port: int, sock: Optional[socket.socket] = None):
+        engine = self._config.server.engine
+        workers = self._config.server.workers
+        max_queue = self._config.limits.max_queue
+        bind = sock is None
+        
+        if engine == ENGINE_CLASSIC:
+            server = HTTPServer((host, port), TaskAPIHandler, bind)
+        elif engine == ENGINE_THREADED:
+            server = ThreadPoolHTTPServer((host, port), TaskAPIHandler, workers,
+                                          self._config.server.keepalive_timeout, bind, max_queue)
+        elif engine == ENGINE_ASYNCIO:
+            return AsyncTaskServer((host, port), workers, self._config.server.keepalive_timeout, sock,
+                                   max_queue)
+        else:
+            raise ValueError(f"Unknown server engine: {engine}")
+        return server if bind else _adopt_socket(server, sock)
     
     def _print_banner(self, host: str, port: int) -> None:
         print("=" * 60)
@@ -37,15 +562,54 @@ class TaskServer:
         print("Конфигурация:")
         print(f"  Host:         {host}")
         print(f"  Port:         {port}")
-        print(f"  Storage:      {self._storage_path}")
+        print(f"  Engine:       {self._config.server.engine}")
+        print(f"  Workers:      {self._config.server.workers}")
+        if self._config.server.processes > 1:
+            print(f"  Processes:    {self._config.server.processes} (pre-fork, SIGHUP - перезапуск воркеров)")
+        print(f"  Storage:      {self._storage_path} ({self._config.storage.backend})")
+        print(f"  Mode:         {self._config.storage.mode}")
+        if self._config.storage.shards > 1:
+            print(f"  Shards:       {self._config.storage.shards} ({self._config.storage.shard_persistence})")
+        print(f"  Sync:         {self._config.storage.sync}")
+        if self._compressor is not None:
+            encodings = ", ".join(self._compressor.encodings)
+            print(f"  Compression:  {encodings} (от {self._config.compression.min_size} байт)")
+        limits = self._config.limits
+        if limits.rate > 0:
+            print(f"  Rate limit:   {limits.rate:g}/с на клиента, burst {limits.burst}")
+        if limits.max_queue > 0:
+            print(f"  Queue:        {limits.max_queue} сверх воркеров, дальше 503")
+        idempotency = self._config.idempotency
+        if idempotency.enabled:
+            print(f"  Idempotency:  {idempotency.max_entries} ключей на {idempotency.ttl} с")
+        archive = self._config.archive
+        if archive.enabled:
+            print(f"  Archive:      выполненные старше {archive.max_age} с, проверка раз в {archive.interval} с")
+        if self._config.server.reload_interval > 0:
+            print(f"  Reload:       SIGHUP или изменение {self._config.path.name} "
+                  f"(проверка раз в {self._config.server.reload_interval:g} с)")
+        if self._config.profiling.enabled:
+            print(f"  Profiling:    {self._base_dir / self._config.profiling.output_dir}")
         print()
         print(f"Сервер запущен: http://{host}:{port}")
         print()
         print("API endpoints:")
         print("  GET  /health             - проверка состояния")
+        print("  GET  /metrics            - метрики в формате Prometheus")
         print("  GET  /tasks              - получить все задачи")
-        print("  POST /tasks              - создать задачу")
+        print("       ?limit=&cursor=&priority=&isDone=&sort=id|-id - фильтры и страницы")
+        print("       ?archived=true - выполненные задачи из архива")
+        print(f"       без limit от {self._config.cache.stream_threshold} задач - потоком (chunked), "
+              "Accept: application/x-ndjson - NDJSON")
+        print("  GET  /tasks/changes      - изменения с версии ?since=&wait= (или SSE)")
+        print("  GET  /tasks/search       - поиск по названию ?q=&limit=&cursor=")
+        print("  POST /tasks              - создать задачу (Idempotency-Key - без дублей при повторе)")
         print("  POST /tasks/{id}/complete - выполнить задачу")
+        print("  POST /tasks:batch        - создать пачку задач")
+        print("  POST /tasks/complete:batch - выполнить пачку задач")
+        if self._config.profiling.enabled:
+            print("  GET  /debug/profile      - состояние профилирования")
+            print("  POST /debug/profile/start|stop - начать/остановить сбор профиля")
         print()
         print("Для остановки нажмите Ctrl+C")
         print("=" * 60)
@@ -0,0 +1,222 @@
+import heapq
+import itertools
+import multiprocessing
+import os
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Optional
+
+from . import codec
+from .archive import TaskArchive
+from .changes import ChangeFeed
+from .config import StorageConfig
+from .models import Task
+from .storage import FileTaskStorage, TaskStorage, write_snapshot_file
+
+
+PERSISTENCE_THREAD = "thread"
+PERSISTENCE_PROCESS = "process"
+
+
+def shard_path(file_path: Path, shard: int) -> Path:
+    return file_path.with_name(f"{file_path.stem}.shard{shard}{file_path.suffix}")
+
+
+def layout_path(file_path: Path) -> Path:
+    return file_path.with_suffix('.shards')
+
+
+def check_layout(file_path: Path, shards: int, block_size: int) -> None:
+    # шард задачи вычисляется из её id по числу шардов и размеру блока: с другими значениями
+    # задачи искались бы не в том шарде, а новые id совпали бы с уже выданными
+    path = layout_path(file_path)
+    if path.exists():
+        layout = codec.loads(path.read_bytes())
+        if (layout['shards'], layout['block_size']) != (shards, block_size):
+            raise ValueError(
+                f"{file_path} is sharded with shards={layout['shards']}, "
+                f"shard_block_size={layout['block_size']}; storage.shards={shards}, "
+                f"storage.shard_block_size={block_size} in config does not match")
+        return
+    # шарды, созданные до этого файла: размер блока по ним не узнать, но лишний шард виден
+    pattern = re.compile(rf'{re.escape(file_path.stem)}\.shard(\d+)\.')
+    names = os.listdir(file_path.parent) if file_path.parent.exists() else []
+    existing = [int(match.group(1)) for match in map(pattern.match, names) if match]
+    if existing and max(existing) >= shards:
+        raise ValueError(f"{file_path} has {max(existing) + 1} shards, storage.shards={shards} in config")
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(codec.dumps({"shards": shards, "block_size": block_size}))
+
+
+class ShardTaskStorage(FileTaskStorage):
+    
+    # id выдаются блоками: блок k принадлежит шарду k % shards, поэтому шарды
+    # не делят счётчик, а шард задачи вычисляется по её id без таблицы
+    def __init__(self, file_path: Path, shard: int, shards: int, block_size: int, **kwargs):
+        self._shard = shard
+        self._shards = shards
+        self._block_size = block_size
+        super().__init__(file_path, **kwargs)
+    
+    def _allocate_ids(self, count: int) -> list[int]:
+        ids = []
+        next_id = self._next_id
+        while len(ids) < count:
+            block = (next_id - 1) // self._block_size
+            if block % self._shards != self._shard:
+                block += (self._shard - block) % self._shards
+                next_id = block * self._block_size + 1
+            take = min(count - len(ids), (block + 1) * self._block_size + 1 - next_id)
+            ids.extend(range(next_id, next_id + take))
+            next_id += take
+        self._next_id = next_id
+        return ids
+
+
+class ShardedTaskStorage(TaskStorage):
+    
+    def __init__(self, file_path: Path, config: StorageConfig):
+        if config.shard_persistence not in (PERSISTENCE_THREAD, PERSISTENCE_PROCESS):
+            raise ValueError(f"Unknown shard persistence: {config.shard_persistence}")
+        
+        self._block_size = config.shard_block_size
+        self._executor: Optional[Executor] = None
+        if config.shard_persistence == PERSISTENCE_PROCESS:
+            # spawn: fork процесса с потоками сервера может унаследовать захваченные блокировки
+            self._executor = ProcessPoolExecutor(max_workers=config.shards,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        
+        check_layout(file_path, config.shards, config.shard_block_size)
+        self._migrate(file_path, config)
+        self._shards = [
+            ShardTaskStorage(
+                shard_path(file_path, shard), shard, config.shards, config.shard_block_size,
+                mode=config.mode,
+                compact_threshold=config.log_compact_bytes,
+                sync=config.sync,
+                sync_window_ms=config.sync_window_ms,
+                sync_interval_ms=config.sync_interval_ms,
+                layout=config.layout,
+                streaming_load=config.streaming_load,
+                snapshot_format=config.snapshot_format,
+                snapshot_executor=self._executor
+            )
+            for shard in range(config.shards)
+        ]
+        self._round_robin = itertools.count()
+    
+    def _migrate(self, file_path: Path, config: StorageConfig) -> None:
+        # однократный перенос нешардированного хранилища: задачи раскладываются по правилу блоков
+        suffixes = ('.txt', '.log', '.bin')
+        if any(shard_path(file_path, shard).with_suffix(suffix).exists()
+               for shard in range(config.shards) for suffix in suffixes):
+            return
+        if not any(file_path.with_suffix(suffix).exists() for suffix in suffixes):
+            return
+        
+        log_path = file_path.with_suffix('.log')
+        mode = FileTaskStorage.MODE_LOG if log_path.exists() else FileTaskStorage.MODE_JSON
+        source = FileTaskStorage(file_path, mode=mode, snapshot_format=config.snapshot_format)
+        tasks = source.get_all()
+        archived, _ = source.query(archived=True)
+        source.close()
+        
+        partitions: list[list[dict]] = [[] for _ in range(config.shards)]
+        for task in sorted(tasks, key=lambda task: task.id):
+            partitions[self._shard_index(task.id, config.shards)].append(task.to_dict())
+        for shard, records in enumerate(partitions):
+            write_snapshot_file(shard_path(file_path, shard), records)
+        # архив тоже раскладывается по шардам: по нему шард узнаёт занятые id
+        archives: list[list[dict]] = [[] for _ in range(config.shards)]
+        for task in archived:
+            archives[self._shard_index(task.id, config.shards)].append(task.to_dict())
+        for shard, records in enumerate(archives):
+            if records:
+                TaskArchive(shard_path(file_path, shard).with_suffix('.archive')).append(records)
+        print(f"✓ Перенесено {len(tasks)} задач из {file_path} в {config.shards} шардов")
+    
+    def _shard_index(self, task_id: int, shards: int) -> int:
+        return (task_id - 1) // self._block_size % shards
+    
+    def _shard_for(self, task_id: int) -> ShardTaskStorage:
+        return self._shards[self._shard_index(task_id, len(self._shards))]
+    
+    @property
+    def changes(self) -> Optional[ChangeFeed]:
+        return self._shards[0].changes
+    
+    @changes.setter
+    def changes(self, feed: Optional[ChangeFeed]) -> None:
+        # публикуют сами шарды: id задачи не меняет шард, так что порядок её событий сохраняется
+        for shard in self._shards:
+            shard.changes = feed
+    
+    @property
+    def version(self) -> int:
+        # каждая версия только растёт, значит и сумма тоже
+        return sum(shard.version for shard in self._shards)
+    
+    def create_many(self, items: list[tuple[str, str]]) -> list[Task]:
+        # пачка целиком в одном шарде, чтобы её запись оставалась одной мутацией
+        shard = self._shards[next(self._round_robin) % len(self._shards)]
+        return shard.create_many(items)
+    
+    def complete_many(self, task_ids: list[int]) -> list[bool]:
+        groups: dict[int, list[int]] = {}
+        for task_id in task_ids:
+            groups.setdefault(self._shard_index(task_id, len(self._shards)), []).append(task_id)
+        
+        completed = {}
+        for shard, ids in groups.items():
+            completed.update(zip(ids, self._shards[shard].complete_many(ids)))
+        return [completed[task_id] for task_id in task_ids]
+    
+    def get_all(self) -> list[Task]:
+        return list(heapq.merge(*(shard.query()[0] for shard in self._shards),
+                                key=lambda task: task.id))
+    
+    def query(self, priority: Optional[str] = None, is_done: Optional[bool] = None,
+              cursor: Optional[int] = None, limit: Optional[int] = None,
+              descending: bool = False, archived: bool = False) -> tuple[list[Task], Optional[int]]:
+        pages = [shard.query(priority, is_done, cursor, limit, descending, archived)
+                 for shard in self._shards]
+        merged = heapq.merge(*(tasks for tasks, _ in pages), key=lambda task: task.id,
+                             reverse=descending)
+        if limit is None:
+            return list(merged), None
+        
+        tasks = list(islice(merged, limit))
+        has_more = (sum(len(page) for page, _ in pages) > limit
+                    or any(next_cursor is not None for _, next_cursor in pages))
+        return tasks, tasks[-1].id if has_more and tasks else None
+    
+    def get_by_id(self, task_id: int) -> Optional[Task]:
+        return self._shard_for(task_id).get_by_id(task_id)
+    
+    def search_ranked(self, query: str, count: int) -> list[tuple[float, Task]]:
+        # idf у каждого шарда свой, но шарды заполняются равномерно и веса близки
+        ranked = [shard.search_ranked(query, count) for shard in self._shards]
+        merged = heapq.merge(*ranked, key=lambda item: (-item[0], item[1].id))
+        return list(islice(merged, count))
+    
+    def counts(self, archived: bool = False) -> dict[tuple[str, bool], int]:
+        totals: dict[tuple[str, bool], int] = {}
+        for shard in self._shards:
+            for key, count in shard.counts(archived).items():
+                totals[key] = totals.get(key, 0) + count
+        return totals
+    
+    def archive_completed(self, max_age: float) -> int:
+        return sum(shard.archive_completed(max_age) for shard in self._shards)
+    
+    def set_sync(self, sync: str, sync_window_ms: int = 5, sync_interval_ms: int = 1000) -> None:
+        for shard in self._shards:
+            shard.set_sync(sync, sync_window_ms, sync_interval_ms)
+    
+    def close(self) -> None:
+        for shard in self._shards:
+            shard.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,156 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .models import Task
+
+
+# Формат (little-endian):
+#   заголовок: magic, число задач, next_id, число имён приоритетов, число корзин индекса
+#   имена приоритетов: u16 длина + utf-8
+#   колонки: ids q[n], done b[n], priorities H[n] (коды имён), смещения заголовков Q[n + 1]
+#   заголовки: один utf-8 блок, границы задаются смещениями
+#   корзины TaskIndex: u16 длина + приоритет, u8 isDone, u64 размер, ids q[размер]
+MAGIC = b'TASKSNP1'
+HEADER = struct.Struct('<8sQQHH')
+LENGTH = struct.Struct('<H')
+BUCKET = struct.Struct('<BQ')
+
+
+@dataclass
+class SnapshotColumns:
+    ids: array
+    done: array
+    priorities: array
+    priority_names: list[str]
+    title_offsets: array
+    titles: bytes | memoryview
+    next_id: int = 1
+    buckets: dict[tuple[str, bool], array] = field(default_factory=dict)
+
+
+def encode_titles(titles: Iterable[str]) -> tuple[array, bytes]:
+    encoded = [title.encode('utf-8') for title in titles]
+    offsets = array('Q', [0])
+    position = 0
+    for chunk in encoded:
+        position += len(chunk)
+        offsets.append(position)
+    return offsets, b''.join(encoded)
+
+
+def columns_from_tasks(tasks: Iterable[Task]) -> SnapshotColumns:
+    ids = array('q')
+    done = array('b')
+    priorities = array('H')
+    titles = []
+    codes: dict[str, int] = {}
+    for task in tasks:
+        ids.append(task.id)
+        done.append(int(task.isDone))
+        priorities.append(codes.setdefault(task.priority, len(codes)))
+        titles.append(task.title)
+    offsets, blob = encode_titles(titles)
+    return SnapshotColumns(ids, done, priorities, list(codes), offsets, blob)
+
+
+def iter_tasks(columns: SnapshotColumns) -> Iterator[Task]:
+    offsets = columns.title_offsets
+    blob = columns.titles
+    names = columns.priority_names
+    for row, task_id in enumerate(columns.ids):
+        yield Task(id=task_id, title=str(blob[offsets[row]:offsets[row + 1]], 'utf-8'),
+                   priority=names[columns.priorities[row]], isDone=bool(columns.done[row]))
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def write_snapshot(path: Path, columns: SnapshotColumns) -> int:
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(columns.ids), columns.next_id,
+                            len(columns.priority_names), len(columns.buckets)))
+        for name in columns.priority_names:
+            encoded = name.encode('utf-8')
+            f.write(LENGTH.pack(len(encoded)) + encoded)
+        for values in (columns.ids, columns.done, columns.priorities, columns.title_offsets):
+            _little_endian(values).tofile(f)
+        f.write(columns.titles)
+        for (priority, is_done), ids in columns.buckets.items():
+            encoded = priority.encode('utf-8')
+            f.write(LENGTH.pack(len(encoded)) + encoded + BUCKET.pack(int(is_done), len(ids)))
+            _little_endian(ids).tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+class _Reader:
+    
+    def __init__(self, view: memoryview):
+        self._view = view
+        self.position = 0
+    
+    def unpack(self, layout: struct.Struct) -> tuple:
+        if self.position + layout.size > len(self._view):
+            raise ValueError("Snapshot is truncated")
+        values = layout.unpack_from(self._view, self.position)
+        self.position += layout.size
+        return values
+    
+    def string(self) -> str:
+        length, = self.unpack(LENGTH)
+        return str(self.bytes(length), 'utf-8')
+    
+    def bytes(self, length: int) -> memoryview:
+        if self.position + length > len(self._view):
+            raise ValueError("Snapshot is truncated")
+        chunk = self._view[self.position:self.position + length]
+        self.position += length
+        return chunk
+    
+    def array(self, typecode: str, count: int) -> array:
+        values = array(typecode)
+        values.frombytes(self.bytes(count * values.itemsize))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+
+def read_snapshot(path: Path) -> SnapshotColumns:
+    # колонки копируются из mmap целиком (это memcpy), заголовки остаются в отображении
+    # и декодируются при обращении - загрузка не зависит от числа задач в Python-объектах
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    reader = _Reader(memoryview(mapped))
+    magic, count, next_id, name_count, bucket_count = reader.unpack(HEADER)
+    if magic != MAGIC:
+        raise ValueError(f"Not a task snapshot: {path}")
+    
+    priority_names = [reader.string() for _ in range(name_count)]
+    ids = reader.array('q', count)
+    done = reader.array('b', count)
+    priorities = reader.array('H', count)
+    title_offsets = reader.array('Q', count + 1)
+    titles = reader.bytes(title_offsets[-1])
+    
+    buckets = {}
+    for _ in range(bucket_count):
+        priority = reader.string()
+        is_done, size = reader.unpack(BUCKET)
+        buckets[(priority, bool(is_done))] = reader.array('q', size)
+    
+    return SnapshotColumns(ids, done, priorities, priority_names, title_offsets, titles,
+                           next_id, buckets)
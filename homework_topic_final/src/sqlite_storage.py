@@ -0,0 +1,348 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .metrics import STORAGE_SAVE_SECONDS
+from .models import Task
+from .search import allows_prefix, normalize, query_terms
+from .storage import FileTaskStorage, TaskStorage
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    isDone INTEGER NOT NULL DEFAULT 0,
+    doneAt REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (priority, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_done ON tasks (isDone, id);
+CREATE TABLE IF NOT EXISTS tasks_archive (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    isDone INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_archive_priority ON tasks_archive (priority, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_search USING fts5(
+    title, tokenize = 'unicode61 remove_diacritics 0', prefix = '2 3'
+);
+"""
+
+# sqlite3 кэширует подготовленные выражения по тексту запроса, поэтому все они заданы константами
+SELECT_VERSION = "SELECT value FROM meta WHERE key = 'version'"
+BUMP_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'version'"
+# id архивных задач тоже заняты, иначе после архивации последних задач они выдавались бы повторно
+SELECT_NEXT_ID = """
+SELECT MAX((SELECT COALESCE(MAX(id), 0) FROM tasks), (SELECT COALESCE(MAX(id), 0) FROM tasks_archive)) + 1
+"""
+INSERT_TASK = "INSERT INTO tasks (id, title, priority, isDone) VALUES (?, ?, ?, ?)"
+IMPORT_TASK = "INSERT OR IGNORE INTO tasks (id, title, priority, isDone) VALUES (?, ?, ?, ?)"
+IMPORT_ARCHIVED = "INSERT OR IGNORE INTO tasks_archive (id, title, priority, isDone) VALUES (?, ?, ?, ?)"
+COMPLETE_TASK = "UPDATE tasks SET isDone = 1, doneAt = ? WHERE id = ? AND isDone = 0"
+# время выполнения задач из баз до архивации неизвестно, отсчёт для них идёт от запуска
+STAMP_DONE = "UPDATE tasks SET doneAt = ? WHERE isDone = 1 AND doneAt IS NULL"
+SELECT_EXPIRED = "SELECT id FROM tasks WHERE isDone = 1 AND doneAt < ? ORDER BY id LIMIT ?"
+ARCHIVE_TASK = """
+INSERT INTO tasks_archive (id, title, priority, isDone)
+SELECT id, title, priority, isDone FROM tasks WHERE id = ?
+"""
+DELETE_TASK = "DELETE FROM tasks WHERE id = ?"
+DELETE_SEARCH = "DELETE FROM tasks_search WHERE rowid = ?"
+SELECT_TASK = "SELECT id, title, priority, isDone FROM tasks WHERE id = ?"
+SELECT_ALL = "SELECT id, title, priority, isDone FROM tasks ORDER BY id"
+SELECT_COUNTS = "SELECT priority, isDone, COUNT(*) FROM tasks GROUP BY priority, isDone"
+SELECT_ARCHIVED_COUNTS = "SELECT priority, isDone, COUNT(*) FROM tasks_archive GROUP BY priority, isDone"
+# в FTS5 лежит заголовок, нормализованный так же, как в TitleIndex: иначе ё и е различались бы
+INSERT_SEARCH = "INSERT INTO tasks_search (rowid, title) VALUES (?, ?)"
+SEARCH_TASKS = """
+SELECT tasks.id, tasks.title, tasks.priority, tasks.isDone, -bm25(tasks_search)
+FROM tasks_search JOIN tasks ON tasks.id = tasks_search.rowid
+WHERE tasks_search MATCH ?
+ORDER BY bm25(tasks_search), tasks.id
+LIMIT ?
+"""
+SELECT_SEARCH_INDEXED = "SELECT value FROM meta WHERE key = 'search_indexed'"
+MARK_SEARCH_INDEXED = "INSERT OR REPLACE INTO meta (key, value) VALUES ('search_indexed', 1)"
+SELECT_MIGRATED = "SELECT value FROM meta WHERE key = 'migrated'"
+MARK_MIGRATED = "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', 1)"
+
+# ограничение SQLite на число параметров в одном запросе
+MAX_VARIABLES = 900
+# столько задач архивируется в одной транзакции
+ARCHIVE_BATCH = 50000
+
+
+class SQLiteTaskStorage(TaskStorage):
+    
+    def __init__(self, db_path: Path, sync: str = TaskStorage.SYNC_ALWAYS,
+                 import_from: Optional[Path] = None):
+        self._db_path = db_path
+        # WAL с synchronous=NORMAL не теряет целостность, а fsync делается только на checkpoint
+        self._synchronous = "FULL" if sync == self.SYNC_ALWAYS else "NORMAL"
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        db = self._connection()
+        db.execute("PRAGMA journal_mode = WAL")
+        self._add_done_at()
+        db.executescript(SCHEMA)
+        
+        if import_from is not None:
+            self._migrate(import_from)
+        self._index_search()
+        db.execute(STAMP_DONE, (time.time(),))
+        
+        count = db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        print(f"✓ Загружено {count} задач из {self._db_path}")
+    
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self._db_path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA busy_timeout = 5000")
+            self._local.db = db
+            with self._connections_lock:
+                self._connections.append(db)
+        # режим мог смениться перезагрузкой конфигурации; соединение меняет его в своём потоке
+        if getattr(self._local, 'synchronous', None) != self._synchronous:
+            self._local.synchronous = self._synchronous
+            db.execute(f"PRAGMA synchronous = {self._synchronous}")
+        return db
+    
+    def set_sync(self, sync: str, sync_window_ms: int = 5, sync_interval_ms: int = 1000) -> None:
+        self._synchronous = "FULL" if sync == self.SYNC_ALWAYS else "NORMAL"
+    
+    def _add_done_at(self) -> None:
+        # базы, созданные до архивации, получают колонку времени выполнения
+        db = self._connection()
+        columns = [row[1] for row in db.execute("PRAGMA table_info(tasks)")]
+        if columns and 'doneAt' not in columns:
+            db.execute("ALTER TABLE tasks ADD COLUMN doneAt REAL")
+    
+    def _migrate(self, file_path: Path) -> None:
+        db = self._connection()
+        if db.execute(SELECT_MIGRATED).fetchone() is not None:
+            return
+        
+        log_path = file_path.with_suffix('.log')
+        if file_path.exists() or log_path.exists():
+            mode = FileTaskStorage.MODE_LOG if log_path.exists() else FileTaskStorage.MODE_JSON
+            source = FileTaskStorage(file_path, mode=mode)
+            tasks = source.get_all()
+            archived, _ = source.query(archived=True)
+            source.close()
+        else:
+            tasks, archived = [], []
+        
+        with self._write_lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(IMPORT_TASK, [
+                    (task.id, task.title, task.priority, int(task.isDone)) for task in tasks
+                ])
+                db.executemany(IMPORT_ARCHIVED, [
+                    (task.id, task.title, task.priority, int(task.isDone)) for task in archived
+                ])
+                db.execute(MARK_MIGRATED)
+                db.execute(BUMP_VERSION)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        
+        if tasks:
+            print(f"✓ Перенесено {len(tasks)} задач из {file_path} в {self._db_path}")
+    
+    def _index_search(self) -> None:
+        # базы, созданные до появления поиска, индексируются один раз
+        db = self._connection()
+        if db.execute(SELECT_SEARCH_INDEXED).fetchone() is not None:
+            return
+        with self._write_lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM tasks_search")
+                db.executemany(INSERT_SEARCH, (
+                    (task_id, normalize(title))
+                    for task_id, title in db.execute("SELECT id, title FROM tasks").fetchall()
+                ))
+                db.execute(MARK_SEARCH_INDEXED)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+    
+    def _commit(self, db: sqlite3.Connection) -> None:
+        # на COMMIT приходится запись в WAL и fsync, его и считаем временем сохранения
+        started = time.perf_counter()
+        db.execute("COMMIT")
+        STORAGE_SAVE_SECONDS.observe(time.perf_counter() - started)
+    
+    def _row_to_task(self, row: tuple) -> Task:
+        return Task(id=row[0], title=row[1], priority=row[2], isDone=bool(row[3]))
+    
+    @property
+    def version(self) -> int:
+        return self._connection().execute(SELECT_VERSION).fetchone()[0]
+    
+    def create_many(self, items: list[tuple[str, str]]) -> list[Task]:
+        if not items:
+            return []
+        items = [(title, self._normalize_priority(priority)) for title, priority in items]
+        
+        db = self._connection()
+        with self._write_lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                next_id = db.execute(SELECT_NEXT_ID).fetchone()[0]
+                tasks = [
+                    Task(id=next_id + offset, title=title, priority=priority, isDone=False)
+                    for offset, (title, priority) in enumerate(items)
+                ]
+                db.executemany(INSERT_TASK, [
+                    (task.id, task.title, task.priority, 0) for task in tasks
+                ])
+                db.executemany(INSERT_SEARCH, [(task.id, normalize(task.title)) for task in tasks])
+                db.execute(BUMP_VERSION)
+                self._commit(db)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            self._publish([{"op": "create", **task.to_dict()} for task in tasks])
+        return tasks
+    
+    def complete_many(self, task_ids: list[int]) -> list[bool]:
+        if not task_ids:
+            return []
+        
+        db = self._connection()
+        with self._write_lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                existing = set()
+                pending = []
+                for start in range(0, len(task_ids), MAX_VARIABLES):
+                    chunk = task_ids[start:start + MAX_VARIABLES]
+                    placeholders = ','.join('?' * len(chunk))
+                    sql = f"SELECT id, isDone FROM tasks WHERE id IN ({placeholders})"
+                    for task_id, is_done in db.execute(sql, chunk):
+                        if not is_done and task_id not in existing:
+                            pending.append(task_id)
+                        existing.add(task_id)
+                
+                # задача из архива уже выполнена: повторное выполнение не ошибка
+                missing = [task_id for task_id in dict.fromkeys(task_ids) if task_id not in existing]
+                for start in range(0, len(missing), MAX_VARIABLES):
+                    chunk = missing[start:start + MAX_VARIABLES]
+                    placeholders = ','.join('?' * len(chunk))
+                    sql = f"SELECT id FROM tasks_archive WHERE id IN ({placeholders})"
+                    existing.update(task_id for task_id, in db.execute(sql, chunk))
+                
+                if pending:
+                    done_at = time.time()
+                    db.executemany(COMPLETE_TASK, [(done_at, task_id) for task_id in pending])
+                    db.execute(BUMP_VERSION)
+                self._commit(db)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            self._publish([{"op": "complete", "id": task_id} for task_id in pending])
+        return [task_id in existing for task_id in task_ids]
+    
+    def get_all(self) -> list[Task]:
+        return [self._row_to_task(row) for row in self._connection().execute(SELECT_ALL)]
+    
+    def query(self, priority: Optional[str] = None, is_done: Optional[bool] = None,
+              cursor: Optional[int] = None, limit: Optional[int] = None,
+              descending: bool = False, archived: bool = False) -> tuple[list[Task], Optional[int]]:
+        conditions = []
+        params = []
+        if priority is not None:
+            conditions.append("priority = ?")
+            params.append(priority)
+        if is_done is not None:
+            conditions.append("isDone = ?")
+            params.append(int(is_done))
+        if cursor is not None:
+            conditions.append("id < ?" if descending else "id > ?")
+            params.append(cursor)
+        
+        sql = "SELECT id, title, priority, isDone FROM " + ("tasks_archive" if archived else "tasks")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id DESC" if descending else " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        
+        tasks = [self._row_to_task(row) for row in self._connection().execute(sql, params)]
+        next_cursor = None
+        if limit is not None and len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = tasks[-1].id
+        return tasks, next_cursor
+    
+    def get_by_id(self, task_id: int) -> Optional[Task]:
+        row = self._connection().execute(SELECT_TASK, (task_id,)).fetchone()
+        return None if row is None else self._row_to_task(row)
+    
+    def counts(self, archived: bool = False) -> dict[tuple[str, bool], int]:
+        return {
+            (priority, bool(is_done)): count
+            for priority, is_done, count in self._connection().execute(
+                SELECT_ARCHIVED_COUNTS if archived else SELECT_COUNTS)
+        }
+    
+    def archive_completed(self, max_age: float) -> int:
+        # архив - отдельная таблица: строки уходят из tasks и её индексов целиком
+        cutoff = time.time() - max_age
+        db = self._connection()
+        archived = 0
+        while True:
+            with self._write_lock:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    task_ids = [row[0] for row in db.execute(SELECT_EXPIRED, (cutoff, ARCHIVE_BATCH))]
+                    if task_ids:
+                        params = [(task_id,) for task_id in task_ids]
+                        db.executemany(ARCHIVE_TASK, params)
+                        db.executemany(DELETE_TASK, params)
+                        db.executemany(DELETE_SEARCH, params)
+                        db.execute(BUMP_VERSION)
+                    self._commit(db)
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+                self._publish([{"op": "archive", "id": task_id} for task_id in task_ids])
+            archived += len(task_ids)
+            if len(task_ids) < ARCHIVE_BATCH:
+                return archived
+    
+    def search_ranked(self, query: str, count: int) -> list[tuple[float, Task]]:
+        terms = query_terms(query)
+        if not terms or count <= 0:
+            return []
+        # каждое слово в кавычках: символы запроса не разбираются как синтаксис FTS5;
+        # целое слово - отдельная фраза в OR, чтобы bm25 ставил его выше совпадения по префиксу
+        match = ' AND '.join(f'("{term}" OR "{term}"*)' if allows_prefix(term) else f'"{term}"'
+                             for term in terms)
+        rows = self._connection().execute(SEARCH_TASKS, (match, count))
+        return [(row[4], self._row_to_task(row)) for row in rows]
+    
+    def close(self) -> None:
+        with self._connections_lock:
+            for db in self._connections:
+                db.close()
+            self._connections.clear()
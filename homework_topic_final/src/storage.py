@@ -1,68 +1,637 @@
-import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import BrokenExecutor, Executor
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
+from . import codec, snapshot
+from .archive import TaskArchive
+from .changes import ChangeFeed
+from .config import StorageConfig
+from .indexes import TaskIndex
+from .locks import ReadWriteLock
+from .metrics import STORAGE_BYTES_WRITTEN, STORAGE_SAVE_SECONDS
 from .models import Task, Priority
+from .search import SearchIndexNotReady, TitleIndex
+from .table import TaskTable
+from .wal import TaskLog
 
 
-class TaskStorage:
+class TaskStorage(ABC):
     
-    def __init__(self, file_path: Path):
+    BACKEND_FILE = "file"
+    BACKEND_SQLITE = "sqlite"
+    
+    SYNC_ALWAYS = "always"
+    SYNC_BATCH = "batch"
+    SYNC_INTERVAL = "interval"
+    
+    # лента изменений для /tasks/changes; мутации публикуются под блокировкой записи,
+    # поэтому создание задачи всегда попадает в ленту раньше её выполнения
+    changes: Optional[ChangeFeed] = None
+    
+    @property
+    @abstractmethod
+    def version(self) -> int:
+        ...
+    
+    @abstractmethod
+    def create_many(self, items: list[tuple[str, str]]) -> list[Task]:
+        ...
+    
+    @abstractmethod
+    def complete_many(self, task_ids: list[int]) -> list[bool]:
+        ...
+    
+    @abstractmethod
+    def get_all(self) -> list[Task]:
+        ...
+    
+    @abstractmethod
+    def query(self, priority: Optional[str] = None, is_done: Optional[bool] = None,
+              cursor: Optional[int] = None, limit: Optional[int] = None,
+              descending: bool = False, archived: bool = False) -> tuple[list[Task], Optional[int]]:
+        ...
+    
+    @abstractmethod
+    def get_by_id(self, task_id: int) -> Optional[Task]:
+        ...
+    
+    @abstractmethod
+    def counts(self, archived: bool = False) -> dict[tuple[str, bool], int]:
+        ...
+    
+    @abstractmethod
+    def archive_completed(self, max_age: float) -> int:
+        # переносит в архив задачи, выполненные больше max_age секунд назад; возвращает их число
+        ...
+    
+    @abstractmethod
+    def search_ranked(self, query: str, count: int) -> list[tuple[float, Task]]:
+        ...
+    
+    def close(self) -> None:
+        pass
+    
+    def set_sync(self, sync: str, sync_window_ms: int = 5, sync_interval_ms: int = 1000) -> None:
+        pass
+    
+    def create(self, title: str, priority: str) -> Task:
+        return self.create_many([(title, priority)])[0]
+    
+    def complete(self, task_id: int) -> bool:
+        return self.complete_many([task_id])[0]
+    
+    def search(self, query: str, cursor: Optional[int] = None,
+               limit: int = 20) -> tuple[list[Task], Optional[int]]:
+        # порядок задаёт релевантность, а не id, поэтому курсор - позиция в выдаче
+        offset = cursor or 0
+        ranked = self.search_ranked(query, offset + limit + 1)
+        tasks = [task for _, task in ranked[offset:offset + limit]]
+        return tasks, offset + limit if len(ranked) > offset + limit else None
+    
+    def _publish(self, records: list[dict]) -> None:
+        if self.changes is not None:
+            self.changes.publish(records)
+    
+    def _normalize_priority(self, priority: str) -> str:
+        if priority not in [p.value for p in Priority]:
+            return Priority.NORMAL.value
+        return priority
+
+
+class FileTaskStorage(TaskStorage):
+    
+    MODE_JSON = "json"
+    MODE_LOG = "log"
+    
+    LAYOUT_OBJECTS = "objects"
+    LAYOUT_COLUMNAR = "columnar"
+    
+    SNAPSHOT_JSON = "json"
+    SNAPSHOT_BINARY = "binary"
+    # столько заголовков поисковый индекс читает за один захват блокировки
+    SEARCH_BUILD_CHUNK = 10000
+    # столько задач архивируется за один захват блокировки записи
+    ARCHIVE_BATCH = 50000
+    
+    def __init__(self, file_path: Path, mode: str = MODE_JSON,
+                 compact_threshold: int = 1024 * 1024,
+                 sync: str = TaskStorage.SYNC_ALWAYS, sync_window_ms: int = 5,
+                 sync_interval_ms: int = 1000, layout: str = LAYOUT_OBJECTS,
+                 streaming_load: bool = False, snapshot_format: str = SNAPSHOT_JSON,
+                 snapshot_executor: Optional[Executor] = None):
+        self._check_sync(sync)
+        if layout not in (self.LAYOUT_OBJECTS, self.LAYOUT_COLUMNAR):
+            raise ValueError(f"Unknown storage layout: {layout}")
+        if snapshot_format not in (self.SNAPSHOT_JSON, self.SNAPSHOT_BINARY):
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+        
         self._file_path = file_path
-        self._tasks: dict[int, Task] = {}
+        self._binary_path = file_path.with_suffix('.bin')
+        self._snapshot_format = snapshot_format
+        self._snapshot_executor = snapshot_executor
+        self._tasks: dict[int, Task] | TaskTable = TaskTable() if layout == self.LAYOUT_COLUMNAR else {}
+        self._index = TaskIndex()
         self._next_id = 1
+        self._version = 0
+        self._lock = ReadWriteLock()
+        self._log: Optional[TaskLog] = None
+        self._compact_threshold = compact_threshold
+        self._compacting = False
+        self._streaming_load = streaming_load
+        self._archive = TaskArchive(file_path.with_suffix('.archive'))
+        self._archive_lock = threading.Lock()
+        
+        self._sync = sync
+        self._sync_window = sync_window_ms / 1000
+        self._sync_interval = sync_interval_ms / 1000
+        # _dirty_seq растёт с каждой мутацией под блокировкой записи,
+        # _flushed_seq - номер последней мутации, уже записанной на диск
+        self._pending: list[dict] = []
+        self._dirty_seq = 0
+        self._flushed_seq = 0
+        self._flush_lock = threading.Lock()
+        self._flush_cond = threading.Condition()
+        self._closed = threading.Event()
+        
         self._ensure_directory()
-        self._load()
+        indexed = self._load()
+        
+        if mode == self.MODE_LOG:
+            self._log = TaskLog(self._file_path.with_suffix('.log'))
+            for record in self._log.replay():
+                self._apply(record, indexed)
+            self._maybe_compact()
+        
+        if not indexed:
+            self._index.rebuild(self._tasks.values())
+        self._next_id = max(self._next_id, self._archive.max_id + 1)
+        
+        # (время выполнения, id) в порядке выполнения; время выполнения не сохраняется,
+        # поэтому выполненные до запуска считаются выполненными в момент загрузки
+        self._completed: deque[tuple[float, array]] = deque()
+        done = self._index.page(is_done=True)
+        if done:
+            self._completed.append((time.time(), array('q', done)))
+        
+        self._search = TitleIndex()
+        self._search_ready = threading.Event()
+        self._start_search_build()
+        
+        self._flusher: Optional[threading.Thread] = None
+        if sync != self.SYNC_ALWAYS:
+            self._start_flusher()
+    
+    def _start_search_build(self) -> None:
+        # индекс строится в фоне: бинарный снимок на миллион задач грузится за доли секунды,
+        # а токенизация всех заголовков заняла бы секунды; до готовности поиск отвечает 503
+        ids = array('q', self._index.ids)
+        threading.Thread(target=self._build_search, args=(ids,), name="task-search-index",
+                         daemon=True).start()
+    
+    def _build_search(self, ids: array) -> None:
+        index = TitleIndex()
+        for start in range(0, len(ids), self.SEARCH_BUILD_CHUNK):
+            if self._closed.is_set():
+                return
+            with self._lock.read():
+                # задачу могли перенести в архив, пока индекс строился
+                titles = [(task_id, self._tasks[task_id].title)
+                          for task_id in ids[start:start + self.SEARCH_BUILD_CHUNK]
+                          if task_id in self._tasks]
+            index.extend(titles)
+        
+        with self._lock.write():
+            # задачи, созданные во время построения; create_many их пропускал
+            last = ids[-1] if ids else 0
+            created = self._index.ids[bisect_right(self._index.ids, last):]
+            index.extend((task_id, self._tasks[task_id].title) for task_id in created)
+            self._search = index
+            self._search_ready.set()
+    
+    def _check_sync(self, sync: str) -> None:
+        if sync not in (self.SYNC_ALWAYS, self.SYNC_BATCH, self.SYNC_INTERVAL):
+            raise ValueError(f"Unknown storage sync mode: {sync}")
+    
+    def _start_flusher(self) -> None:
+        self._flusher = threading.Thread(target=self._run_flusher, name="task-storage-flusher",
+                                         daemon=True)
+        self._flusher.start()
+    
+    def set_sync(self, sync: str, sync_window_ms: int = 5, sync_interval_ms: int = 1000) -> None:
+        self._check_sync(sync)
+        with self._flush_cond:
+            self._sync = sync
+            self._sync_window = sync_window_ms / 1000
+            self._sync_interval = sync_interval_ms / 1000
+            # ждущие в режиме batch перепроверят режим, старый поток записи завершится сам
+            self._flush_cond.notify_all()
+            if sync != self.SYNC_ALWAYS and self._flusher is None:
+                self._start_flusher()
+        if sync == self.SYNC_ALWAYS:
+            # накопленное в отложенном режиме сразу на диск, дальше пишет каждый запрос
+            self._save()
     
     def _ensure_directory(self) -> None:
         self._file_path.parent.mkdir(parents=True, exist_ok=True)
     
-    def _load(self) -> None:
-        if not self._file_path.exists():
-            return
+    def _load(self) -> bool:
+        # грузим более свежий из снимков: формат могли сменить, а журнал продолжает последний
+        snapshots = [path for path in (self._file_path, self._binary_path) if path.exists()]
+        if not snapshots:
+            return False
+        if max(snapshots, key=lambda path: path.stat().st_mtime_ns) == self._binary_path:
+            return self._load_binary()
         
         try:
-            with open(self._file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                for task_data in data:
-                    task = Task.from_dict(task_data)
-                    self._tasks[task.id] = task
-                    if task.id >= self._next_id:
-                        self._next_id = task.id + 1
+            if self._streaming_load:
+                with open(self._file_path, 'r', encoding='utf-8') as f:
+                    self._load_records(codec.iter_array(f))
+            else:
+                with open(self._file_path, 'rb') as f:
+                    self._load_records(codec.loads(f.read()))
             print(f"✓ Загружено {len(self._tasks)} задач из {self._file_path}")
-        except (json.JSONDecodeError, KeyError) as e:
+        except (codec.DecodeError, UnicodeDecodeError, KeyError) as e:
             print(f"✗ Ошибка загрузки задач: {e}")
+        return False
     
-    def _save(self) -> None:
-        data = [task.to_dict() for task in self._tasks.values()]
-        with open(self._file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    def create(self, title: str, priority: str) -> Task:
-        if priority not in [p.value for p in Priority]:
-            priority = Priority.NORMAL.value
+    def _load_binary(self) -> bool:
+        try:
+            columns = snapshot.read_snapshot(self._binary_path)
+        except (OSError, ValueError) as e:
+            print(f"✗ Ошибка загрузки задач: {e}")
+            return False
         
-        task = Task(
-            id=self._next_id,
-            title=title,
-            priority=priority,
-            isDone=False
-        )
-        self._tasks[task.id] = task
-        self._next_id += 1
+        if isinstance(self._tasks, TaskTable):
+            self._tasks = TaskTable.from_snapshot(columns)
+        else:
+            self._tasks = {task.id: task for task in snapshot.iter_tasks(columns)}
+        self._index.load(columns.ids, columns.buckets)
+        self._next_id = columns.next_id
+        print(f"✓ Загружено {len(self._tasks)} задач из {self._binary_path}")
+        return True
+    
+    def _load_records(self, records: Iterable[dict]) -> None:
+        for task_data in records:
+            task = Task.from_dict(task_data)
+            self._tasks[task.id] = task
+            if task.id >= self._next_id:
+                self._next_id = task.id + 1
+    
+    def _apply(self, record: dict, update_index: bool = False) -> None:
+        op = record.get('op')
+        if op == 'create':
+            task = Task.from_dict(record)
+            # задача уже есть в снимке: запись журнала старше его
+            if task.id in self._tasks:
+                return
+            self._tasks[task.id] = task
+            if task.id >= self._next_id:
+                self._next_id = task.id + 1
+            if update_index:
+                self._index.add(task)
+        elif op == 'complete':
+            task = self._tasks.get(record.get('id'))
+            if task is not None and not task.isDone:
+                task.isDone = True
+                if update_index:
+                    self._index.mark_done(task)
+        elif op == 'archive':
+            self._discard(record.get('ids', []), update_index)
+    
+    def _discard(self, task_ids: list[int], update_index: bool) -> None:
+        if isinstance(self._tasks, TaskTable):
+            self._tasks.discard_many(task_ids)
+        else:
+            for task_id in task_ids:
+                self._tasks.pop(task_id, None)
+        if update_index:
+            self._index.discard_many(task_ids)
+    
+    def _task_dicts(self) -> list[dict]:
+        if isinstance(self._tasks, TaskTable):
+            return self._tasks.to_dicts()
+        return [task.to_dict() for task in self._tasks.values()]
+    
+    def _capture(self) -> list[dict] | snapshot.SnapshotColumns:
+        # вызывается под блокировкой чтения, запись на диск уже без неё
+        if self._snapshot_format == self.SNAPSHOT_JSON:
+            return self._task_dicts()
+        if isinstance(self._tasks, TaskTable):
+            columns = self._tasks.snapshot_columns()
+        else:
+            columns = snapshot.columns_from_tasks(self._tasks[task_id] for task_id in self._index.ids)
+        columns.next_id = self._next_id
+        columns.buckets = self._index.export()
+        return columns
+    
+    def _write_snapshot(self, data: list[dict] | snapshot.SnapshotColumns) -> None:
+        if self._snapshot_executor is None:
+            written = write_snapshot_file(self._file_path, data)
+        else:
+            # кодирование снимка в другом процессе не держит GIL сервера
+            try:
+                written = self._snapshot_executor.submit(write_snapshot_file, self._file_path,
+                                                         data).result()
+            except BrokenExecutor:
+                # пул процессов упал: пишем здесь, чтобы не потерять мутации
+                written = write_snapshot_file(self._file_path, data)
+        STORAGE_BYTES_WRITTEN.inc('snapshot', amount=written)
+    
+    def _stage(self, records: list[dict]) -> int:
+        # вызывается под блокировкой записи, сама запись на диск идёт уже без неё
+        if self._log is not None:
+            self._pending.extend(records)
+        self._dirty_seq += 1
+        return self._dirty_seq
+    
+    def _commit(self, ticket: int) -> None:
+        if self._sync == self.SYNC_BATCH:
+            with self._flush_cond:
+                self._flush_cond.notify_all()
+                # режим могли сменить перезагрузкой конфигурации, пока запрос ждал
+                while self._flushed_seq < ticket and self._sync == self.SYNC_BATCH:
+                    self._flush_cond.wait()
+        if self._sync == self.SYNC_ALWAYS:
+            self._save(ticket)
+    
+    def _save(self, ticket: Optional[int] = None) -> None:
+        with self._flush_lock:
+            # соседний запрос мог уже записать и нашу мутацию
+            if ticket is not None and self._flushed_seq >= ticket:
+                return
+            with self._lock.read():
+                seq = self._dirty_seq
+                if seq == self._flushed_seq:
+                    return
+                records, self._pending = self._pending, []
+                data = None if self._log is not None else self._capture()
+            
+            started = time.perf_counter()
+            if self._log is not None:
+                # fsync в любом режиме: режимы различаются только тем, когда запрос получает ответ
+                STORAGE_BYTES_WRITTEN.inc('log', amount=self._log.append(records, fsync=True))
+                self._maybe_compact()
+            else:
+                self._write_snapshot(data)
+            STORAGE_SAVE_SECONDS.observe(time.perf_counter() - started)
+            
+            with self._flush_cond:
+                self._flushed_seq = seq
+                self._flush_cond.notify_all()
+    
+    def _run_flusher(self) -> None:
+        while self._flushing():
+            if self._sync == self.SYNC_BATCH:
+                with self._flush_cond:
+                    while (self._dirty_seq == self._flushed_seq and not self._closed.is_set()
+                           and self._sync == self.SYNC_BATCH):
+                        self._flush_cond.wait()
+                # небольшое окно, чтобы одна запись на диск покрыла все соседние запросы
+                time.sleep(self._sync_window)
+            else:
+                self._closed.wait(self._sync_interval)
+            try:
+                self._save()
+            except OSError as e:
+                print(f"✗ Ошибка записи задач: {e}")
+    
+    def _flushing(self) -> bool:
+        # решение о выходе под той же блокировкой, под которой set_sync запускает новый поток
+        with self._flush_cond:
+            if self._closed.is_set() or self._sync == self.SYNC_ALWAYS:
+                self._flusher = None
+                return False
+            return True
+    
+    def close(self) -> None:
+        self._closed.set()
+        with self._flush_cond:
+            self._flush_cond.notify_all()
+            flusher = self._flusher
+        if flusher is not None:
+            flusher.join()
         self._save()
-        return task
+    
+    def _maybe_compact(self) -> None:
+        if self._compacting or self._log.size < self._compact_threshold:
+            return
+        self._compacting = True
+        threading.Thread(target=self._compact, name="task-log-compaction", daemon=True).start()
+    
+    def _compact(self) -> None:
+        try:
+            # чтение исключает мутации, но не мешает GET-запросам;
+            # _flush_lock не даёт дописывать журнал во время ротации
+            with self._flush_lock, self._lock.read():
+                self._log.rotate()
+                data = self._capture()
+            self._write_snapshot(data)
+            self._log.discard_rotated()
+        except OSError as e:
+            print(f"✗ Ошибка сжатия журнала: {e}")
+        finally:
+            self._compacting = False
+    
+    def create_many(self, items: list[tuple[str, str]]) -> list[Task]:
+        if not items:
+            return []
+        items = [(title, self._normalize_priority(priority)) for title, priority in items]
+        
+        with self._lock.write():
+            tasks = [
+                Task(
+                    id=task_id,
+                    title=title,
+                    priority=priority,
+                    isDone=False
+                )
+                for task_id, (title, priority) in zip(self._allocate_ids(len(items)), items)
+            ]
+            # поисковый индекс первым: если он упадёт, задачи не окажутся в памяти без записи на диск
+            if self._search_ready.is_set():
+                self._search.extend((task.id, task.title) for task in tasks)
+            for task in tasks:
+                self._tasks[task.id] = task
+                self._index.add(task)
+            self._version += 1
+            records = [{"op": "create", **task.to_dict()} for task in tasks]
+            ticket = self._stage(records)
+            self._publish(records)
+        self._commit(ticket)
+        return tasks
+    
+    def _allocate_ids(self, count: int) -> range:
+        ids = range(self._next_id, self._next_id + count)
+        self._next_id += count
+        return ids
+    
+    @property
+    def version(self) -> int:
+        return self._version
     
     def get_all(self) -> list[Task]:
-        return list(self._tasks.values())
+        with self._lock.read():
+            return self._detach(self._tasks.values())
+    
+    def _detach(self, tasks: Iterable) -> list[Task]:
+        # вызывается под блокировкой чтения: строка колоночной таблицы читает данные при обращении,
+        # а ответ кодируется уже без блокировки, когда архиватор мог удалить строку
+        if isinstance(self._tasks, TaskTable):
+            return [Task.from_dict(task.to_dict()) for task in tasks]
+        return list(tasks)
+    
+    def query(self, priority: Optional[str] = None, is_done: Optional[bool] = None,
+              cursor: Optional[int] = None, limit: Optional[int] = None,
+              descending: bool = False, archived: bool = False) -> tuple[list[Task], Optional[int]]:
+        if archived:
+            return self._archive.query(priority, is_done, cursor, limit, descending)
+        with self._lock.read():
+            fetch = None if limit is None else limit + 1
+            ids = self._index.page(priority, is_done, cursor, fetch, descending)
+            next_cursor = None
+            if limit is not None and len(ids) > limit:
+                ids = ids[:limit]
+                next_cursor = ids[-1]
+            return self._detach(self._tasks[task_id] for task_id in ids), next_cursor
     
     def get_by_id(self, task_id: int) -> Optional[Task]:
-        return self._tasks.get(task_id)
+        with self._lock.read():
+            task = self._tasks.get(task_id)
+            return None if task is None else self._detach([task])[0]
     
-    def complete(self, task_id: int) -> bool:
-        task = self._tasks.get(task_id)
-        if task is None:
-            return False
-        task.isDone = True
-        self._save()
-        return True
+    def counts(self, archived: bool = False) -> dict[tuple[str, bool], int]:
+        if archived:
+            return self._archive.counts()
+        with self._lock.read():
+            return self._index.counts()
+    
+    def search_ranked(self, query: str, count: int) -> list[tuple[float, Task]]:
+        if not self._search_ready.is_set():
+            raise SearchIndexNotReady("Search index is still being built")
+        with self._lock.read():
+            # индекс, достроенный в фоне, может помнить задачи, уже перенесённые в архив
+            ranked = [(score, task_id) for score, task_id in self._search.search(query, count)
+                      if task_id in self._tasks]
+            tasks = self._detach(self._tasks[task_id] for _, task_id in ranked)
+            return [(score, task) for (score, _), task in zip(ranked, tasks)]
+    
+    def complete_many(self, task_ids: list[int]) -> list[bool]:
+        results = []
+        records = []
+        
+        with self._lock.write():
+            for task_id in task_ids:
+                task = self._tasks.get(task_id)
+                results.append(task is not None)
+                if task is None or task.isDone:
+                    continue
+                task.isDone = True
+                self._index.mark_done(task)
+                records.append({"op": "complete", "id": task_id})
+            ticket = None
+            if records:
+                self._completed.append((time.time(), array('q', (record["id"] for record in records))))
+                self._version += 1
+                ticket = self._stage(records)
+                self._publish(records)
+        if ticket is not None:
+            self._commit(ticket)
+        # задача из архива уже выполнена: повторное выполнение не ошибка
+        return [found or self._archive.contains(task_id) for task_id, found in zip(task_ids, results)]
+    
+    def archive_completed(self, max_age: float) -> int:
+        cutoff = time.time() - max_age
+        archived = 0
+        with self._archive_lock:
+            while not self._closed.is_set():
+                with self._lock.read():
+                    task_ids = self._expired(cutoff)
+                    records = [self._tasks[task_id].to_dict() for task_id in task_ids]
+                if not records:
+                    break
+                
+                # сегмент на диске раньше, чем задачи уйдут из рабочего набора: сбой между
+                # шагами оставит задачу в обоих местах, но не потеряет её
+                self._archive.append(records)
+                with self._lock.write():
+                    self._discard(task_ids, update_index=True)
+                    if self._search_ready.is_set():
+                        self._search.discard((record["id"], record["title"]) for record in records)
+                    self._release_expired(len(task_ids))
+                    self._version += 1
+                    ticket = self._stage([{"op": "archive", "ids": task_ids}])
+                    self._publish([{"op": "archive", "id": task_id} for task_id in task_ids])
+                self._commit(ticket)
+                archived += len(task_ids)
+        return archived
+    
+    def _expired(self, cutoff: float) -> list[int]:
+        # вызывается под блокировкой чтения; берёт самые давние, не больше ARCHIVE_BATCH
+        expired = []
+        for completed_at, task_ids in self._completed:
+            if completed_at >= cutoff or len(expired) >= self.ARCHIVE_BATCH:
+                break
+            expired.extend(task_ids[:self.ARCHIVE_BATCH - len(expired)])
+        return sorted(expired)
+    
+    def _release_expired(self, count: int) -> None:
+        # _expired брал с начала очереди, столько же с начала и снимаем
+        while count:
+            completed_at, task_ids = self._completed[0]
+            if len(task_ids) <= count:
+                self._completed.popleft()
+                count -= len(task_ids)
+            else:
+                self._completed[0] = (completed_at, task_ids[count:])
+                count = 0
+
+
+def write_snapshot_file(file_path: Path, data: list[dict] | snapshot.SnapshotColumns) -> int:
+    # функция модуля, а не метод: её можно отправить в пул процессов
+    if isinstance(data, snapshot.SnapshotColumns):
+        return snapshot.write_snapshot(file_path.with_suffix('.bin'), data)
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    encoded = codec.dumps(data, indent=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(encoded)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+    return len(encoded)
+
+
+def open_storage(config: StorageConfig, base_dir: Path) -> TaskStorage:
+    if config.backend == TaskStorage.BACKEND_SQLITE:
+        from .sqlite_storage import SQLiteTaskStorage
+        return SQLiteTaskStorage(
+            base_dir / config.database,
+            sync=config.sync,
+            import_from=base_dir / config.file
+        )
+    if config.backend == TaskStorage.BACKEND_FILE and config.shards > 1:
+        from .sharding import ShardedTaskStorage
+        return ShardedTaskStorage(base_dir / config.file, config)
+    if config.backend == TaskStorage.BACKEND_FILE:
+        from .sharding import layout_path
+        if layout_path(base_dir / config.file).exists():
+            # задачи лежат в шардах, основной файл без них показал бы пустое или старое хранилище
+            raise ValueError(f"{base_dir / config.file} is sharded; set storage.shards to match")
+        return FileTaskStorage(
+            base_dir / config.file,
+            mode=config.mode,
+            compact_threshold=config.log_compact_bytes,
+            sync=config.sync,
+            sync_window_ms=config.sync_window_ms,
+            sync_interval_ms=config.sync_interval_ms,
+            layout=config.layout,
+            streaming_load=config.streaming_load,
+            snapshot_format=config.snapshot_format
+        )
+    raise ValueError(f"Unknown storage backend: {config.backend}")
@@ -0,0 +1,215 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional
+
+from .models import Priority, Task, intern_title
+from .snapshot import SnapshotColumns, encode_titles
+
+
+class TaskRow:
+    
+    __slots__ = ('_table', '_task_id')
+    
+    def __init__(self, table: "TaskTable", task_id: int):
+        self._table = table
+        self._task_id = task_id
+    
+    @property
+    def id(self) -> int:
+        return self._task_id
+    
+    @property
+    def title(self) -> str:
+        return self._table._titles[self._table._row(self._task_id)]
+    
+    @property
+    def priority(self) -> str:
+        return self._table._priority_names[self._table._priorities[self._table._row(self._task_id)]]
+    
+    @property
+    def isDone(self) -> bool:
+        return bool(self._table._done[self._table._row(self._task_id)])
+    
+    @isDone.setter
+    def isDone(self, value: bool) -> None:
+        self._table._done[self._table._row(self._task_id)] = int(value)
+    
+    def to_dict(self) -> dict:
+        return self._table._row_dict(self._table._row(self._task_id))
+
+
+class SnapshotTitles:
+    
+    # заголовки строк из снимка читаются из mmap при обращении, новые строки хранятся списком
+    def __init__(self, blob: memoryview, offsets: array):
+        self._blob = blob
+        self._offsets = offsets
+        self._count = len(offsets) - 1
+        self._changed: dict[int, str] = {}
+        self._added: list[str] = []
+        # вставка в середину сдвинула бы строки снимка, тогда переходим на обычный список
+        self._list: Optional[list[str]] = None
+    
+    def __len__(self) -> int:
+        if self._list is not None:
+            return len(self._list)
+        return self._count + len(self._added)
+    
+    def __getitem__(self, row: int) -> str:
+        if self._list is not None:
+            return self._list[row]
+        if row >= self._count:
+            return self._added[row - self._count]
+        title = self._changed.get(row)
+        if title is None:
+            title = str(self._blob[self._offsets[row]:self._offsets[row + 1]], 'utf-8')
+        return title
+    
+    def __setitem__(self, row: int, title: str) -> None:
+        if self._list is not None:
+            self._list[row] = title
+        elif row >= self._count:
+            self._added[row - self._count] = title
+        else:
+            self._changed[row] = title
+    
+    def insert(self, position: int, title: str) -> None:
+        if self._list is None and position == len(self):
+            self._added.append(title)
+            return
+        if self._list is None:
+            self._list = [self[row] for row in range(len(self))]
+        self._list.insert(position, title)
+    
+    def encode(self) -> tuple[array, bytes]:
+        if self._list is not None or self._changed:
+            return encode_titles(self[row] for row in range(len(self)))
+        # неизменённая часть снимка копируется как есть, без декодирования
+        base = self._offsets[-1]
+        added_offsets, added_blob = encode_titles(self._added)
+        offsets = array('Q', self._offsets)
+        offsets.extend(base + offset for offset in added_offsets[1:])
+        return offsets, bytes(self._blob) + added_blob
+
+
+class TaskTable:
+    
+    def __init__(self):
+        self._ids = array('q')
+        self._done = array('b')
+        self._priorities = array('H')
+        self._titles: list[str] | SnapshotTitles = []
+        self._priority_names: list[str] = [priority.value for priority in Priority]
+        self._priority_codes: dict[str, int] = {
+            name: code for code, name in enumerate(self._priority_names)
+        }
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def __contains__(self, task_id: int) -> bool:
+        return self._find(task_id) is not None
+    
+    def __getitem__(self, task_id: int) -> TaskRow:
+        if self._find(task_id) is None:
+            raise KeyError(task_id)
+        return TaskRow(self, task_id)
+    
+    def __setitem__(self, task_id: int, task: Task) -> None:
+        row = self._find(task_id)
+        priority = self._priority_code(task.priority)
+        if row is not None:
+            self._titles[row] = intern_title(task.title)
+            self._priorities[row] = priority
+            self._done[row] = int(task.isDone)
+            return
+        
+        # id выдаются по возрастанию, вставка в середину бывает только при загрузке
+        position = len(self._ids)
+        if position and self._ids[-1] > task_id:
+            position = bisect_left(self._ids, task_id)
+        self._ids.insert(position, task_id)
+        self._done.insert(position, int(task.isDone))
+        self._priorities.insert(position, priority)
+        self._titles.insert(position, intern_title(task.title))
+    
+    def get(self, task_id: int) -> Optional[TaskRow]:
+        if self._find(task_id) is None:
+            return None
+        return TaskRow(self, task_id)
+    
+    def values(self) -> Iterator[TaskRow]:
+        return (TaskRow(self, task_id) for task_id in self._ids)
+    
+    def discard_many(self, task_ids: Iterable[int]) -> None:
+        removed = set(task_ids)
+        rows = [row for row, task_id in enumerate(self._ids) if task_id not in removed]
+        if len(rows) == len(self._ids):
+            return
+        self._ids = array('q', (self._ids[row] for row in rows))
+        self._done = array('b', (self._done[row] for row in rows))
+        self._priorities = array('H', (self._priorities[row] for row in rows))
+        if isinstance(self._titles, SnapshotTitles):
+            # заголовки снимка переносятся байтами, без декодирования в строки
+            offsets, blob = self._titles.encode()
+            view = memoryview(blob)
+            kept = [view[offsets[row]:offsets[row + 1]] for row in rows]
+            kept_offsets = array('Q', [0])
+            position = 0
+            for chunk in kept:
+                position += len(chunk)
+                kept_offsets.append(position)
+            self._titles = SnapshotTitles(memoryview(b''.join(kept)), kept_offsets)
+        else:
+            self._titles = [self._titles[row] for row in rows]
+    
+    def to_dicts(self) -> list[dict]:
+        return [self._row_dict(row) for row in range(len(self._ids))]
+    
+    @classmethod
+    def from_snapshot(cls, columns: SnapshotColumns) -> "TaskTable":
+        table = cls()
+        table._ids = columns.ids
+        table._done = columns.done
+        table._priorities = columns.priorities
+        table._titles = SnapshotTitles(columns.titles, columns.title_offsets)
+        table._priority_names = list(columns.priority_names)
+        table._priority_codes = {name: code for code, name in enumerate(table._priority_names)}
+        return table
+    
+    def snapshot_columns(self) -> SnapshotColumns:
+        if isinstance(self._titles, SnapshotTitles):
+            offsets, blob = self._titles.encode()
+        else:
+            offsets, blob = encode_titles(self._titles)
+        return SnapshotColumns(array('q', self._ids), array('b', self._done),
+                               array('H', self._priorities), list(self._priority_names),
+                               offsets, blob)
+    
+    def _priority_code(self, priority: str) -> int:
+        code = self._priority_codes.get(priority)
+        if code is None:
+            code = len(self._priority_names)
+            self._priority_names.append(priority)
+            self._priority_codes[priority] = code
+        return code
+    
+    def _find(self, task_id: int) -> Optional[int]:
+        row = bisect_left(self._ids, task_id)
+        if row < len(self._ids) and self._ids[row] == task_id:
+            return row
+        return None
+    
+    def _row(self, task_id: int) -> int:
+        row = self._find(task_id)
+        if row is None:
+            raise KeyError(task_id)
+        return row
+    
+    def _row_dict(self, row: int) -> dict:
+        return {
+            "id": self._ids[row],
+            "title": self._titles[row],
+            "priority": self._priority_names[self._priorities[row]],
+            "isDone": bool(self._done[row])
+        }
@@ -0,0 +1,67 @@
+import os
+from pathlib import Path
+from typing import Iterator
+
+from . import codec
+
+
+class TaskLog:
+    
+    def __init__(self, file_path: Path):
+        self._file_path = file_path
+        self._rotated_path = file_path.with_name(file_path.name + '.1')
+        self._file = open(self._file_path, 'ab')
+        self._terminate_torn_record()
+    
+    def _terminate_torn_record(self) -> None:
+        if self.size == 0:
+            return
+        with open(self._file_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                self._file.write(b'\n')
+                self._file.flush()
+    
+    @property
+    def size(self) -> int:
+        return self._file.tell()
+    
+    def append(self, records: list[dict], fsync: bool = False) -> int:
+        data = b''.join(codec.dumps(record) + b'\n' for record in records)
+        self._file.write(data)
+        self._file.flush()
+        if fsync:
+            os.fsync(self._file.fileno())
+        return len(data)
+    
+    def replay(self) -> Iterator[dict]:
+        for path in (self._rotated_path, self._file_path):
+            if not path.exists():
+                continue
+            with open(path, 'rb') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield codec.loads(line)
+                    except (codec.DecodeError, UnicodeDecodeError):
+                        # недописанная запись после аварийной остановки
+                        continue
+    
+    def rotate(self) -> None:
+        self._file.close()
+        if self._rotated_path.exists():
+            with open(self._rotated_path, 'ab') as rotated, \
+                 open(self._file_path, 'rb') as current:
+                rotated.write(current.read())
+            self._file = open(self._file_path, 'wb')
+        else:
+            os.replace(self._file_path, self._rotated_path)
+            self._file = open(self._file_path, 'ab')
+    
+    def discard_rotated(self) -> None:
+        self._rotated_path.unlink(missing_ok=True)
+    
+    def close(self) -> None:
+        self._file.close()
@@ -1,9 +1,19 @@
 import json
 import os
 import sys
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+from urllib.request import Request as RawRequest, urlopen as raw_urlopen
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.config import StorageConfig
+from src.storage import open_storage
+
 try:
     import httpx
     USE_HTTPX = True
@@ -15,11 +25,12 @@ except ImportError:
 BASE_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
 
 
-def make_request(method: str, path: str, data: dict = None) -> tuple[int, any]:
+def make_request(method: str, path: str, data: dict = None,
+                 headers: dict = None) -> tuple[int, any]:
     url = f"{BASE_URL}{path}"
     
     if USE_HTTPX:
-        with httpx.Client() as client:
+        with httpx.Client(headers=headers) as client:
             if method == "GET":
                 response = client.get(url)
             elif method == "POST":
@@ -30,6 +41,8 @@ def make_request(method: str, path: str, data: dict = None) -> tuple[int, any]:
     else:
         req = Request(url, method=method)
         req.add_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            req.add_header(name, value)
         
         body_bytes = None
         if data:
@@ -98,6 +111,169 @@ def test_get_tasks():
     return response
 
 
+def test_get_tasks_paginated():
+    print("\n📄 Тест: Постраничное получение задач")
+    print("-" * 40)
+    
+    status, first_page = make_request("GET", "/tasks?limit=2&sort=-id")
+    
+    print(f"Запрос: GET /tasks?limit=2&sort=-id")
+    print(f"Статус: {status}")
+    print(f"Ответ: {first_page}")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert len(first_page) <= 2
+    assert [t["id"] for t in first_page] == sorted((t["id"] for t in first_page), reverse=True)
+    
+    status, pending = make_request("GET", "/tasks?priority=high&isDone=false")
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert all(t["priority"] == "high" and not t["isDone"] for t in pending)
+    
+    status, _ = make_request("GET", "/tasks?limit=abc")
+    assert status == 400, f"Ожидался статус 400, получен {status}"
+    
+    print("✅ Тест пройден!")
+
+
+def test_get_tasks_ndjson():
+    print("\n📜 Тест: Список задач в NDJSON")
+    print("-" * 40)
+    
+    request = RawRequest(f"{BASE_URL}/tasks?limit=3", headers={"Accept": "application/x-ndjson"})
+    with raw_urlopen(request) as response:
+        status = response.status
+        content_type = response.headers.get("Content-Type", "")
+        lines = response.read().decode("utf-8").splitlines()
+    
+    print(f"Запрос: GET /tasks?limit=3 (Accept: application/x-ndjson)")
+    print(f"Статус: {status}")
+    print(f"Ответ: {lines}")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert content_type.startswith("application/x-ndjson"), f"Неверный Content-Type: {content_type}"
+    _, expected = make_request("GET", "/tasks?limit=3")
+    assert [json.loads(line) for line in lines] == expected, "NDJSON должен совпадать с JSON-страницей"
+    
+    print("✅ Тест пройден!")
+
+
+def test_get_tasks_not_modified():
+    print("\n🏷  Тест: ETag и If-None-Match")
+    print("-" * 40)
+    
+    base = urlsplit(BASE_URL)
+    connection = HTTPConnection(base.hostname, base.port)
+    try:
+        connection.request("GET", "/tasks")
+        response = connection.getresponse()
+        response.read()
+        etag = response.getheader("ETag")
+        assert response.status == 200, f"Ожидался статус 200, получен {response.status}"
+        assert etag, "Ответ должен содержать ETag"
+        
+        connection.request("GET", "/tasks", headers={"If-None-Match": etag})
+        response = connection.getresponse()
+        body = response.read()
+        print(f"Запрос: GET /tasks (If-None-Match: {etag})")
+        print(f"Статус: {response.status}")
+        assert response.status == 304, f"Ожидался статус 304, получен {response.status}"
+        assert body == b"", "У 304 не должно быть тела"
+        
+        make_request("POST", "/tasks", {"title": "Задача после ETag"})
+        connection.request("GET", "/tasks", headers={"If-None-Match": etag})
+        response = connection.getresponse()
+        response.read()
+        assert response.status == 200, f"После изменения ожидался статус 200, получен {response.status}"
+        assert response.getheader("ETag") != etag, "После изменения ETag должен смениться"
+    finally:
+        connection.close()
+    
+    print("✅ Тест пройден!")
+
+
+def test_gzip_tasks():
+    print("\n🗜  Тест: Сжатие ответа")
+    print("-" * 40)
+    
+    # страница должна быть больше compression.min_size, иначе её не сжимают
+    make_request("POST", "/tasks:batch", [{"title": f"Задача для сжатия {i}"} for i in range(50)])
+    request = RawRequest(f"{BASE_URL}/tasks?limit=50", headers={"Accept-Encoding": "gzip"})
+    with raw_urlopen(request) as response:
+        status = response.status
+        encoding = response.headers.get("Content-Encoding")
+        raw_body = response.read()
+    
+    print(f"Запрос: GET /tasks?limit=50 (Accept-Encoding: gzip)")
+    print(f"Статус: {status}, Content-Encoding: {encoding}, {len(raw_body)} байт")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert encoding == "gzip", f"Ожидался Content-Encoding: gzip, получен {encoding}"
+    _, expected = make_request("GET", "/tasks?limit=50")
+    assert json.loads(zlib.decompress(raw_body, 16 + zlib.MAX_WBITS)) == expected, \
+        "Распакованное тело должно совпадать с несжатым ответом"
+    
+    print("✅ Тест пройден!")
+
+
+def test_keep_alive():
+    print("\n🔗 Тест: Два запроса в одном соединении")
+    print("-" * 40)
+    
+    base = urlsplit(BASE_URL)
+    connection = HTTPConnection(base.hostname, base.port)
+    try:
+        connection.request("GET", "/health")
+        first = connection.getresponse()
+        first_body = json.loads(first.read())
+        sock = connection.sock
+        assert first.status == 200 and first_body["status"] == "ok"
+        
+        if first.getheader("Connection") == "close":
+            # классический движок закрывает соединение после каждого ответа
+            print("Сервер не держит соединения, проверка пропущена")
+        else:
+            connection.request("GET", "/tasks?limit=1")
+            second = connection.getresponse()
+            second_body = json.loads(second.read())
+            
+            print(f"Статусы: {first.status}, {second.status}")
+            
+            assert second.status == 200 and isinstance(second_body, list)
+            assert connection.sock is sock, "Второй запрос должен идти в том же соединении"
+    finally:
+        connection.close()
+    
+    print("✅ Тест пройден!")
+
+
+def test_batch_tasks():
+    print("\n📦 Тест: Пакетное создание и выполнение задач")
+    print("-" * 40)
+    
+    batch = [{"title": "Пакетная задача 1", "priority": "low"}, {"priority": "high"}, {"title": "Пакетная задача 2"}]
+    status, response = make_request("POST", "/tasks:batch", batch)
+    
+    print(f"Запрос: POST /tasks:batch")
+    print(f"Статус: {status}")
+    print(f"Ответ: {json.dumps(response, ensure_ascii=False, indent=2)}")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert [item["status"] for item in response] == [201, 400, 201]
+    assert response[2]["task"]["id"] == response[0]["task"]["id"] + 1
+    
+    ids = [response[0]["task"]["id"], 99999]
+    status, response = make_request("POST", "/tasks/complete:batch", ids)
+    
+    print(f"Запрос: POST /tasks/complete:batch")
+    print(f"Статус: {status}")
+    print(f"Ответ: {response}")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert response == [{"id": ids[0], "status": 200}, {"id": 99999, "status": 404}]
+    
+    print("✅ Тест пройден!")
+
+
 def test_complete_task(task_id: int):
     print(f"\n✔️  Тест: Отметка задачи {task_id} выполненной")
     print("-" * 40)
@@ -126,6 +302,170 @@ def test_complete_nonexistent_task():
     print("✅ Тест пройден!")
 
 
+def test_metrics():
+    print("\n📊 Тест: Метрики")
+    print("-" * 40)
+    
+    if USE_HTTPX:
+        response = httpx.get(f"{BASE_URL}/metrics")
+        status, content_type, text = response.status_code, response.headers["content-type"], response.text
+    else:
+        with urlopen(f"{BASE_URL}/metrics") as response:
+            status = response.status
+            content_type = response.headers["Content-Type"]
+            text = response.read().decode('utf-8')
+    
+    print(f"Запрос: GET /metrics")
+    print(f"Статус: {status}")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert content_type.startswith("text/plain"), f"Неожиданный Content-Type: {content_type}"
+    assert 'task_api_requests_total{method="POST",route="/tasks",status="201"}' in text
+    assert "task_api_request_duration_seconds_bucket" in text
+    assert "task_api_tasks{" in text
+    
+    print("✅ Тест пройден!")
+
+
+def test_changes():
+    print("\n🔔 Тест: Лента изменений")
+    print("-" * 40)
+    
+    status, response = make_request("GET", "/tasks/changes")
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    version = response["version"]
+    
+    _, task = make_request("POST", "/tasks", {"title": "Задача из ленты"})
+    make_request("POST", f"/tasks/{task['id']}/complete")
+    status, response = make_request("GET", f"/tasks/changes?since={version}&wait=5")
+    
+    print(f"Запрос: GET /tasks/changes?since={version}&wait=5")
+    print(f"Статус: {status}")
+    print(f"Ответ: {json.dumps(response, ensure_ascii=False, indent=2)}")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert response["resync"] == False
+    assert [(c["op"], c["id"]) for c in response["changes"]] == [("create", task["id"]), ("complete", task["id"])]
+    assert response["version"] == response["changes"][-1]["version"]
+    
+    _, response = make_request("GET", "/tasks/changes?since=0")
+    assert response["resync"] == True, "Устаревшая версия должна требовать resync"
+    
+    print("✅ Тест пройден!")
+
+
+def test_search():
+    print("\n🔍 Тест: Поиск по названию")
+    print("-" * 40)
+    
+    suffix = os.getpid()
+    _, first = make_request("POST", "/tasks", {"title": f"Ёлочная гирлянда {suffix}"})
+    _, second = make_request("POST", "/tasks", {"title": f"Купить елку и гирлянд {suffix}"})
+    
+    status, response = make_request("GET", "/tasks/search?q=" + quote(f"ЕЛОЧНАЯ {suffix}"))
+    print(f"Запрос: GET /tasks/search?q=ЕЛОЧНАЯ {suffix}")
+    print(f"Статус: {status}")
+    print(f"Ответ: {json.dumps(response, ensure_ascii=False, indent=2)}")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert [task["id"] for task in response] == [first["id"]], "Регистр и ё не должны мешать поиску"
+    
+    # префикс "гирлянд" совпадает с обоими, целиком слово есть только во второй задаче
+    _, response = make_request("GET", "/tasks/search?q=" + quote(f"гирлянд {suffix}"))
+    assert [task["id"] for task in response] == [second["id"], first["id"]]
+    
+    _, response = make_request("GET", "/tasks/search?q=" + quote(f"гирлянд {suffix}") + "&limit=1&cursor=1")
+    assert [task["id"] for task in response] == [first["id"]]
+    
+    status, _ = make_request("GET", "/tasks/search?q=")
+    assert status == 400, f"Ожидался статус 400, получен {status}"
+    
+    print("✅ Тест пройден!")
+
+
+def test_archived_tasks():
+    print("\n🗄 Тест: Архив выполненных задач")
+    print("-" * 40)
+    
+    status, response = make_request("GET", "/tasks?archived=true&limit=10")
+    print("Запрос: GET /tasks?archived=true&limit=10")
+    print(f"Статус: {status}")
+    
+    assert status == 200, f"Ожидался статус 200, получен {status}"
+    assert isinstance(response, list), "Ответ должен быть списком"
+    assert all(task["isDone"] for task in response), "В архиве только выполненные задачи"
+    
+    status, _ = make_request("GET", "/tasks?archived=maybe")
+    assert status == 400, f"Ожидался статус 400, получен {status}"
+    
+    print("✅ Тест пройден!")
+
+
+def test_idempotent_create():
+    print("\n🔁 Тест: Повтор POST /tasks с Idempotency-Key")
+    print("-" * 40)
+    
+    headers = {"Idempotency-Key": f"test-idempotency-{os.getpid()}"}
+    task = {"title": f"Оплатить счёт {os.getpid()}", "priority": "high"}
+    # одновременные повторы ждут первый запрос, а не создают свои задачи
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(lambda _: make_request("POST", "/tasks", task, headers), range(4)))
+    print(f"Ответы: {json.dumps(responses, ensure_ascii=False)}")
+    
+    assert all(status == 201 for status, _ in responses), "Каждый повтор должен получить 201"
+    assert len({response["id"] for _, response in responses}) == 1, "Повторы не должны создавать дубли"
+    
+    _, tasks = make_request("GET", "/tasks?isDone=false&sort=-id&limit=100")
+    assert sum(1 for item in tasks if item["title"] == task["title"]) == 1
+    
+    status, _ = make_request("POST", "/tasks", {"title": "Другое тело"}, headers)
+    assert status == 422, f"Ожидался статус 422, получен {status}"
+    
+    print("✅ Тест пройден!")
+
+
+def test_rate_limit():
+    print("\n🚦 Тест: Ограничение частоты запросов")
+    print("-" * 40)
+    
+    # ведро по адресу клиента: тест идёт последним, чтобы не израсходовать лимит остальных;
+    # новый невыданный X-API-Key в каждом запросе не должен давать новое ведро
+    statuses = []
+    for attempt in range(500):
+        status, _ = make_request("GET", "/tasks?limit=1", headers={"X-API-Key": f"spoofed-{attempt}"})
+        statuses.append(status)
+        if status != 200:
+            break
+    
+    print(f"Запросов: {len(statuses)}, последний статус: {statuses[-1]}")
+    
+    if statuses[-1] == 200:
+        print("Лимит не настроен или больше 500 запросов, проверка пропущена")
+    else:
+        assert statuses[-1] == 429, f"Ожидался статус 429, получен {statuses[-1]}"
+        status, _ = make_request("GET", "/health")
+        assert status == 200, "/health не должен ограничиваться"
+    
+    print("✅ Тест пройден!")
+
+
+def test_sharded_storage_new_directory():
+    print("\n🧩 Тест: Шардированное хранилище в новой папке")
+    print("-" * 40)
+    
+    with tempfile.TemporaryDirectory() as base_dir:
+        config = StorageConfig(file="sub/tasks.txt", shards=2)
+        storage = open_storage(config, Path(base_dir))
+        task = storage.create_many([("Задача в шарде", "low")])[0]
+        storage.close()
+        
+        storage = open_storage(config, Path(base_dir))
+        assert storage.get_by_id(task.id).title == "Задача в шарде"
+        storage.close()
+    
+    print("✅ Тест пройден!")
+
+
 def main():
     print("=" * 60)
     print("  Task Manager API Tests")
@@ -137,6 +477,11 @@ def main():
         test_health()
         task_id = test_create_task()
         test_get_tasks()
+        test_get_tasks_paginated()
+        test_get_tasks_ndjson()
+        test_get_tasks_not_modified()
+        test_gzip_tasks()
+        test_keep_alive()
         test_complete_task(task_id)
         
         _, tasks = make_request("GET", "/tasks")
@@ -144,6 +489,14 @@ def main():
         assert completed["isDone"] == True, "Задача должна быть выполнена"
         
         test_complete_nonexistent_task()
+        test_batch_tasks()
+        test_metrics()
+        test_changes()
+        test_search()
+        test_archived_tasks()
+        test_idempotent_create()
+        test_rate_limit()
+        test_sharded_storage_new_directory()
         
         print("\n" + "=" * 60)
         print("  ✅ Все тесты пройдены успешно!")